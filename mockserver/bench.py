@@ -0,0 +1,282 @@
+"""模拟服务器的压测工具
+
+生成一个买入用例并通过/mock/load_data加载，然后按指定的并发量压测各个接口，
+以JSON格式输出每个接口的吞吐量和p50/p99/p999延迟，用于比较不同版本的性能。
+
+    python -m mockserver.bench --port 7080 --token xxx --account xxx
+
+服务器同时监听TCP端口和unix socket时，可以比较两种传输方式的性能：
+
+    python -m mockserver.bench --port 7080 --unix /tmp/mockserver.sock \
+        --compare-transports --token xxx --account xxx
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+import sys
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+class HttpConnection:
+    """基于asyncio的HTTP/1.1长连接客户端，只实现压测需要的部分"""
+
+    def __init__(self, host: str, port: int, unix: str = None):
+        self.host = host
+        self.port = port
+        self.unix = unix
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        if self.unix:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.unix)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def request(self, method: str, url: str, headers: dict, body=None):
+        if self.writer is None:
+            await self.connect()
+
+        payload = b"" if body is None else json.dumps(body).encode("utf-8")
+        lines = [f"{method} {url} HTTP/1.1", f"Host: {self.host}"]
+        lines.extend(f"{k}: {v}" for k, v in headers.items())
+        lines.append("Content-Type: application/json")
+        lines.append(f"Content-Length: {len(payload)}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8") + payload)
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed by server")
+        status = int(status_line.split()[1])
+
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value.strip())
+
+        content = await self.reader.readexactly(length) if length else b""
+        return status, content
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if len(sorted_values) == 0:
+        return 0
+    pos = min(int(len(sorted_values) * q), len(sorted_values) - 1)
+    return sorted_values[pos]
+
+
+def summarize(latencies: list, errors: int, seconds: float) -> dict:
+    latencies.sort()
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "seconds": round(seconds, 4),
+        "throughput": round(count / seconds, 2) if seconds > 0 else 0,
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 4),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 4),
+        "p999_ms": round(percentile(latencies, 0.999) * 1000, 4),
+    }
+
+
+def generate_case(count: int) -> list:
+    # 每个步骤买入不同的证券，乱序模式下并发请求可以按任意顺序匹配
+    items = []
+    for i in range(count):
+        code = f"{i:06d}.XSHE"
+        price = round(10 + (i % 100) * 0.01, 2)
+        items.append(
+            {
+                "stage": f"buy-{i}",
+                "test_action": "buy",
+                "parameters": {"code": code, "price": price, "volume": 100},
+                "trade_result": {
+                    "name": code,
+                    "code": code,
+                    "price": price,
+                    "volume": 100,
+                    "order_side": 1,
+                    "bid_type": 1,
+                    "entrust_no": f"bench-{i}",
+                    "status": 3,
+                    "filled": 100,
+                    "filled_vwap": price,
+                    "filled_amount": price * 100,
+                    "eid": f"bench-{i}",
+                    "trade_fees": 0,
+                    "reason": "",
+                },
+            }
+        )
+
+    return items
+
+
+async def run_endpoint(args, headers: dict, method: str, url: str, bodies):
+    """在concurrency个连接上发送请求，bodies是每个请求的请求体"""
+    queue = list(reversed(bodies))
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        conn = HttpConnection(args.host, args.port, args.unix)
+        try:
+            while queue:
+                body = queue.pop()
+                start = time.perf_counter()
+                status, content = await conn.request(method, url, headers, body)
+                latencies.append(time.perf_counter() - start)
+                if status != 200 or json.loads(content).get("status") != 0:
+                    errors += 1
+        finally:
+            await conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(args.concurrency)])
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+async def run_benchmark(args) -> dict:
+    headers = {
+        "Authorization": args.token,
+        "Account-ID": args.account,
+        # 使用独立的会话，不影响其它测试
+        "Session-ID": f"bench-{uuid.uuid4().hex}",
+    }
+
+    conn = HttpConnection(args.host, args.port, args.unix)
+    await conn.request("GET", "/mock/clear", headers)
+    status, content = await conn.request(
+        "POST",
+        "/mock/load_data?mode=unordered",
+        headers,
+        generate_case(args.requests),
+    )
+    await conn.close()
+    if status != 200 or json.loads(content).get("status") != 0:
+        raise RuntimeError(f"failed to load benchmark case: {content}")
+
+    orders = [
+        {
+            "security": step["parameters"]["code"],
+            "price": step["parameters"]["price"],
+            "volume": step["parameters"]["volume"],
+        }
+        for step in generate_case(args.requests)
+    ]
+
+    report = {}
+    report["/buy"] = await run_endpoint(args, headers, "POST", "/buy", orders)
+    for method, url in (
+        ("POST", "/positions"),
+        ("POST", "/today_entrusts"),
+        ("GET", "/mock/current"),
+        ("GET", "/mock/history"),
+    ):
+        bodies = [None] * args.requests
+        report[url] = await run_endpoint(args, headers, method, url, bodies)
+
+    return report
+
+
+async def compare_transports(args) -> dict:
+    # 依次通过TCP和unix socket压测同一组接口
+    report = {}
+    unix = args.unix
+    try:
+        args.unix = None
+        report["tcp"] = await run_benchmark(args)
+        args.unix = unix
+        report["unix"] = await run_benchmark(args)
+    finally:
+        args.unix = unix
+
+    return report
+
+
+async def wait_for_server(args, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        conn = HttpConnection(args.host, args.port, args.unix)
+        try:
+            await conn.request("GET", "/mock/", {})
+            return
+        except OSError:
+            await asyncio.sleep(0.2)
+        finally:
+            await conn.close()
+
+    raise TimeoutError("mock server not started")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="mock trade server benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7080)
+    parser.add_argument("--unix", default=None, help="unix domain socket path")
+    parser.add_argument("--token", required=True, help="access token")
+    parser.add_argument("--account", required=True, help="account id")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument(
+        "--spawn",
+        action="store_true",
+        help="start the server with python -m mockserver.run before testing",
+    )
+    parser.add_argument(
+        "--compare-transports",
+        action="store_true",
+        help="benchmark both --port and --unix, server must listen on both",
+    )
+    parser.add_argument("--output", default=None, help="write report to file")
+    args = parser.parse_args(argv)
+    if args.compare_transports and not args.unix:
+        parser.error("--compare-transports requires --unix")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, "-m", "mockserver.run"])
+
+    try:
+        asyncio.run(wait_for_server(args))
+        if args.compare_transports:
+            report = asyncio.run(compare_transports(args))
+        else:
+            report = asyncio.run(run_benchmark(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as writer:
+            writer.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import logging
+import os
+from collections import OrderedDict
+
+import mockserver.codec as codec
+from mockserver.case_stream import TemplateStream
+from mockserver.compiler import (
+    CaseTemplate,
+    artifact_path,
+    compile_case,
+    read_artifact,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def case_items(steps: list, name: str, window: int = 1024):
+    # 每次加载返回独立的步骤，加载时会改写委托信息中的时间和委托编号
+    if any(isinstance(step, CaseTemplate) for step in steps):
+        # 模板步骤在执行时才展开
+        return TemplateStream(name, steps, window)
+
+    return [step.to_item() for step in steps]
+
+
+class CaseCache:
+    """用例文件缓存，按路径索引，文件的修改时间或大小变化时重新读取
+
+    缓存中保存检查后的CaseStep列表，由case_items()生成每次加载使用的步骤。存在
+    与源文件一致的编译结果时直接读取，不再解析和检查。
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        # 路径 -> (mtime_ns, size, steps)
+        self._entries = OrderedDict()
+
+    def clear(self):
+        self._entries.clear()
+
+    def get(self, case_file: str) -> list:
+        # 只发布了编译结果时按编译结果文件判断是否变化
+        if os.path.exists(case_file):
+            stat = os.stat(case_file)
+        else:
+            stat = os.stat(artifact_path(case_file))
+
+        entry = self._entries.get(case_file)
+        if (
+            entry is not None
+            and entry[0] == stat.st_mtime_ns
+            and entry[1] == stat.st_size
+        ):
+            self._entries.move_to_end(case_file)
+            return entry[2]
+
+        steps = read_artifact(case_file)
+        if steps is None:
+            with open(case_file, "rb") as reader:
+                steps = compile_case(codec.loads(reader.read()))
+
+        self._entries[case_file] = (stat.st_mtime_ns, stat.st_size, steps)
+        self._entries.move_to_end(case_file)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+        logger.info("case file cached: %s", case_file)
+        return steps
+
+
+case_cache = CaseCache()
@@ -0,0 +1,164 @@
+import abc
+import logging
+import uuid
+from collections import deque
+
+import mockserver.codec as codec
+from mockserver.compiler import CaseTemplate, compile_step
+
+logger = logging.getLogger(__name__)
+
+CASE_STREAM_SUFFIX = ".jsonl"
+
+
+class CaseStream(abc.ABC):
+    """按需生成的用例步骤
+
+    只在内存中保留从当前步骤开始的至多window个步骤，游标前进时丢弃已经执行的
+    步骤，不足时再从来源中读取。模板步骤在读取时逐个展开。委托信息中的时间在
+    游标到达该步骤时才改写。只支持顺序执行。
+    """
+
+    def __init__(self, name: str, window: int = 1024):
+        self.name = name
+        self.window = max(int(window), 2)
+
+        # 窗口中第一个步骤的序号
+        self.base = 0
+        self.items = deque()
+        self.eof = False
+        # 读取到错误的步骤时停止，错误的步骤之前的步骤照常执行
+        self.error = None
+
+        # 正在展开的模板及已展开的个数
+        self.template = None
+        self.expanded = 0
+        # 模板步骤的委托编号由seed生成，重放日志时保持一致
+        self.seed = uuid.uuid4()
+
+    @abc.abstractmethod
+    def _next_entry(self):
+        # 读取下一个CaseStep或CaseTemplate，没有更多步骤时返回None
+        pass
+
+    def _next_item(self):
+        while True:
+            template = self.template
+            if template is not None:
+                if self.expanded < template.repeat:
+                    self.expanded += 1
+                    return template.expand(self.expanded - 1, self.seed)
+                self.template = None
+
+            entry = self._next_entry()
+            if not isinstance(entry, CaseTemplate):
+                return None if entry is None else entry.to_item()
+
+            self.template = entry
+            self.expanded = 0
+
+    def _fill(self, index: int):
+        # 读取到index为止，并补足窗口
+        if self.eof or index < self.base + len(self.items):
+            return
+
+        end = max(index + 1, self.base + self.window)
+        while self.base + len(self.items) < end:
+            try:
+                item = self._next_item()
+            except Exception as e:
+                self.error = str(e)
+                self.eof = True
+                logger.error("invalid step in %s: %s", self.name, self.error)
+                break
+
+            if item is None:
+                self.eof = True
+                break
+            self.items.append(item)
+
+        if self.eof:
+            self.close()
+
+    def __getitem__(self, index: int) -> dict:
+        if index < self.base:
+            raise IndexError(f"step {index} already released")
+
+        self._fill(index)
+        if index >= self.base + len(self.items):
+            raise IndexError(f"step {index} out of range")
+
+        return self.items[index - self.base]
+
+    def is_empty(self) -> bool:
+        self._fill(self.base)
+        return len(self.items) == 0
+
+    def is_last(self, index: int) -> bool:
+        # 需要预读下一个步骤才能确定
+        self._fill(index + 1)
+        return self.eof and index == self.base + len(self.items) - 1
+
+    def release(self, index: int):
+        # 丢弃index之前的步骤
+        while self.base < index and len(self.items) > 0:
+            self.items.popleft()
+            self.base += 1
+
+    def close(self):
+        pass
+
+
+class CaseFileStream(CaseStream):
+    """按行读取的大用例（<用例>.jsonl，每行一个步骤），步骤在读取时检查"""
+
+    def __init__(self, case_file: str, window: int = 1024):
+        super().__init__(case_file, window)
+        self.case_file = case_file
+        # 文件中的行号和已读取部分的位置
+        self.line = 0
+        self.offset = 0
+        self._reader = None
+
+    def __getstate__(self):
+        # 保存快照和预写日志时只记录文件位置，恢复时重新打开
+        state = self.__dict__.copy()
+        state["_reader"] = None
+        return state
+
+    def _next_entry(self):
+        if self._reader is None:
+            self._reader = open(self.case_file, "rb")
+            self._reader.seek(self.offset)
+
+        reader = self._reader
+        while True:
+            line = reader.readline()
+            if not line:
+                return None
+
+            self.offset = reader.tell()
+            self.line += 1
+            if line.strip():
+                return compile_step(self.line - 1, codec.loads(line))
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+class TemplateStream(CaseStream):
+    """含有模板步骤的用例，只保存检查后的步骤和模板，执行时展开"""
+
+    def __init__(self, name: str, steps: list, window: int = 1024):
+        super().__init__(name, window)
+        self.steps = steps
+        self.position = 0
+
+    def _next_entry(self):
+        if self.position >= len(self.steps):
+            return None
+
+        self.position += 1
+        return self.steps[self.position - 1]
@@ -0,0 +1,96 @@
+import datetime
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+class VirtualClock:
+    """会话的虚拟时钟
+
+    默认与系统时间一致；设置或拨快后按偏移量随系统时间继续走动，冻结后停在
+    指定的时刻，只能手工拨动。多日的回放场景不需要等待真实时间流逝。
+    """
+
+    def __init__(self):
+        self.offset = datetime.timedelta(0)
+        # 冻结的时刻，None表示时钟随系统时间走动
+        self.frozen_at = None
+        # 重放日志时固定为记录中的时间
+        self._pinned = None
+
+    def now(self) -> datetime.datetime:
+        if self._pinned is not None:
+            return self._pinned
+
+        if self.frozen_at is not None:
+            return self.frozen_at
+
+        return datetime.datetime.now() + self.offset
+
+    def set(self, now: datetime.datetime, frozen: bool = False):
+        if frozen:
+            self.frozen_at = now
+            self.offset = datetime.timedelta(0)
+        else:
+            self.frozen_at = None
+            self.offset = now - datetime.datetime.now()
+
+    def advance(self, delta: datetime.timedelta):
+        if delta < datetime.timedelta(0):
+            raise ValueError("clock cannot go backwards")
+
+        if self.frozen_at is not None:
+            self.frozen_at += delta
+        else:
+            self.offset += delta
+
+    @contextmanager
+    def pin(self, now: datetime.datetime):
+        self._pinned = now
+        try:
+            yield self
+        finally:
+            self._pinned = None
+
+    def reset(self):
+        self.offset = datetime.timedelta(0)
+        self.frozen_at = None
+
+    def to_dict(self) -> dict:
+        return {
+            "now": self.now().strftime(TIME_FORMAT),
+            "frozen": self.frozen_at is not None,
+        }
+
+
+def parse_time(value: str) -> datetime.datetime:
+    # 支持"2022-03-09 09:30:00"和"2022-03-09T09:30:00+08:00"等ISO格式
+    if not isinstance(value, str):
+        raise ValueError(f"invalid time: {value}")
+
+    now = datetime.datetime.fromisoformat(value)
+    if now.tzinfo is not None:
+        # 带时区的时间转换为本地时间，虚拟时钟只使用不带时区的本地时间
+        now = now.astimezone().replace(tzinfo=None)
+
+    return now
+
+
+def parse_delta(params: dict) -> datetime.timedelta:
+    # {"days": 1, "hours": 0, "minutes": 0, "seconds": 0}，可以组合使用
+    kwargs = {}
+    for name in ("days", "hours", "minutes", "seconds"):
+        value = params.get(name)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"invalid {name}: {value}")
+        kwargs[name] = value
+
+    if len(kwargs) == 0:
+        raise ValueError("days, hours, minutes or seconds required")
+
+    return datetime.timedelta(**kwargs)
@@ -0,0 +1,85 @@
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+def _default(obj):
+    # 委托、持仓等记录对象按to_dict()的结果输出
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:
+        return to_dict()
+
+    return str(obj)
+
+
+def _orjson_dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def _ujson_dumps(obj) -> bytes:
+    return ujson.dumps(obj, ensure_ascii=False, default=_default).encode("utf-8")
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+_codecs = {
+    "orjson": (_orjson_dumps, orjson.loads if orjson else None),
+    "ujson": (_ujson_dumps, ujson.loads if ujson else None),
+    "json": (_json_dumps, json.loads),
+}
+
+codec_name = "json"
+_dumps = _json_dumps
+_loads = json.loads
+
+
+def init_codec(name: str = "auto") -> str:
+    """选择JSON编解码器，auto依次尝试orjson、ujson和标准库json
+
+    指定的编解码器未安装时回退到标准库json，返回实际使用的编解码器名称。
+    """
+    global codec_name, _dumps, _loads
+
+    if name == "auto":
+        candidates = ["orjson", "ujson", "json"]
+    else:
+        candidates = [name, "json"]
+
+    for candidate in candidates:
+        if candidate not in _codecs:
+            logger.warning("unknown json codec: %s", candidate)
+            continue
+
+        dumps_func, loads_func = _codecs[candidate]
+        if loads_func is None:
+            logger.warning("json codec not installed: %s", candidate)
+            continue
+
+        codec_name = candidate
+        _dumps = dumps_func
+        _loads = loads_func
+        break
+
+    logger.info("json codec: %s", codec_name)
+    return codec_name
+
+
+def dumps(obj) -> bytes:
+    return _dumps(obj)
+
+
+def loads(data):
+    return _loads(data)
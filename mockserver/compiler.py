@@ -0,0 +1,395 @@
+"""用例编译器
+
+预先检查用例目录中的.txt用例，把每个步骤解析为CaseStep，保存为二进制文件
+<用例>.case.pkl。加载用例时优先读取与源文件一致的编译结果，不再重复解析和检查。
+
+    python -m mockserver.compiler /home/henry/share/testcases
+"""
+
+import argparse
+import glob
+import logging
+import os
+import pickle
+import re
+import sys
+import uuid
+from os import path
+from typing import NamedTuple, Optional, Union
+
+import mockserver.codec as codec
+from mockserver.matcher import ORDER_ACTIONS, is_number
+from mockserver.trade import BidType, OrderSide, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+# 编译结果的格式版本，格式变化后旧的编译结果自动失效
+ARTIFACT_VERSION = 1
+ARTIFACT_SUFFIX = ".case.pkl"
+
+CANCEL_ACTIONS = ("cancel_entrust", "cancel_entrusts")
+CASE_ACTIONS = tuple(ORDER_ACTIONS.values()) + CANCEL_ACTIONS + ("entrust_update",)
+
+# 模板步骤展开后的代码、价格数量上限
+MAX_TEMPLATE_VALUES = 100000
+
+_status_values = {int(x) for x in OrderStatus}
+_side_values = {int(x) for x in OrderSide}
+
+
+class CaseStep(NamedTuple):
+    """检查通过的用例步骤"""
+
+    stage: str
+    action: str
+    parameters: Optional[dict]
+    entrust_update: Optional[dict]
+    trade_result: Union[dict, list, None]
+
+    def to_item(self) -> dict:
+        # 转换为处理函数使用的步骤格式，会被改写的委托信息每次复制一份
+        item = {"stage": self.stage, "test_action": self.action}
+        if self.parameters is not None:
+            item["parameters"] = self.parameters
+        if self.entrust_update is not None:
+            item["entrust_update"] = dict(self.entrust_update)
+        data = self.trade_result
+        if isinstance(data, list):
+            item["trade_result"] = [dict(x) for x in data]
+        elif data is not None:
+            item["trade_result"] = dict(data)
+
+        return item
+
+
+class CaseTemplate(NamedTuple):
+    """模板步骤，执行时才展开为repeat个买卖步骤
+
+    第k个步骤依次轮流使用codes和prices中的代码和价格，委托编号由加载时生成的
+    seed和k计算，每次加载都不同，重放日志时保持一致。
+    """
+
+    stage: str
+    action: str
+    codes: tuple
+    prices: tuple
+    volume: int
+    repeat: int
+    status: int
+    filled: int
+
+    def expand(self, k: int, seed: uuid.UUID) -> dict:
+        code = self.codes[k % len(self.codes)]
+        price = self.prices[k % len(self.prices)]
+        order_side, bid_type = ACTION_ORDERS[self.action]
+
+        if self.status == OrderStatus.ALL_TRANSACTIONS:
+            filled = self.volume
+        elif self.status == OrderStatus.PARTIAL_TRANSACTION:
+            filled = self.filled
+        else:
+            filled = 0
+
+        return {
+            "stage": f"{self.stage}#{k}",
+            "test_action": self.action,
+            "parameters": {"code": code, "price": price, "volume": self.volume},
+            "trade_result": {
+                "entrust_no": str(uuid.uuid5(seed, f"{self.stage}:{k}")),
+                "eid": str(uuid.uuid5(seed, f"{self.stage}:{k}:eid")),
+                "code": code,
+                "price": price,
+                "volume": self.volume,
+                "order_side": int(order_side),
+                "bid_type": int(bid_type),
+                "status": self.status,
+                "filled": filled,
+                "filled_amount": round(filled * price, 2),
+            },
+        }
+
+
+# test_action -> (买卖方向, 委托类型)
+ACTION_ORDERS = {action: key for key, action in ORDER_ACTIONS.items()}
+
+_code_pattern = re.compile(r"^(\d+)(\.\w+)?$")
+
+
+def _check_entrust(where: str, data):
+    if not isinstance(data, dict):
+        raise ValueError(f"{where} must be an object")
+
+    for key in ("entrust_no", "code", "order_side", "status"):
+        if key not in data:
+            raise ValueError(f"{where}: {key} not defined")
+
+    if data["status"] not in _status_values:
+        raise ValueError(f"{where}: invalid status {data['status']}")
+    if data["order_side"] not in _side_values:
+        raise ValueError(f"{where}: invalid order_side {data['order_side']}")
+
+    if data["status"] in (
+        OrderStatus.PARTIAL_TRANSACTION,
+        OrderStatus.ALL_TRANSACTIONS,
+    ):
+        for key in ("filled", "filled_amount"):
+            if not is_number(data.get(key)):
+                raise ValueError(f"{where}: {key} must be number")
+
+    # 未成交的买入委托按委托价和数量冻结资金
+    if data["order_side"] == OrderSide.BUY and data["status"] in (
+        OrderStatus.NO_DEAL,
+        OrderStatus.PARTIAL_TRANSACTION,
+    ):
+        for key in ("price", "volume"):
+            if not is_number(data.get(key)):
+                raise ValueError(f"{where}: {key} must be number")
+
+
+def _code_range(where: str, spec: dict) -> tuple:
+    # {"start": "000001.XSHE", "stop": "000100.XSHE"}，包含stop
+    start = _code_pattern.match(str(spec.get("start")))
+    stop = _code_pattern.match(str(spec.get("stop")))
+    if start is None or stop is None or start.group(2) != stop.group(2):
+        raise ValueError(f"{where}: invalid code range {spec}")
+
+    width = len(start.group(1))
+    first, last = int(start.group(1)), int(stop.group(1))
+    if last < first or last - first >= MAX_TEMPLATE_VALUES:
+        raise ValueError(f"{where}: invalid code range {spec}")
+
+    suffix = start.group(2) or ""
+    return tuple(f"{n:0{width}d}{suffix}" for n in range(first, last + 1))
+
+
+def _price_range(where: str, spec: dict) -> tuple:
+    # {"start": 10.0, "stop": 11.0, "step": 0.01}，包含stop
+    start, stop, step = spec.get("start"), spec.get("stop"), spec.get("step")
+    if not (is_number(start) and is_number(stop) and is_number(step)):
+        raise ValueError(f"{where}: invalid price range {spec}")
+    if step <= 0 or stop < start:
+        raise ValueError(f"{where}: invalid price range {spec}")
+
+    count = int(round((stop - start) / step)) + 1
+    if count > MAX_TEMPLATE_VALUES:
+        raise ValueError(f"{where}: too many prices in {spec}")
+
+    return tuple(round(start + i * step, 3) for i in range(count))
+
+
+def compile_template(where: str, stage: str, spec) -> CaseTemplate:
+    """检查模板步骤，例如：
+
+    {"stage": "load", "test_action": "template", "template": {
+        "action": "buy", "codes": {"start": "000001.XSHE", "stop": "000100.XSHE"},
+        "prices": {"start": 10.0, "stop": 11.0, "step": 0.01}, "volume": 100,
+        "repeat": 1000000, "status": 3}}
+
+    codes和prices也可以是列表；部分成交时用filled指定成交数量。
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"{where}: template not defined")
+
+    action = spec.get("action")
+    if action not in ACTION_ORDERS:
+        raise ValueError(f"{where}: invalid template action {action}")
+
+    codes = spec.get("codes")
+    if isinstance(codes, dict):
+        codes = _code_range(where, codes)
+    elif isinstance(codes, list) and len(codes) > 0:
+        if not all(isinstance(x, str) for x in codes):
+            raise ValueError(f"{where}: codes must be strings")
+        codes = tuple(codes)
+    else:
+        raise ValueError(f"{where}: codes must be a list or a range")
+
+    prices = spec.get("prices")
+    if isinstance(prices, dict):
+        prices = _price_range(where, prices)
+    elif isinstance(prices, list) and len(prices) > 0:
+        if not all(is_number(x) for x in prices):
+            raise ValueError(f"{where}: prices must be numbers")
+        prices = tuple(prices)
+    else:
+        raise ValueError(f"{where}: prices must be a list or a range")
+
+    volume = spec.get("volume")
+    repeat = spec.get("repeat")
+    for name, value in (("volume", volume), ("repeat", repeat)):
+        if not isinstance(value, int) or isinstance(value, bool) or value <= 0:
+            raise ValueError(f"{where}: {name} must be positive integer")
+
+    status = spec.get("status", int(OrderStatus.ALL_TRANSACTIONS))
+    if status not in _status_values:
+        raise ValueError(f"{where}: invalid status {status}")
+
+    filled = spec.get("filled", 0)
+    if status == OrderStatus.PARTIAL_TRANSACTION and (
+        not isinstance(filled, int) or not 0 < filled < volume
+    ):
+        raise ValueError(f"{where}: filled must be between 0 and volume")
+
+    return CaseTemplate(
+        stage, action, codes, prices, volume, repeat, int(status), filled
+    )
+
+
+def compile_step(index: int, item):
+    """检查一个步骤，返回CaseStep或CaseTemplate，错误时抛出ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError(f"step {index} in case must be an object")
+    if "stage" not in item or "test_action" not in item:
+        raise ValueError(f"stage or test_action not defined in step {index}")
+
+    stage = item["stage"]
+    action = item["test_action"]
+    where = f"step {index} ({stage})"
+    if action == "template":
+        return compile_template(where, stage, item.get("template"))
+    if action not in CASE_ACTIONS:
+        raise ValueError(f"{where}: unknown test_action {action}")
+
+    params = item.get("parameters")
+    entrust_update = item.get("entrust_update")
+    trade_result = item.get("trade_result")
+
+    if entrust_update is not None:
+        _check_entrust(f"{where} entrust_update", entrust_update)
+
+    if action == "entrust_update":
+        if entrust_update is None:
+            raise ValueError(f"{where}: entrust_update not defined")
+        if trade_result is not None:
+            _check_entrust(f"{where} trade_result", trade_result)
+        return CaseStep(stage, action, params, entrust_update, trade_result)
+
+    if not isinstance(params, dict) or trade_result is None:
+        raise ValueError(f"{where}: parameters and trade_result not defined")
+
+    if action in CANCEL_ACTIONS:
+        _check_cancel(where, action, params, trade_result)
+    else:
+        _check_order(where, action, params, trade_result)
+
+    return CaseStep(stage, action, params, entrust_update, trade_result)
+
+
+def _check_cancel(where: str, action: str, params: dict, trade_result):
+    entrust_no = params.get("entrust_no")
+    if action == "cancel_entrust":
+        if not isinstance(entrust_no, str):
+            raise ValueError(f"{where}: entrust_no must be string")
+        _check_entrust(f"{where} trade_result", trade_result)
+        return
+
+    if not isinstance(entrust_no, list):
+        raise ValueError(f"{where}: entrust_no must be list")
+    if not isinstance(trade_result, list):
+        raise ValueError(f"{where}: trade_result must be list")
+    for i, data in enumerate(trade_result):
+        _check_entrust(f"{where} trade_result[{i}]", data)
+
+
+def _check_order(where: str, action: str, params: dict, trade_result):
+    # 买卖委托，市价委托不使用价格
+    if not isinstance(params.get("code"), str):
+        raise ValueError(f"{where}: code must be string")
+    if not isinstance(params.get("volume"), int) or params["volume"] <= 0:
+        raise ValueError(f"{where}: volume must be positive integer")
+    _, bid_type = ACTION_ORDERS[action]
+    if bid_type == BidType.LIMIT and not is_number(params.get("price")):
+        raise ValueError(f"{where}: price must be number")
+    _check_entrust(f"{where} trade_result", trade_result)
+
+
+def compile_case(items) -> list:
+    """检查用例的全部步骤，返回CaseStep和CaseTemplate的列表，错误时抛出ValueError"""
+    if not isinstance(items, list):
+        raise ValueError("case data must be a list")
+
+    return [compile_step(i, item) for i, item in enumerate(items)]
+
+
+def artifact_path(case_file: str) -> str:
+    return case_file[: -len(".txt")] + ARTIFACT_SUFFIX
+
+
+def write_artifact(case_file: str, steps: list):
+    stat = os.stat(case_file)
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "steps": steps,
+    }
+
+    file = artifact_path(case_file)
+    tmp = file + ".tmp"
+    with open(tmp, "wb") as writer:
+        pickle.dump(artifact, writer, protocol=5)
+    os.replace(tmp, file)
+
+
+def read_artifact(case_file: str):
+    """读取与源文件一致的编译结果，不存在或已过期时返回None"""
+    file = artifact_path(case_file)
+    if not path.exists(file):
+        return None
+
+    with open(file, "rb") as reader:
+        artifact = pickle.load(reader)
+
+    if artifact.get("version") != ARTIFACT_VERSION:
+        return None
+
+    # 源文件不存在时直接使用编译结果
+    if path.exists(case_file):
+        stat = os.stat(case_file)
+        if artifact["mtime_ns"] != stat.st_mtime_ns or artifact["size"] != stat.st_size:
+            logger.info("case artifact out of date: %s", file)
+            return None
+
+    return artifact["steps"]
+
+
+def compile_file(case_file: str) -> list:
+    with open(case_file, "rb") as reader:
+        steps = compile_case(codec.loads(reader.read()))
+
+    write_artifact(case_file, steps)
+    return steps
+
+
+def compile_folder(folder: str, pattern: str = "**/*") -> dict:
+    """编译目录中的全部用例，返回{用例文件: 错误信息}，没有错误时为空"""
+    errors = {}
+    files = sorted(glob.glob(path.join(folder, f"{pattern}.txt"), recursive=True))
+    for case_file in files:
+        try:
+            compile_file(case_file)
+        except Exception as e:
+            errors[case_file] = str(e)
+
+    logger.info("%d cases compiled, %d failed", len(files) - len(errors), len(errors))
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="compile mock server test cases")
+    parser.add_argument("folder", help="case folder")
+    parser.add_argument("--glob", default="**/*", help="case name pattern")
+    args = parser.parse_args(argv)
+
+    errors = compile_folder(args.folder, args.glob)
+    for case_file, error in errors.items():
+        print(f"{case_file}: {error}")
+
+    return 1 if len(errors) > 0 else 0
+
+
+if __name__ == "__main__":
+    # 通过包导入，编译结果中的CaseStep才能在服务中读取（而不是__main__.CaseStep）
+    from mockserver.compiler import main as compiler_main
+
+    sys.exit(compiler_main())
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EventJournal:
+    """会话内委托和成交变化的日志，每条记录带有单调递增的序号
+
+    客户端保存最后收到的序号，断线重连后从该序号之后继续读取，不会遗漏。
+    """
+
+    def __init__(self):
+        # 最后一条记录的序号
+        self.seq = 0
+        # events[0]的序号为base + 1
+        self.base = 0
+        self.events = []
+
+        # asyncio.Event -> 所属的事件循环
+        self._waiters = {}
+
+    def __getstate__(self):
+        # asyncio.Event不能序列化，共享存储中只保存日志本身
+        state = self.__dict__.copy()
+        state["_waiters"] = {}
+        return state
+
+    def append(self, kind: str, data: dict) -> int:
+        self.seq += 1
+        self.events.append({"seq": self.seq, "type": kind, "data": data})
+
+        if len(self._waiters) > 0:
+            # 会话可能在线程池中修改，通过事件循环触发
+            for waiter, loop in self._waiters.items():
+                loop.call_soon_threadsafe(waiter.set)
+            self._waiters = {}
+
+        return self.seq
+
+    def clear(self):
+        # 清空记录，序号继续递增，已有的客户端游标仍然有效
+        self.base = self.seq
+        self.events = []
+
+    def trim(self, keep: int) -> int:
+        # 只保留最近的keep条记录，早于base的游标从最早保留的记录开始读取
+        drop = len(self.events) - keep
+        if drop <= 0:
+            return 0
+
+        self.base += drop
+        self.events = self.events[drop:]
+        return drop
+
+    def since(self, seq: int, limit: int = None) -> list:
+        start = max(seq - self.base, 0)
+        if limit is None:
+            return self.events[start:]
+
+        return self.events[start : start + limit]
+
+    def iter_since(self, seq: int):
+        # 按序号顺序遍历seq之后的记录，开销只与新增记录的数量有关
+        events = self.events
+        for i in range(max(seq - self.base, 0), len(events)):
+            yield events[i]
+
+    def watch(self, waiter: asyncio.Event, loop: asyncio.AbstractEventLoop):
+        """有新记录时触发一次waiter
+
+        waiter必须在loop所在的线程中创建（python 3.8的asyncio.Event在创建时绑定
+        当前线程的事件循环），本方法可以在线程池中调用。
+        """
+        self._waiters[waiter] = loop
+
+    def unwatch(self, waiter: asyncio.Event):
+        self._waiters.pop(waiter, None)
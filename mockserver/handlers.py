@@ -1,78 +1,141 @@
-import datetime
-import json
+import asyncio
 import logging
 import math
 import uuid
 from os import path
 
 import cfg4py
-from mockserver.trade import BidType, OrderSide
-
-logger = logging.getLogger(__name__)
 
+import mockserver.journal as journal
+import mockserver.latency as latency
+from mockserver.case_cache import case_cache, case_items
+from mockserver.case_stream import CASE_STREAM_SUFFIX, CaseFileStream, CaseStream
+from mockserver.clock import TIME_FORMAT, parse_delta, parse_time
+from mockserver.compiler import artifact_path, compile_case
+from mockserver.matcher import (
+    ORDER_ACTIONS,
+    build_expectations,
+    discard_expectation,
+    expectation_key,
+    pop_expectation,
+)
+from mockserver.playlist import expand_glob
+from mockserver.records import as_entrust
+from mockserver.retention import (
+    TERMINAL_STATUS,
+    policies,
+    read_archive,
+    remove_archive,
+    spill,
+)
+from mockserver.session import (
+    MockSession,
+    discard_session,
+    session_scope,
+    store_blocking,
+)
+from mockserver.simulator import match_order
+from mockserver.trade import BidType, OrderSide, OrderStatus
+from mockserver.utils import dump_response, make_response
 
-global_accunt_info = {"info": {}, "posistions": {}, "entursts": {}, "trades": {}}
-global_case_data = {"case": "", "items": [], "index": -1, "executed": 0, "date": None}
-global_case_exec_list = []
+logger = logging.getLogger(__name__)
 
 
-def wrapper_reset_exec_data(clear_all: bool):
+def wrapper_reset_exec_data(session: MockSession, clear_all: bool):
     # 清除所有执行记录
-    global global_case_exec_list, global_case_data, global_accunt_info
+    journal.record(session, "reset", clear_all)
+    acct_info = session.accunt_info
+    case_data = session.case_data
 
     if clear_all:
-        global_accunt_info["entursts"] = {}
-        global_accunt_info["posistions"] = {}
-        global_accunt_info["trades"] = {}
+        acct_info["entursts"] = {}
+        acct_info["trades"] = {}
+        session.ledger.clear()
+        session.events.clear()
+        # 时钟恢复为系统时间
+        session.clock.reset()
+        session.trade_date = None
+        session.retention.clear()
+        remove_archive(session.session_id)
+        # 委托已经清除，取消尚未执行的成交推进
+        if not journal.is_replaying():
+            latency.cancel_all((session.session_id, session.account_id))
+
+    close_stream(case_data)
+    case_data["case"] = ""
+    case_data["items"] = []
+    case_data["index"] = -1
+    case_data["executed"] = 0
+    case_data["responses"] = []
+    case_data["mode"] = "ordered"
+    case_data["expects"] = {}
+    case_data["done"] = set()
+
+    session.case_exec_list = []
+    session.retention.history.clear()
+    session.playlist.clear()
 
-    global_case_data["case"] = ""
-    global_case_data["items"] = []
-    global_case_data["index"] = -1
-    global_case_data["executed"] = 0
-
-    global_case_exec_list = []
+    if clear_all:
+        # 以新建的会话替换，释放内存，事件序号继续递增
+        discard_session(session)
 
 
-def wrapper_exec_current():
+def wrapper_exec_current(session: MockSession):
     # 读取当前正在执行的用例步骤
-    casename = global_case_data["case"]
-    index = global_case_data["index"]
+    case_data = session.case_data
+    casename = case_data["case"]
+    index = case_data["index"]
     if index == -1:
         return {"status": 400, "msg": "no test case loaded"}
 
-    exec_flag = global_case_data["executed"]
-    items = global_case_data["items"]
+    exec_flag = case_data["executed"]
+    items = case_data["items"]
     item = items[index]
 
-    return {
-        "status": 200,
-        "msg": "success",
-        "data": {
-            "case": casename,
-            "stage": item["stage"],
-            "action": item["test_action"],
-            "executed": exec_flag,
-        },
+    data = {
+        "case": casename,
+        "stage": item["stage"],
+        "action": item["test_action"],
+        "executed": exec_flag,
+        "mode": case_data["mode"],
     }
+    # 流式用例读到错误的步骤后停止
+    if isinstance(items, CaseStream) and items.error is not None:
+        data["error"] = items.error
 
+    return {"status": 200, "msg": "success", "data": data}
 
-def wrapper_exec_history():
-    return {"status": 200, "msg": "success", "data": global_case_exec_list}
 
+def wrapper_exec_history(session: MockSession):
+    return {"status": 200, "msg": "success", "data": session.case_exec_list}
 
-def validate_action_before_executed():
-    casename = global_case_data["case"]
-    items = global_case_data["items"]
-    current_index = global_case_data["index"]
+
+def validate_action_before_executed(session: MockSession):
+    case_data = session.case_data
+    casename = case_data["case"]
+    items = case_data["items"]
+    current_index = case_data["index"]
 
     # 尚未加载用例
     if len(casename) == 0 or current_index == -1:
         return {"status": 400, "msg": f"no case file loaded, {casename}"}
 
-    exec_flag = global_case_data["executed"]
+    exec_flag = case_data["executed"]
+
+    # 流式用例读到错误的步骤后停止，到达错误之前的最后一个步骤时报告错误，
+    # 不再当作正常结束
+    if (
+        isinstance(items, CaseStream)
+        and items.error is not None
+        and is_last_step(items, current_index)
+    ):
+        return {
+            "status": 400,
+            "msg": f"invalid step in case {casename}: {items.error}",
+        }
 
     # 最后一个步骤已经执行了
-    if current_index == len(items) - 1 and exec_flag == 1:
+    if exec_flag == 1 and is_last_step(items, current_index):
         item = items[current_index]
         last_stage = item["stage"]
         return {
@@ -93,22 +156,23 @@ def validate_action_before_executed():
     return {"status": 200, "msg": "OK"}
 
 
-def wrapper_proceed_non_trade_action():
+def wrapper_proceed_non_trade_action(session: MockSession):
     # 执行下一个测试步骤，如果是委托更新，则立刻执行
-    result = validate_action_before_executed()
+    case_data = session.case_data
+    result = validate_action_before_executed(session)
     if result["status"] != 200:
         return result
 
-    casename = global_case_data["case"]
-    items = global_case_data["items"]
-    last_index = global_case_data["index"]
+    casename = case_data["case"]
+    items = case_data["items"]
+    last_index = case_data["index"]
 
     item = items[last_index]
     current_stage = item["stage"]
     action = item["test_action"]
     if action == "entrust_update":
-        execute_entrust_case(item)
-        proceed_to_nextstep()
+        execute_entrust_case(session, item)
+        proceed_to_nextstep(session)
 
         return {
             "status": 200,
@@ -127,29 +191,36 @@ def wrapper_proceed_non_trade_action():
     }
 
 
-def proceed_to_nextstep():
+def proceed_to_nextstep(session: MockSession):
     # 推进到下一个测试步骤，待执行
-    casename = global_case_data["case"]
-    items = global_case_data["items"]
-    current_index = global_case_data["index"]
+    case_data = session.case_data
+    casename = case_data["case"]
+    items = case_data["items"]
+    current_index = case_data["index"]
 
     # 尚未加载用例
     if len(casename) == 0 or current_index == -1:
-        logger.info(f"no case file loaded, {casename}")
+        logger.info("no case file loaded, %s", casename)
         return None
 
     # 最后一个步骤已经执行了
-    if current_index == len(items) - 1:
+    if is_last_step(items, current_index):
         item = items[current_index]
         last_stage = item["stage"]
-        logger.info(f"no more stages, last stage: {casename}:{last_stage}")
+        logger.info("no more stages, last stage: %s:%s", casename, last_stage)
+        advance_playlist(session)
         return None
 
-    # 跳到下一个步骤
-    exec_flag = global_case_data["executed"]
+    # 跳到下一个步骤，乱序模式下已经提前执行的步骤直接跳过
+    exec_flag = case_data["executed"]
     if exec_flag == 1:
-        global_case_data["index"] = current_index + 1
-        global_case_data["executed"] = 0
+        done = case_data["done"]
+        next_index = current_index + 1
+        while next_index in done and not is_last_step(items, next_index):
+            next_index += 1
+
+        set_cursor(session, next_index, 1 if next_index in done else 0)
+        advance_playlist(session)
         return 0
     else:
         logger.warning("current stage not executed, cannot proceed to next step")
@@ -157,7 +228,71 @@ def proceed_to_nextstep():
 
 
 # 执行委托更新，同步更新交易信息，支持多个委托信息同时更新
-def execute_entrust_case(item):
+def execute_entrust_case(session: MockSession, item):
+    apply_case_step(session, item)
+
+    # 更新执行信息
+    set_cursor(session, session.case_data["index"], 1)
+    return 0
+
+
+def set_cursor(session: MockSession, index: int, executed: int):
+    journal.record(session, "cursor", index, executed)
+    case_data = session.case_data
+    case_data["index"] = index
+    case_data["executed"] = executed
+
+    # 重放日志时乱序模式的待匹配索引需要同步删除已执行的步骤
+    if journal.is_replaying() and executed == 1 and case_data["mode"] == "unordered":
+        discard_expectation(case_data["expects"], case_data["items"], index)
+
+    if executed == 0 and isinstance(case_data["items"], CaseStream):
+        reach_step(session, index)
+
+
+def is_last_step(items, index: int) -> bool:
+    # 流式用例的步骤总数未知，需要预读下一个步骤
+    if isinstance(items, CaseStream):
+        return items.is_last(index)
+
+    return index == len(items) - 1
+
+
+def reach_step(session: MockSession, index: int):
+    # 流式用例：游标到达时改写委托时间并生成应答，之前的步骤从内存中释放
+    case_data = session.case_data
+    stream = case_data["items"]
+    stream.release(index)
+    item = stream[index]
+    stamp_item(item, session.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+    case_data["responses"] = {index: build_step_response(case_data["case"], item)}
+
+
+def stamp_item(item: dict, datestr: str):
+    # 更新委托信息中的时间为当前时间
+    if "entrust_update" in item:
+        data = item["entrust_update"]
+        data["time"] = datestr
+        data["recv_at"] = datestr
+    if "trade_result" in item:
+        data = item["trade_result"]
+        for entrust in data if isinstance(data, list) else [data]:
+            entrust["time"] = datestr
+            entrust["recv_at"] = datestr
+
+
+def mark_step_done(session: MockSession, index: int):
+    # 乱序模式下提前执行了当前步骤之后的步骤
+    journal.record(session, "step_done", index)
+    case_data = session.case_data
+    case_data["done"].add(index)
+
+    if journal.is_replaying():
+        discard_expectation(case_data["expects"], case_data["items"], index)
+
+
+def apply_case_step(session: MockSession, item):
+    # 更新委托、成交和持仓，记录历史步骤，不改变当前步骤的执行状态
     datalist = []
 
     # 读取委托更新的内容
@@ -167,124 +302,201 @@ def execute_entrust_case(item):
 
     if "trade_result" in item:
         tmp = item["trade_result"]
-        datalist.append(tmp)
+        # 批量撤单的结果是委托列表
+        if isinstance(tmp, list):
+            datalist.extend(tmp)
+        else:
+            datalist.append(tmp)
+
+    apply_entrust_data(session, datalist)
+
+    # 记录历史步骤
+    append_history(
+        session,
+        {
+            "case": session.case_data["case"],
+            "stage": item["stage"],
+            "action": item["test_action"],
+        },
+    )
+
+
+def append_history(session: MockSession, entry: dict):
+    journal.record(session, "history", entry)
+    session.case_exec_list.append(entry)
+    if "history" in policies:
+        now = session.now()
+        session.retention.history.append(now)
+        evict_history(session, now)
+
 
+def apply_entrust_data(session: MockSession, datalist: list):
+    # 保存委托信息，部分成交或者全部成交的委托同时更新成交清单和持仓
+    journal.record(session, "entrusts", datalist)
+    entrusts = session.accunt_info["entursts"]
+    trades = session.accunt_info["trades"]
+    events = session.events
+
+    # 配置了保留规则时记录每个委托和成交的更新时间
+    retention = session.retention
+    now = session.now() if len(policies) > 0 else None
     for data in datalist:
-        entrust_id = data["entrust_no"]
-        entrusts = global_accunt_info["entursts"]
+        # 用例中的委托信息转换为紧凑的委托记录保存
+        data = as_entrust(data)
+        entrust_id = data.entrust_no
         entrusts[entrust_id] = data
+        events.append("entrust", data)
+
+        terminal = data.status in TERMINAL_STATUS
+        if "entrusts" in policies:
+            retention.entrusts.touch(entrust_id, now, terminal)
 
         # 如果委托是部分成交或者全部成交，更新成交清单
-        if data["status"] == 2 or data["status"] == 3:
-            trades = global_accunt_info["trades"]
+        if data.status == 2 or data.status == 3:
             trades[entrust_id] = data
+            events.append("trade", data)
+            if "trades" in policies:
+                retention.trades.touch(entrust_id, now, terminal)
 
-            # 更新持仓信息
-            update_positions(data)
+        # 更新冻结资金、可用资金和持仓信息
+        update_positions(session, data)
 
-    # 更新执行信息，记录历史步骤
-    global_case_data["executed"] = 1
-    global_case_exec_list.append(
-        {
-            "case": global_case_data["case"],
-            "stage": item["stage"],
-            "action": item["test_action"],
-        }
-    )
+    if now is not None:
+        evict_records(session, now)
 
-    return 0
 
+def evict_records(session: MockSession, now):
+    # 按保留规则清理委托、成交和变化记录，清理掉的委托和成交写入归档
+    for store, key in (("entrusts", "entursts"), ("trades", "trades")):
+        policy = policies.get(store)
+        if policy is None:
+            continue
 
-def update_positions(data):
-    acct_info = global_accunt_info["info"]
-    account_id = acct_info["account"]
-    positions = global_accunt_info["posistions"]
-
-    code = data["code"]
-    positions[code] = {
-        "account": account_id,
-        "code": code,
-        "shares": 0,
-        "sellable": 0,
-        "price": 0,
-        "market_value": 0,
-        "amount": 0,
-    }
+        records = session.accunt_info[key]
+        evicted = []
+        for entrust_id in getattr(session.retention, store).expired(policy, now):
+            record = records.pop(entrust_id, None)
+            if record is None:
+                continue
+            evicted.append(record)
+            if store == "entrusts" and record.status in TERMINAL_STATUS:
+                session.ledger.forget(record)
 
-    # 遍历交易记录，计算持仓数据
-    trades = global_accunt_info["trades"]
-    for trade in trades.values():
-        if trade["code"] != code:
-            continue
+        spill(session.session_id, store, evicted, now)
 
-        status = int(trade["status"])
-        if status == -1 or status == 1:
-            # 未成交的委托不参与计算
-            return None
-
-        pos = positions[code]
-        order_side = trade["order_side"]
-
-        filled_vol = int(trade["filled"])
-        filled_amount = float(trade["filled_amount"])
-
-        if order_side == OrderSide.BUY:
-            pos["shares"] += filled_vol
-            pos["sellable"] += filled_vol
-            pos["amount"] += filled_amount
-            if pos["shares"] == 0:
-                pos["price"] = 0
-            else:
-                pos["price"] = pos["amount"] / pos["shares"]
-        else:
-            pos["shares"] -= filled_vol
-            pos["sellable"] -= filled_vol
-            pos["amount"] -= filled_amount
-            if pos["shares"] == 0:
-                pos["price"] = 0
-            else:
-                pos["price"] = pos["amount"] / pos["shares"]
+    policy = policies.get("events")
+    if policy is not None and policy.max_count is not None:
+        session.events.trim(policy.max_count)
+
+
+def evict_history(session: MockSession, now):
+    policy = policies["history"]
+    times = session.retention.history
+    history = session.case_exec_list
+
+    drop = 0
+    if policy.max_count is not None:
+        drop = max(len(history) - policy.max_count, 0)
+    if policy.max_age is not None:
+        deadline = now - policy.max_age
+        while drop < len(times) and times[drop] <= deadline:
+            drop += 1
+
+    if drop == 0:
+        return
+
+    for _ in range(min(drop, len(times))):
+        times.popleft()
+    spill(session.session_id, "history", history[:drop], now)
+    del history[:drop]
 
 
-def wrapper_load_case_data(casedata: list):
+def update_positions(session: MockSession, data):
+    # 按委托和成交增量更新账本，无需遍历全部成交记录
+    return session.ledger.apply_entrust(data)
+
+
+def wrapper_load_case_data(session: MockSession, casedata: list, mode: str = "ordered"):
+    # 加载时检查全部步骤，交易请求中不再检查用例的格式
+    try:
+        steps = compile_case(casedata)
+    except ValueError as e:
+        return {"status": 400, "msg": str(e)}
+
     tempname = uuid.uuid4().hex
-    return initialize_case_data(casedata, tempname)
+    items = case_items(steps, tempname, case_window())
+    return initialize_case_data(session, items, tempname, mode)
 
 
-def wrapper_read_case_file(casename: str):
+def wrapper_read_case_file(session: MockSession, casename: str, mode: str = "ordered"):
     # 加载测试用例，检查所有步骤
     server_config = cfg4py.get_instance()
     case_dir = server_config.server_info.case_folder
 
-    case_file = path.normpath(path.join(case_dir, f"{casename}.txt"))
-    if not path.exists(case_file):
-        logger.error("case file not found: %s", case_file)
+    case_file = find_case_file(case_dir, casename)
+    if case_file is None:
+        logger.error("case file not found: %s", casename)
         return {"status": 400, "msg": "case file not found"}
 
     items = []
     try:
-        with open(case_file, "r", encoding="utf-8") as reader:
-            content = reader.read()
-            items = json.loads(content)
+        if case_file.endswith(CASE_STREAM_SUFFIX):
+            # 逐行读取的大用例，加载时只读取第一批步骤
+            items = CaseFileStream(case_file, case_window())
+        else:
+            # 已缓存且文件未修改时直接使用检查后的步骤
+            items = case_items(case_cache.get(case_file), case_file, case_window())
     except Exception as e:
         logger.error(e)
         return {"status": 400, "msg": str(e)}
 
-    return initialize_case_data(items, casename)
+    return initialize_case_data(session, items, casename, mode)
+
+
+def case_window() -> int:
+    # 流式用例和模板用例在内存中保留的步骤数
+    server_config = cfg4py.get_instance()
+    return getattr(server_config.server_info, "case_window", 1024)
+
+
+def find_case_file(case_dir: str, casename: str):
+    # 依次查找<用例>.txt、编译结果和逐行的<用例>.jsonl
+    case_file = path.normpath(path.join(case_dir, f"{casename}.txt"))
+    if path.exists(case_file) or path.exists(artifact_path(case_file)):
+        return case_file
+
+    stream_file = path.normpath(path.join(case_dir, casename + CASE_STREAM_SUFFIX))
+    if path.exists(stream_file):
+        return stream_file
 
+    return None
+
+
+def initialize_case_data(
+    session: MockSession, items: list, casename: str, mode: str = "ordered"
+):
+    # 乱序模式下买卖步骤可以按任意顺序匹配
+    if mode not in CASE_MODES:
+        return {"status": 400, "msg": f"invalid case mode: {mode}"}
+    # 乱序匹配需要全部步骤的索引，流式和模板用例不支持
+    streamed = isinstance(items, CaseStream)
+    if streamed and mode != "ordered":
+        return {"status": 400, "msg": f"{mode} mode not supported: {casename}"}
 
-def initialize_case_data(items: list, casename: str):
     # 解析测试步骤
-    if len(items) == 0:
+    if (streamed and items.is_empty()) or (not streamed and len(items) == 0):
+        if streamed and items.error is not None:
+            return {"status": 400, "msg": items.error}
         logger.error("no content found in case file")
         return {"status": 400, "msg": "no content in case file"}
 
-    # 取当前时间
-    now = datetime.datetime.now()
-    global_case_data["date"] = now
+    # 取会话虚拟时钟的当前时间
+    now = session.now()
+    case_data = session.case_data
+    case_data["date"] = now
     datestr = now.strftime("%Y-%m-%d %H:%M:%S.%f")
 
-    if len(items) == 1:  # 单个买卖动作，动态更新ID
+    if not streamed and len(items) == 1:  # 单个买卖动作，动态更新ID
         item = items[0]
         action_name = item["test_action"]
         if action_name.find("buy") >= 0 or action_name.find("sell") >= 0:
@@ -292,35 +504,29 @@ def initialize_case_data(items: list, casename: str):
             trade_result["entrust_no"] = str(uuid.uuid4())
             trade_result["eid"] = str(uuid.uuid4())
 
-    # 更新委托信息中的时间为当前时间
-    for item in items:
-        if "entrust_update" in item:
-            data = item["entrust_update"]
-            data["time"] = datestr
-            data["recv_at"] = datestr
-        if "trade_result" in item:
-            data = item["trade_result"]
-            data["time"] = datestr
-            data["recv_at"] = datestr
+    # 流式用例在游标到达每个步骤时再改写
+    if not streamed:
+        for item in items:
+            stamp_item(item, datestr)
 
     try:
         # 如果上一个测试用例还没执行完，暂不允许加载新的
-        old_case = global_case_data["case"]
+        old_case = case_data["case"]
         if old_case == casename:
             return {"status": 400, "msg": f"cannot load same test case: {old_case}"}
 
-        old_items = global_case_data["items"]
-        old_index = global_case_data["index"]
-        old_exec_flag = global_case_data["executed"]
+        old_items = case_data["items"]
+        old_index = case_data["index"]
+        old_exec_flag = case_data["executed"]
 
         # 没有加载过文件
-        if len(old_items) == 0:
+        if old_index == -1:
             pass
         # 如果上一个用例还没开始执行，可以重新加载新的文件
         elif old_index == 0 and old_exec_flag == 0:
             pass
         # 上一个用例已经执行完毕
-        elif len(old_items) == old_index + 1 and old_exec_flag == 1:
+        elif old_exec_flag == 1 and is_last_step(old_items, old_index):
             pass
         else:
             old_item = old_items[old_index]
@@ -329,13 +535,8 @@ def initialize_case_data(items: list, casename: str):
                 "msg": f"actions in last case not executed: {old_case}:{old_item['stage']}",
             }
 
-        # 加载新用例的全部数据
-        global_case_data["case"] = casename
-        global_case_data["items"] = items
-
-        # 前进到第一个用例
-        global_case_data["index"] = 0
-        global_case_data["executed"] = 0
+        # 加载新用例的全部数据，前进到第一个用例
+        install_case(session, casename, items, mode)
 
         item = items[0]
         act_result = "to be executed"
@@ -344,8 +545,8 @@ def initialize_case_data(items: list, casename: str):
 
         # 如果第一个用例是委托更新，则自动执行
         if item["test_action"] == "entrust_update":
-            execute_entrust_case(item)
-            proceed_to_nextstep()
+            execute_entrust_case(session, item)
+            proceed_to_nextstep(session)
             act_result = "action executed"
 
         return {
@@ -363,13 +564,73 @@ def initialize_case_data(items: list, casename: str):
         return {"status": 500, "msg": e}
 
 
-def wrapper_get_balance(account_id: str):
-    acct_info = global_accunt_info["info"]
-    return {"status": 200, "msg": "success", "data": acct_info}
+def install_case(session: MockSession, casename: str, items: list, mode: str):
+    # 流式用例只记录文件位置和已读取的步骤
+    journal.record(session, "load", casename, items, mode)
+    case_data = session.case_data
+    close_stream(case_data)
+    case_data["case"] = casename
+    case_data["items"] = items
+    case_data["mode"] = mode
+    case_data["expects"] = build_expectations(items) if mode == "unordered" else {}
+    case_data["done"] = set()
+    case_data["index"] = 0
+    case_data["executed"] = 0
+
+    if isinstance(items, CaseStream):
+        reach_step(session, 0)
+    else:
+        case_data["responses"] = build_step_responses(casename, items)
+
+
+def close_stream(case_data: dict):
+    items = case_data["items"]
+    if isinstance(items, CaseStream):
+        items.close()
+
+
+CASE_MODES = ("ordered", "unordered")
+
+# 交易类步骤的应答在加载用例时序列化，请求时直接返回
+TRADE_ACTIONS = (
+    "buy",
+    "sell",
+    "market_buy",
+    "market_sell",
+    "cancel_entrust",
+    "cancel_entrusts",
+)
+
+
+def build_step_responses(casename: str, items: list):
+    return [build_step_response(casename, item) for item in items]
 
 
-def wrapper_get_positions(account_id: str):
-    positions = global_accunt_info["posistions"]
+def build_step_response(casename: str, item: dict):
+    if item["test_action"] not in TRADE_ACTIONS or "trade_result" not in item:
+        return None
+
+    data = item["trade_result"]
+    if isinstance(data, list):
+        data = {tmp["entrust_no"]: tmp for tmp in data}
+
+    stage = item["stage"]
+    return (
+        dump_response(0, "OK", data),
+        dump_response(
+            -1,
+            f"parameters in trade operation not matched, {casename} -> {stage}",
+        ),
+    )
+
+
+def wrapper_get_balance(session: MockSession):
+    # 资金按委托和成交实时计算
+    return {"status": 200, "msg": "success", "data": session.ledger.balance()}
+
+
+def wrapper_get_positions(session: MockSession):
+    positions = session.ledger.positions
     if len(positions) == 0:
         return {"status": 200, "msg": "success", "data": []}
 
@@ -377,29 +638,182 @@ def wrapper_get_positions(account_id: str):
     return {"status": 200, "msg": "success", "data": data}
 
 
+# ------------------------------- 播放列表 ---------------------------------------
+
+
+def wrapper_enqueue_playlist(session: MockSession, params: dict):
+    """把多个用例加入播放列表：{"cases": ["c1", "c2"], "glob": "nightly/*", "mode": "ordered"}
+
+    当前没有未执行完的用例时立刻加载第一个，之后每个用例的最后一个步骤执行后
+    自动加载下一个。
+    """
+    server_config = cfg4py.get_instance()
+    case_dir = server_config.server_info.case_folder
+
+    mode = params.get("mode", "ordered")
+    if mode not in CASE_MODES:
+        return {"status": 400, "msg": f"invalid case mode: {mode}"}
+
+    names = params.get("cases") or []
+    if not isinstance(names, list) or not all(isinstance(x, str) for x in names):
+        return {"status": 400, "msg": "cases must be a list of case names"}
+
+    pattern = params.get("glob")
+    if pattern:
+        names = names + expand_glob(case_dir, pattern)
+
+    if len(names) == 0:
+        return {"status": 400, "msg": "no case found"}
+
+    missing = [name for name in names if find_case_file(case_dir, name) is None]
+    if len(missing) > 0:
+        return {"status": 400, "msg": f"case file not found: {missing}"}
+
+    entries = [(name, mode) for name in names]
+    journal.record(session, "playlist_add", entries)
+    session.playlist.pending.extend(entries)
+
+    advance_playlist(session)
+    return wrapper_get_playlist(session)
+
+
+def wrapper_get_playlist(session: MockSession):
+    data = session.playlist.to_dict()
+    data["current"] = session.case_data["case"]
+    return {"status": 200, "msg": "success", "data": data}
+
+
+def wrapper_clear_playlist(session: MockSession):
+    # 只清除待执行的用例，当前用例不受影响
+    journal.record(session, "playlist_clear")
+    session.playlist.clear()
+    return wrapper_get_playlist(session)
+
+
+def case_finished(case_data: dict) -> bool:
+    # 没有加载用例，或者最后一个步骤已经执行
+    if case_data["index"] == -1:
+        return True
+
+    return case_data["executed"] == 1 and is_last_step(
+        case_data["items"], case_data["index"]
+    )
+
+
+def advance_playlist(session: MockSession):
+    # 当前用例执行完毕后加载播放列表中的下一个用例，加载失败的跳过
+    playlist = session.playlist
+    if playlist.advancing or journal.is_replaying():
+        return
+
+    playlist.advancing = True
+    try:
+        while len(playlist.pending) > 0 and case_finished(session.case_data):
+            casename, mode = playlist.pending[0]
+            result = wrapper_read_case_file(session, casename, mode)
+            error = None
+            if result["status"] != 200:
+                logger.error("playlist case not loaded: %s, %s", casename, result)
+                error = str(result["msg"])
+
+            journal.record(session, "playlist_next", error)
+            next_in_playlist(session, error)
+    finally:
+        playlist.advancing = False
+
+
+def next_in_playlist(session: MockSession, error: str = None):
+    playlist = session.playlist
+    casename, _ = playlist.pending.popleft()
+    if error is None:
+        playlist.loaded += 1
+    else:
+        playlist.errors.append({"case": casename, "msg": error})
+
+
+def replay_playlist_add(session: MockSession, entries: list):
+    session.playlist.pending.extend(entries)
+
+
+# ------------------------------- 虚拟时钟 ---------------------------------------
+
+
+def wrapper_get_clock(session: MockSession):
+    # 读取时钟时同样检查日切
+    session.now()
+    data = session.clock.to_dict()
+    data["trade_date"] = str(session.trade_date)
+    return {"status": 200, "msg": "success", "data": data}
+
+
+def wrapper_set_clock(session: MockSession, params: dict):
+    try:
+        now = parse_time(params.get("time"))
+    except ValueError as e:
+        return {"status": 400, "msg": str(e)}
+
+    # 时钟拨回到之前的交易日时重新开始计算交易日
+    if session.trade_date is not None and now.date() < session.trade_date:
+        session.trade_date = None
+
+    session.clock.set(now, bool(params.get("frozen", False)))
+    record_clock(session)
+    return wrapper_get_clock(session)
+
+
+def wrapper_advance_clock(session: MockSession, params: dict):
+    try:
+        delta = parse_delta(params)
+        session.now()
+        session.clock.advance(delta)
+    except ValueError as e:
+        return {"status": 400, "msg": str(e)}
+
+    record_clock(session)
+    return wrapper_get_clock(session)
+
+
+def record_clock(session: MockSession):
+    # 记录时钟设置后的状态，重放时直接恢复，不依赖重放时的系统时间
+    clock = session.clock
+    journal.record(session, "clock", clock.offset, clock.frozen_at, session.trade_date)
+
+
+def restore_clock(session: MockSession, offset, frozen_at, trade_date):
+    session.clock.offset = offset
+    session.clock.frozen_at = frozen_at
+    session.trade_date = trade_date
+
+
 # ------------------------------- 交易指令 ---------------------------------------
 
 
 def wrapper_trade_operation(
-    account_id: str,
+    session: MockSession,
     security: str,
     price: float,
     volume: int,
     order_side: OrderSide,
     bid_type: BidType,
 ):
-    result = validate_action_before_executed()
+    if session.simulation:
+        return simulate_trade(session, security, price, volume, order_side, bid_type)
+
+    case_data = session.case_data
+    if case_data["mode"] == "unordered":
+        return match_unordered_trade(
+            session, security, price, volume, order_side, bid_type
+        )
+
+    result = validate_action_before_executed(session)
     if result["status"] != 200:
         return result
 
-    casename = global_case_data["case"]
-    items = global_case_data["items"]
-    index = global_case_data["index"]
+    casename = case_data["case"]
+    items = case_data["items"]
+    index = case_data["index"]
 
     trade_operation = items[index]
-    if trade_operation is None or "test_action" not in trade_operation:
-        return {"status": 400, "msg": "no test_action defined in case stage"}
-
     if order_side == OrderSide.BUY:
         if (bid_type == BidType.LIMIT and trade_operation["test_action"] != "buy") or (
             bid_type == BidType.MARKET
@@ -420,12 +834,6 @@ def wrapper_trade_operation(
                 "msg": f"action not matched, {casename}, {trade_operation['stage']}, {trade_operation['test_action']}",
             }
 
-    if "parameters" not in trade_operation or "trade_result" not in trade_operation:
-        return {
-            "status": 400,
-            "msg": "parameters and trade_result in trade operation not defined",
-        }
-
     params = trade_operation["parameters"]
     data = trade_operation["trade_result"]
 
@@ -442,38 +850,288 @@ def wrapper_trade_operation(
         and volume == volume_in_action
         and math.isclose(price, price_in_action, rel_tol=1e-5)
     ):
+        # 用例执行完毕后会加载播放列表中的下一个用例，先取出应答
+        ok_body, _ = case_data["responses"][index]
         # 设置当前步骤已执行
-        execute_entrust_case(trade_operation)
+        execute_entrust_case(session, trade_operation)
         # 跳到下一个步骤
-        proceed_to_nextstep()
-        return {"status": 200, "msg": "success", "data": data}
+        proceed_to_nextstep(session)
+        return {"status": 200, "msg": "success", "data": data, "body": ok_body}
     else:
+        _, mismatch_body = case_data["responses"][index]
         return {
             "status": 400,
             "msg": f"parameters in trade operation not matched, {casename} -> {trade_operation['stage']}",
+            "body": mismatch_body,
         }
 
 
-def wrapper_cancel_entrust(account_id: str, entrust_no: str):
-    result = validate_action_before_executed()
-    if result["status"] != 200:
-        return result
+def wrapper_batch_orders(session: MockSession, orders: list):
+    # 批量委托，逐个匹配或撮合，按输入顺序返回每个委托的结果
+    results = []
+    for order in orders:
+        try:
+            order_side = OrderSide(order.get("order_side"))
+            bid_type = BidType(order.get("bid_type", BidType.LIMIT))
+        except (AttributeError, ValueError):
+            results.append(make_response(-1, f"invalid order: {order}"))
+            continue
 
-    casename = global_case_data["case"]
-    items = global_case_data["items"]
-    index = global_case_data["index"]
-    exec_flag = global_case_data["executed"]
+        result = wrapper_trade_operation(
+            session,
+            order.get("security"),
+            order.get("price"),
+            order.get("volume"),
+            order_side,
+            bid_type,
+        )
+        if result["status"] != 200:
+            results.append(make_response(-1, result["msg"]))
+        else:
+            results.append(make_response(0, "OK", result["data"]))
 
-    trade_operation = items[index]
-    if trade_operation is None or "test_action" not in trade_operation:
-        return {"status": 400, "msg": "no test_action defined in case stage"}
+    return {"status": 200, "msg": "success", "data": results}
+
+
+def match_unordered_trade(
+    session: MockSession,
+    security: str,
+    price: float,
+    volume: int,
+    order_side: OrderSide,
+    bid_type: BidType,
+):
+    # 乱序模式：在待执行的买卖步骤中查找匹配的委托，不要求是当前步骤
+    case_data = session.case_data
+    casename = case_data["case"]
+    if len(casename) == 0 or case_data["index"] == -1:
+        return {"status": 400, "msg": f"no case file loaded, {casename}"}
 
-    if "parameters" not in trade_operation or "trade_result" not in trade_operation:
+    action = ORDER_ACTIONS[(order_side, bid_type)]
+    key = expectation_key(action, security, volume, price)
+    index = pop_expectation(case_data["expects"], key)
+    if index is None:
         return {
             "status": 400,
-            "msg": "parameters and trade_result in trade operation not defined",
+            "msg": f"no pending trade operation matched, {casename} -> {action}, {security}, {price}, {volume}",
         }
 
+    item = case_data["items"][index]
+    ok_body, _ = case_data["responses"][index]
+    if index == case_data["index"]:
+        execute_entrust_case(session, item)
+        proceed_to_nextstep(session)
+    else:
+        apply_case_step(session, item)
+        mark_step_done(session, index)
+
+    return {
+        "status": 200,
+        "msg": "success",
+        "data": item["trade_result"],
+        "body": ok_body,
+    }
+
+
+# ------------------------------- 模拟撮合 ---------------------------------------
+
+
+def wrapper_set_simulation(session: MockSession, enabled: bool):
+    # 模拟撮合模式下委托按本地行情撮合，不再需要用例
+    journal.record(session, "simulation", enabled)
+    session.simulation = bool(enabled)
+    return {
+        "status": 200,
+        "msg": "success",
+        "data": {"simulation": session.simulation},
+    }
+
+
+def simulate_trade(
+    session: MockSession,
+    security: str,
+    price: float,
+    volume: int,
+    order_side: OrderSide,
+    bid_type: BidType,
+):
+    if not isinstance(volume, int) or volume <= 0:
+        return {"status": 400, "msg": f"invalid volume: {volume}"}
+    if bid_type == BidType.LIMIT and not isinstance(price, (int, float)):
+        return {"status": 400, "msg": f"invalid price: {price}"}
+
+    ledger = session.ledger
+    pos = ledger.positions.get(security)
+    sellable = pos.sellable if pos is not None else 0
+
+    now = session.now()
+    bar_used = session.bar_used
+    last_used = bar_used.get(security)
+    entrust = match_order(
+        security,
+        price or 0,
+        volume,
+        order_side,
+        bid_type,
+        sellable,
+        ledger.available(),
+        bar_used,
+        now,
+    )
+    if bar_used.get(security) != last_used:
+        # 撮合时已经更新，记录下来用于重放
+        journal.record(session, "bar_used", security, bar_used[security])
+    apply_entrust_data(session, [entrust])
+
+    return {"status": 200, "msg": "success", "data": entrust}
+
+
+def restore_bar_used(session: MockSession, code: str, used: tuple):
+    session.bar_used[code] = used
+
+
+def simulate_cancel(session: MockSession, entrust_list: list):
+    # 未成交和部分成交的委托改为撤单状态，其它委托原样返回
+    entrusts = session.accunt_info["entursts"]
+
+    results = {}
+    for entrust_no in entrust_list:
+        entrust = entrusts.get(entrust_no)
+        if entrust is None:
+            continue
+
+        if entrust.status in (OrderStatus.NO_DEAL, OrderStatus.PARTIAL_TRANSACTION):
+            entrust = entrust.replace(status=int(OrderStatus.CANCEL_ALL_ORDERS))
+            apply_entrust_data(session, [entrust])
+        results[entrust_no] = entrust
+
+    return results
+
+
+# ------------------------------- 委托延迟 ---------------------------------------
+
+
+def wrapper_get_latency(session: MockSession):
+    key = (session.session_id, session.account_id)
+    data = session.latency.to_dict()
+    data["pending"] = latency.pending_count(key)
+    return {"status": 200, "msg": "success", "data": data}
+
+
+def wrapper_set_latency(session: MockSession, params: dict):
+    """设置委托应答的延迟和应答后的成交推进，参数为空时恢复立即应答：
+
+    {"ack": {"dist": "uniform", "min_ms": 5, "max_ms": 50},
+     "fills": [{"delay": {"dist": "fixed", "ms": 200}, "status": 2, "ratio": 0.5},
+               {"delay": {"dist": "empirical", "samples_ms": [300, 500]}, "status": 3}],
+     "seed": 42}
+    """
+    try:
+        session.latency.configure(params)
+    except ValueError as e:
+        return {"status": 400, "msg": str(e)}
+
+    journal.record(session, "latency", params)
+    return wrapper_get_latency(session)
+
+
+def order_ack_delay(session: MockSession, results: list) -> float:
+    """返回委托应答前等待的秒数，并为未成交的委托安排应答之后的成交推进"""
+    profile = session.latency
+    delay = profile.ack_delay()
+    if len(profile.fills) == 0:
+        return delay
+
+    for data in results:
+        if data is None:
+            continue
+        data = as_entrust(data)
+        if data.status in (OrderStatus.NO_DEAL, OrderStatus.PARTIAL_TRANSACTION):
+            schedule_fill(session, data.entrust_no, 0, delay)
+
+    return delay
+
+
+def trade_ack_delay(session: MockSession, result: dict) -> float:
+    # 单个委托的应答，失败的委托同样需要等待
+    return order_ack_delay(session, [result["data"]] if result["status"] == 200 else [])
+
+
+def schedule_fill(session: MockSession, entrust_no: str, step: int, delay: float):
+    # 延迟按真实时间计时：虚拟时钟可能冻结，按虚拟时间安排的成交在冻结期间永远
+    # 不会发生；成交记录中的时间使用执行时会话的虚拟时间
+    fills = session.latency.fills
+    if step >= len(fills):
+        return
+
+    key = (session.session_id, session.account_id)
+    delay += fills[step].delay.sample(session.latency.rng)
+    latency.schedule(key, entrust_no, delay, fire_scheduled_fill, key, entrust_no, step)
+
+
+def fire_scheduled_fill(key: tuple, entrust_no: str, step: int):
+    # 在事件循环的定时器中执行，会话存储会阻塞时交给线程池
+    latency.finish(key, entrust_no)
+    if store_blocking():
+        loop = asyncio.get_running_loop()
+        loop.run_in_executor(None, apply_scheduled_fill, key, entrust_no, step)
+    else:
+        apply_scheduled_fill(key, entrust_no, step)
+
+
+def apply_scheduled_fill(key: tuple, entrust_no: str, step: int):
+    # 和请求一样通过会话存储读写会话
+    try:
+        with session_scope(*key) as session:
+            fills = session.latency.fills
+            entrust = session.accunt_info["entursts"].get(entrust_no)
+            # 委托已撤销、已成交或已被清除时不再推进
+            if step >= len(fills) or entrust is None:
+                return
+            if entrust.status not in (
+                OrderStatus.NO_DEAL,
+                OrderStatus.PARTIAL_TRANSACTION,
+            ):
+                return
+
+            fill = fills[step]
+            volume = entrust.volume or 0
+            filled = max(int(volume * fill.ratio), entrust.filled or 0)
+            price = entrust.price or entrust.filled_vwap or 0
+            datestr = session.now().strftime(TIME_FORMAT)
+            data = entrust.replace(
+                status=fill.status,
+                filled=filled,
+                filled_vwap=price,
+                filled_amount=round(filled * price, 2),
+                time=datestr,
+                recv_at=datestr,
+            )
+            apply_entrust_data(session, [data])
+
+            schedule_fill(session, entrust_no, step + 1, 0)
+    except Exception as e:
+        logger.exception("scheduled fill failed: %s, %s", entrust_no, e)
+
+
+def wrapper_cancel_entrust(session: MockSession, entrust_no: str):
+    if session.simulation:
+        results = simulate_cancel(session, [entrust_no])
+        if entrust_no not in results:
+            return {"status": 400, "msg": f"entrust not found: {entrust_no}"}
+        return {"status": 200, "msg": "success", "data": results[entrust_no]}
+
+    case_data = session.case_data
+    result = validate_action_before_executed(session)
+    if result["status"] != 200:
+        return result
+
+    casename = case_data["case"]
+    items = case_data["items"]
+    index = case_data["index"]
+    exec_flag = case_data["executed"]
+
+    trade_operation = items[index]
     if trade_operation["test_action"] != "cancel_entrust":
         return {
             "status": 400,
@@ -489,41 +1147,39 @@ def wrapper_cancel_entrust(account_id: str, entrust_no: str):
     params = trade_operation["parameters"]
     data = trade_operation["trade_result"]
 
+    ok_body, mismatch_body = case_data["responses"][index]
     entrust_in_action = params["entrust_no"]
     if isinstance(entrust_in_action, list) or entrust_in_action != entrust_no:
         return {
             "status": 400,
             "msg": f"parameters in trade operation not matched, {casename} -> {trade_operation['stage']}",
+            "body": mismatch_body,
         }
 
     # 设置当前步骤已执行
-    execute_entrust_case(trade_operation)
+    execute_entrust_case(session, trade_operation)
     # 跳到下一个步骤
-    proceed_to_nextstep()
+    proceed_to_nextstep(session)
+
+    return {"status": 200, "msg": "success", "data": data, "body": ok_body}
 
-    return {"status": 200, "msg": "success", "data": data}
 
+def wrapper_cancel_entrusts(session: MockSession, entrust_list: list):
+    if session.simulation:
+        results = simulate_cancel(session, entrust_list)
+        return {"status": 200, "msg": "success", "data": results}
 
-def wrapper_cancel_entrusts(account_id: str, entrust_list: list):
-    result = validate_action_before_executed()
+    case_data = session.case_data
+    result = validate_action_before_executed(session)
     if result["status"] != 200:
         return result
 
-    casename = global_case_data["case"]
-    items = global_case_data["items"]
-    index = global_case_data["index"]
-    exec_flag = global_case_data["executed"]
+    casename = case_data["case"]
+    items = case_data["items"]
+    index = case_data["index"]
+    exec_flag = case_data["executed"]
 
     trade_operation = items[index]
-    if trade_operation is None or "test_action" not in trade_operation:
-        return {"status": 400, "msg": "no test_action defined in case stage"}
-
-    if "parameters" not in trade_operation or "trade_result" not in trade_operation:
-        return {
-            "status": 400,
-            "msg": "parameters and trade_result in trade operation not defined",
-        }
-
     if trade_operation["test_action"] != "cancel_entrusts":
         return {
             "status": 400,
@@ -540,17 +1196,14 @@ def wrapper_cancel_entrusts(account_id: str, entrust_list: list):
     params = trade_operation["parameters"]
     # entrust list
     data = trade_operation["trade_result"]
-    if not isinstance(data, list):
-        return {
-            "status": 400,
-            "msg": f"entrust result in trade operation must be list, {casename} -> {trade_operation['stage']}",
-        }
 
+    ok_body, mismatch_body = case_data["responses"][index]
     order_list = params["entrust_no"]
     if not isinstance(order_list, list) or len(order_list) != len(entrust_list):
         return {
             "status": 400,
             "msg": f"parameters in trade operation not matched, {casename} -> {trade_operation['stage']}",
+            "body": mismatch_body,
         }
 
     id_matched = True
@@ -565,18 +1218,45 @@ def wrapper_cancel_entrusts(account_id: str, entrust_list: list):
         }
 
     # 设置当前步骤已执行
-    execute_entrust_case(trade_operation)
+    execute_entrust_case(session, trade_operation)
     # 跳到下一个步骤
-    proceed_to_nextstep()
+    proceed_to_nextstep(session)
 
     results = {}
     for tmp in data:
         results[tmp["entrust_no"]] = tmp
-    return {"status": 200, "msg": "success", "data": results}
+    return {"status": 200, "msg": "success", "data": results, "body": ok_body}
 
 
-def wrapper_get_today_entrusts(entrust_list):
-    db_entrusts = global_accunt_info["entursts"]
+def query_changes(session: MockSession, kind: str, since_seq: int, limit: int = None):
+    """读取序号since_seq之后变化过的委托或成交，同一委托只返回最新的状态
+
+    limit限制本次读取的变化记录数，返回的seq作为下一次查询的since_seq。
+    """
+    changes = {}
+    cursor = since_seq
+    count = 0
+    for event in session.events.iter_since(since_seq):
+        if event["type"] == kind:
+            if limit is not None and count >= limit:
+                break
+            count += 1
+            data = event["data"]
+            changes[data.entrust_no] = data
+        cursor = event["seq"]
+
+    return {"seq": cursor, "items": changes}
+
+
+def wrapper_get_today_entrusts(
+    session: MockSession, entrust_list, since_seq: int = None, limit: int = None
+):
+    # 指定since_seq时只返回该序号之后变化的委托
+    if since_seq is not None:
+        data = query_changes(session, "entrust", since_seq, limit)
+        return {"status": 200, "msg": "success", "data": data}
+
+    db_entrusts = session.accunt_info["entursts"]
     if len(db_entrusts) == 0:
         return {"status": 200, "msg": "success", "data": {}}
 
@@ -591,12 +1271,69 @@ def wrapper_get_today_entrusts(entrust_list):
     return {"status": 200, "msg": "success", "data": out_entrusts}
 
 
-def wrapper_get_today_trades():
-    trades = global_accunt_info["trades"]
+def wrapper_get_today_trades(
+    session: MockSession, since_seq: int = None, limit: int = None
+):
+    # 指定since_seq时只返回该序号之后变化的成交
+    if since_seq is not None:
+        data = query_changes(session, "trade", since_seq, limit)
+        return {"status": 200, "msg": "success", "data": data}
+
+    trades = session.accunt_info["trades"]
     if len(trades) == 0:
         return {"status": 200, "msg": "success", "data": []}
 
-    out_trades = {}
-    for entrust_no in trades:
-        out_trades[entrust_no] = trades[entrust_no]
-    return {"status": 200, "msg": "success", "data": out_trades}
+    return {"status": 200, "msg": "success", "data": trades}
+
+
+def wrapper_get_archive(
+    session: MockSession, store: str = None, entrust_no: str = None, limit=None
+):
+    # 查询按保留规则清理掉的记录
+    data = read_archive(session.session_id, store, entrust_no, limit)
+    return {"status": 200, "msg": "success", "data": data}
+
+
+def wrapper_get_events(session: MockSession, since_seq: int, limit: int = None):
+    # 读取序号since_seq之后的委托和成交变化
+    events = session.events.since(since_seq, limit)
+    return {"status": 200, "msg": "success", "data": events}
+
+
+# ------------------------------- 日志重放 ---------------------------------------
+
+
+def replay_day_roll(session: MockSession, today):
+    # 重放之前的记录时可能已经完成了日切
+    if session.trade_date is None or today > session.trade_date:
+        session.roll_day(today)
+
+
+REPLAY_HANDLERS = {
+    "entrusts": apply_entrust_data,
+    "history": append_history,
+    "cursor": set_cursor,
+    "step_done": mark_step_done,
+    "load": install_case,
+    "reset": wrapper_reset_exec_data,
+    "clock": restore_clock,
+    "day_roll": replay_day_roll,
+    "simulation": wrapper_set_simulation,
+    "bar_used": restore_bar_used,
+    "latency": wrapper_set_latency,
+    "playlist_add": replay_playlist_add,
+    "playlist_next": next_in_playlist,
+    "playlist_clear": wrapper_clear_playlist,
+}
+
+
+def replay_transition(session_id: str, account_id: str, op: str, now, args: tuple):
+    """把预写日志中的一条记录应用到会话上，时钟固定为记录时的虚拟时间"""
+    with session_scope(session_id, account_id) as session:
+        apply_transition(session, op, now, args)
+
+
+def apply_transition(session: MockSession, op: str, now, args: tuple):
+    # 共享存储用来应用其它worker进程产生的状态变化
+    with session.clock.pin(now):
+        REPLAY_HANDLERS[op](session, *args)
@@ -0,0 +1,225 @@
+import glob
+import logging
+import os
+import pickle
+import struct
+import threading
+from contextlib import contextmanager
+from os import path
+
+logger = logging.getLogger(__name__)
+
+_header = struct.Struct("<I")
+
+# 删除会话的记录，由StateJournal处理，不交给replay
+EVICT = "evict"
+
+# 正在重放日志，重放时不再记录，也不写归档等外部文件。共享存储在线程池中
+# 重放其它进程的记录，标志只对当前线程有效
+_local = threading.local()
+
+
+def is_replaying() -> bool:
+    return getattr(_local, "replaying", False)
+
+
+@contextmanager
+def replaying():
+    _local.replaying = True
+    try:
+        yield
+    finally:
+        _local.replaying = False
+
+
+class StateJournal:
+    """内存会话的预写日志和快照
+
+    每次状态变化（委托更新、游标推进、加载用例、重置、时钟等）追加一条记录到
+    wal-<代>.log；每写入snapshot_every条记录，在会话状态一致时保存一次全部
+    会话的快照，并切换到新一代日志。重启时读取最新的快照，再重放之后各代的
+    日志，恢复时间与快照之后的记录数有关，与日志的总长度无关。
+
+    保存快照时只在调用线程中序列化上次快照之后有记录的会话，其余会话沿用上次
+    序列化的结果；写入文件在后台线程中进行，不阻塞事件循环。
+    """
+
+    def __init__(self, folder: str, snapshot_every: int = 10000, fsync=False):
+        self.folder = folder
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+
+        self.generation = 0
+        self.pending = 0
+        self._writer = None
+        # 会话ID -> 上次快照中序列化的会话
+        self._saved = {}
+        # 上次快照之后有记录的会话
+        self._dirty = set()
+        # 正在写入快照的后台线程
+        self._snapshot_thread = None
+
+        os.makedirs(folder, exist_ok=True)
+
+    def _wal_file(self, generation: int) -> str:
+        return path.join(self.folder, f"wal-{generation:08d}.log")
+
+    def _snapshot_file(self) -> str:
+        return path.join(self.folder, "snapshot.pkl")
+
+    def _open(self, generation: int):
+        if self._writer is not None:
+            self._writer.close()
+
+        self.generation = generation
+        self._writer = open(self._wal_file(generation), "ab")
+
+    def append(self, session_id: str, account_id: str, op: str, now, args: tuple):
+        data = pickle.dumps(
+            (session_id, account_id, op, now, args), protocol=pickle.HIGHEST_PROTOCOL
+        )
+        writer = self._writer
+        writer.write(_header.pack(len(data)) + data)
+        writer.flush()
+        if self.fsync:
+            os.fsync(writer.fileno())
+
+        self.pending += 1
+        self._dirty.add(session_id)
+
+    def evict(self, session_id: str):
+        # 会话被删除，恢复时不再从快照和之前的记录中重建
+        self.append(session_id, None, EVICT, None, ())
+
+    def should_snapshot(self) -> bool:
+        # 上一次快照还在写入时不开始新的快照
+        writing = self._snapshot_thread is not None and self._snapshot_thread.is_alive()
+        return self.pending >= self.snapshot_every and not writing
+
+    def snapshot(self, sessions: dict):
+        """保存快照，之后的记录写入新一代日志，被快照覆盖的日志在写入后删除"""
+        covered = self.generation
+        self._open(covered + 1)
+        self.pending = 0
+
+        saved = {}
+        for session_id, session in sessions.items():
+            data = self._saved.get(session_id)
+            if data is None or session_id in self._dirty:
+                data = pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+            saved[session_id] = data
+        self._saved = saved
+        self._dirty = set()
+
+        self._snapshot_thread = threading.Thread(
+            target=self._write_snapshot, args=(covered, saved), name="wal-snapshot"
+        )
+        self._snapshot_thread.start()
+
+    def _write_snapshot(self, covered: int, saved: dict):
+        file = self._snapshot_file()
+        tmp = file + ".tmp"
+        with open(tmp, "wb") as writer:
+            pickle.dump(
+                {"generation": covered, "sessions": saved},
+                writer,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+            writer.flush()
+            os.fsync(writer.fileno())
+        os.replace(tmp, file)
+
+        for generation, wal in self._wal_files():
+            if generation <= covered:
+                os.remove(wal)
+        logger.info("state snapshot saved: %d sessions", len(saved))
+
+    def _wal_files(self) -> list:
+        files = []
+        for wal in glob.glob(path.join(self.folder, "wal-*.log")):
+            name = path.basename(wal)
+            files.append((int(name[4:-4]), wal))
+        return sorted(files)
+
+    def _read_wal(self, wal: str):
+        with open(wal, "rb") as reader:
+            while True:
+                header = reader.read(_header.size)
+                if len(header) < _header.size:
+                    break
+                (size,) = _header.unpack(header)
+                data = reader.read(size)
+                try:
+                    if len(data) < size:
+                        raise EOFError(f"{len(data)} < {size}")
+                    entry = pickle.loads(data)
+                except Exception as e:
+                    # 写入到一半时进程退出，丢弃不完整的记录
+                    logger.warning("truncated record at the end of %s: %s", wal, e)
+                    break
+                yield entry
+
+    def recover(self, sessions: dict, replay) -> int:
+        """把快照中的会话读入sessions，再重放之后的日志，返回重放的记录数
+
+        replay(会话ID, 账户ID, 操作, 虚拟时间, 参数)负责把一条记录应用到会话上。
+        """
+        covered = -1
+        file = self._snapshot_file()
+        if path.exists(file):
+            with open(file, "rb") as reader:
+                state = pickle.load(reader)
+            self._saved = state["sessions"]
+            for session_id, data in self._saved.items():
+                sessions[session_id] = pickle.loads(data)
+            covered = state["generation"]
+
+        count = 0
+        last = covered
+        with replaying():
+            for generation, wal in self._wal_files():
+                if generation <= covered:
+                    continue
+                last = generation
+                for entry in self._read_wal(wal):
+                    self._dirty.add(entry[0])
+                    if entry[2] == EVICT:
+                        sessions.pop(entry[0], None)
+                    else:
+                        replay(*entry)
+                    count += 1
+
+        # 在新一代日志中继续写入，不在可能不完整的旧日志后面追加
+        self._open(last + 1)
+        self.pending = count
+        logger.info(
+            "state recovered: %d sessions, %d records replayed", len(sessions), count
+        )
+        return count
+
+    def close(self):
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+journal = None
+
+
+def init_journal(state_journal: StateJournal):
+    # 恢复完成后才开始记录
+    global journal
+
+    journal = state_journal
+
+
+def record(session, op: str, *args):
+    """记录会话的一次状态变化及当时的虚拟时间，未启用预写日志时不做任何事"""
+    if journal is not None and not is_replaying():
+        journal.append(
+            session.session_id, session.account_id, op, session.clock.now(), args
+        )
@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+
+from mockserver.trade import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+# 成交推进只能到部分成交或全部成交
+FILL_STATUS = (OrderStatus.PARTIAL_TRANSACTION, OrderStatus.ALL_TRANSACTIONS)
+
+
+def _non_negative(value) -> bool:
+    return (
+        isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
+    )
+
+
+class LatencyProfile:
+    """延迟分布，单位为毫秒，例如：
+
+    {"dist": "fixed", "ms": 20}
+    {"dist": "uniform", "min_ms": 5, "max_ms": 50}
+    {"dist": "empirical", "samples_ms": [3, 4, 4, 5, 8, 120]}
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError(f"invalid latency: {spec}")
+
+        dist = spec.get("dist", "fixed")
+        if dist == "fixed":
+            values = (spec.get("ms"),)
+        elif dist == "uniform":
+            values = (spec.get("min_ms"), spec.get("max_ms"))
+            if all(_non_negative(x) for x in values) and values[0] > values[1]:
+                raise ValueError(f"min_ms greater than max_ms: {spec}")
+        elif dist == "empirical":
+            values = spec.get("samples_ms")
+            if not isinstance(values, list) or len(values) == 0:
+                raise ValueError(f"samples_ms must be a non-empty list: {spec}")
+            values = tuple(values)
+        else:
+            raise ValueError(f"unknown latency dist: {dist}")
+
+        if not all(_non_negative(x) for x in values):
+            raise ValueError(f"latency must be non-negative numbers: {spec}")
+
+        self.dist = dist
+        self.values = values
+
+    def sample(self, rng: random.Random) -> float:
+        # 返回秒
+        if self.dist == "fixed":
+            ms = self.values[0]
+        elif self.dist == "uniform":
+            ms = rng.uniform(*self.values)
+        else:
+            ms = rng.choice(self.values)
+
+        return ms / 1000
+
+    def to_dict(self) -> dict:
+        if self.dist == "fixed":
+            return {"dist": "fixed", "ms": self.values[0]}
+        if self.dist == "uniform":
+            return {
+                "dist": "uniform",
+                "min_ms": self.values[0],
+                "max_ms": self.values[1],
+            }
+        return {"dist": "empirical", "samples_ms": list(self.values)}
+
+
+class FillStep:
+    """委托应答之后的一次状态变化，delay为与上一次变化的间隔
+
+    {"delay": {"dist": "fixed", "ms": 200}, "status": 2, "ratio": 0.5}
+    """
+
+    def __init__(self, spec):
+        if not isinstance(spec, dict):
+            raise ValueError(f"invalid fill: {spec}")
+
+        self.delay = LatencyProfile(spec.get("delay"))
+
+        status = spec.get("status")
+        if status not in FILL_STATUS:
+            raise ValueError(
+                f"fill status must be one of {[int(x) for x in FILL_STATUS]}"
+            )
+        self.status = int(status)
+
+        # 全部成交时成交比例为1，部分成交时必须指定
+        ratio = 1 if status == OrderStatus.ALL_TRANSACTIONS else spec.get("ratio")
+        if not _non_negative(ratio) or not 0 < ratio <= 1:
+            raise ValueError(f"fill ratio must be in (0, 1]: {spec}")
+        self.ratio = ratio
+
+    def to_dict(self) -> dict:
+        return {
+            "delay": self.delay.to_dict(),
+            "status": self.status,
+            "ratio": self.ratio,
+        }
+
+
+class SessionLatency:
+    """会话的委托应答延迟和成交推进设置，未设置时立即应答、不推进成交"""
+
+    def __init__(self):
+        self.ack = None
+        self.fills = []
+        self.seed = None
+        self.rng = random.Random()
+
+    def configure(self, params: dict):
+        # 先检查全部参数，出错时保留原来的设置
+        ack = params.get("ack")
+        ack = LatencyProfile(ack) if ack is not None else None
+
+        fills = params.get("fills") or []
+        if not isinstance(fills, list):
+            raise ValueError("fills must be a list")
+        fills = [FillStep(x) for x in fills]
+
+        self.ack = ack
+        self.fills = fills
+        self.seed = params.get("seed")
+        self.rng = random.Random(self.seed)
+
+    def ack_delay(self) -> float:
+        if self.ack is None:
+            return 0
+        return self.ack.sample(self.rng)
+
+    def to_dict(self) -> dict:
+        return {
+            "ack": None if self.ack is None else self.ack.to_dict(),
+            "fills": [x.to_dict() for x in self.fills],
+            "seed": self.seed,
+        }
+
+
+# (会话ID, 账户ID) -> {委托编号: 定时器}，定时器不能随会话保存，放在进程内，
+# 只在事件循环所在线程中修改
+_timers = {}
+_loop = None
+
+
+def bind_loop(loop):
+    # 会话存储在线程池中读写时，从工作线程安排的定时器交给这个事件循环
+    global _loop
+    _loop = loop
+
+
+def _in_loop(func, *args) -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        loop = _loop
+        if loop is None or loop.is_closed():
+            return False
+        loop.call_soon_threadsafe(func, *args)
+        return True
+
+    func(*args)
+    return True
+
+
+def schedule(key: tuple, entrust_no: str, delay: float, callback, *args) -> bool:
+    """在delay秒后执行callback，同一委托只保留最新的定时器，没有事件循环时返回False"""
+    if not _in_loop(_schedule, key, entrust_no, delay, callback, args):
+        logger.warning("no running event loop, fill of %s not scheduled", entrust_no)
+        return False
+    return True
+
+
+def _schedule(key: tuple, entrust_no: str, delay: float, callback, args: tuple):
+    timers = _timers.setdefault(key, {})
+    old = timers.pop(entrust_no, None)
+    if old is not None:
+        old.cancel()
+
+    loop = asyncio.get_running_loop()
+    timers[entrust_no] = loop.call_later(delay, callback, *args)
+
+
+def finish(key: tuple, entrust_no: str):
+    # 定时器已经执行
+    timers = _timers.get(key)
+    if timers is not None:
+        timers.pop(entrust_no, None)
+        if len(timers) == 0:
+            del _timers[key]
+
+
+def cancel_all(key: tuple) -> int:
+    count = pending_count(key)
+    _in_loop(_cancel_all, key)
+    return count
+
+
+def _cancel_all(key: tuple):
+    for handle in _timers.pop(key, {}).values():
+        handle.cancel()
+
+
+def pending_count(key: tuple) -> int:
+    return len(_timers.get(key, {}))
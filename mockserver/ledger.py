@@ -0,0 +1,134 @@
+import logging
+
+from mockserver.records import Entrust, Position
+from mockserver.trade import OrderSide, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+
+class PositionLedger:
+    """账户账本，按委托和成交的增量更新资金和持仓，开销与历史成交数量无关
+
+    同一委托的多次成交回报（部分成交 -> 全部成交）只累计与上次回报的差额，
+    不会重复计算。买入的股份当日不可卖出，日切时统一释放（T+1）。
+    """
+
+    def __init__(self, account_id: str, capital: float = 0):
+        self.account_id = account_id
+        self.capital = capital
+        self.clear()
+
+    def clear(self):
+        self.cash = self.capital
+        self.frozen = 0.0
+        self.market_value = 0.0
+        # 证券代码 -> 持仓
+        self.positions = {}
+        # (委托编号, 证券代码, 方向) -> (已成交数量, 已成交金额, 交易费用)
+        self.fills = {}
+        # (委托编号, 证券代码, 方向) -> 买入委托冻结的资金
+        self.frozen_cash = {}
+
+    def apply_entrust(self, data: Entrust):
+        # 每个委托回报先更新冻结资金，再按成交增量更新资金和持仓
+        self._update_frozen(data)
+        return self.apply_fill(data)
+
+    @staticmethod
+    def _fill_key(data: Entrust) -> tuple:
+        # 不同用例可能重复使用委托编号，只有编号、代码和方向都相同才是同一委托
+        return data.entrust_no, data.code, data.order_side
+
+    def _update_frozen(self, data: Entrust):
+        key = self._fill_key(data)
+        amount = 0.0
+        if data.order_side == OrderSide.BUY and data.status in (
+            OrderStatus.NO_DEAL,
+            OrderStatus.PARTIAL_TRANSACTION,
+        ):
+            # 市价委托没有委托价，不冻结资金
+            remaining = int(data.volume) - int(data.filled or 0)
+            amount = max(float(data.price or 0) * remaining, 0.0)
+
+        last = self.frozen_cash.pop(key, 0.0)
+        if amount > 0:
+            self.frozen_cash[key] = amount
+        self.frozen += amount - last
+
+    def apply_fill(self, data: Entrust):
+        status = int(data.status)
+        if status in (OrderStatus.ERROR, OrderStatus.NO_DEAL):
+            # 未成交的委托不参与计算
+            return None
+
+        key = self._fill_key(data)
+        filled_vol = int(data.filled or 0)
+        filled_amount = float(data.filled_amount or 0)
+        fees = float(data.trade_fees or 0)
+
+        last_vol, last_amount, last_fees = self.fills.get(key, (0, 0.0, 0.0))
+        delta_vol = filled_vol - last_vol
+        delta_amount = filled_amount - last_amount
+        delta_fees = fees - last_fees
+        self.fills[key] = (filled_vol, filled_amount, fees)
+
+        if delta_vol == 0 and delta_amount == 0 and delta_fees == 0:
+            return None
+
+        code = data.code
+        pos = self.positions.get(code)
+        if pos is None:
+            pos = Position(self.account_id, code)
+            self.positions[code] = pos
+
+        self.cash -= delta_fees
+        if data.order_side == OrderSide.BUY:
+            self.cash -= delta_amount
+            # 当日买入的股份不可卖出
+            pos.shares += delta_vol
+        else:
+            self.cash += delta_amount
+            pos.shares -= delta_vol
+            pos.sellable = max(pos.sellable - delta_vol, 0)
+            delta_amount = -delta_amount
+
+        pos.amount += delta_amount
+        if pos.shares == 0:
+            pos.price = 0
+        else:
+            pos.price = pos.amount / pos.shares
+
+        # 按最新成交价计算市值
+        if delta_vol != 0:
+            last_price = abs(delta_amount / delta_vol)
+            market_value = pos.shares * last_price
+            self.market_value += market_value - pos.market_value
+            pos.market_value = market_value
+
+        return pos
+
+    def forget(self, data: Entrust):
+        # 已终结的委托不会再有成交回报，清理时同时删除其成交累计
+        key = self._fill_key(data)
+        self.fills.pop(key, None)
+        self.frozen_cash.pop(key, None)
+
+    def release_sellable(self):
+        # 日切时释放全部持仓的可卖数量
+        for pos in self.positions.values():
+            pos.sellable = pos.shares
+
+    def available(self) -> float:
+        # 可用资金，不含未成交的买入委托冻结的资金
+        return self.cash - self.frozen
+
+    def balance(self) -> dict:
+        total = self.cash + self.market_value
+        pnl = total - self.capital
+        return {
+            "account": self.account_id,
+            "available": self.available(),
+            "pnl": pnl,
+            "total": total,
+            "ppnl": pnl / self.capital if self.capital else 0,
+        }
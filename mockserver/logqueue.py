@@ -0,0 +1,105 @@
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler
+
+
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record):
+        # 参数在调用时合并到消息中，之后被修改的委托等对象不影响日志内容；
+        # 时间、格式串等handler的格式化推迟到后台线程中进行
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class BatchingQueueListener:
+    """后台线程从队列中取出日志记录，成批写入文件后只刷新一次
+
+    事件循环线程中只把日志记录放入队列，不再等待磁盘IO。
+    """
+
+    _sentinel = None
+
+    def __init__(self, log_queue: queue.Queue, handler: logging.Handler, batch=256):
+        self.queue = log_queue
+        self.handler = handler
+        self.batch = batch
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._monitor, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def restart(self):
+        self._thread = None
+        self.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self.queue.put_nowait(self._sentinel)
+        self._thread.join()
+        self._thread = None
+
+    def _write(self, records: list):
+        handler = self.handler
+        lines = []
+        for record in records:
+            if record.levelno >= handler.level:
+                lines.append(handler.format(record))
+
+        if len(lines) == 0:
+            return
+
+        handler.acquire()
+        try:
+            handler.stream.write(handler.terminator.join(lines) + handler.terminator)
+            handler.flush()
+        except Exception:
+            handler.handleError(records[-1])
+        finally:
+            handler.release()
+
+    def _monitor(self):
+        q = self.queue
+        while True:
+            record = q.get()
+            stop = record is self._sentinel
+            records = [] if stop else [record]
+
+            # 取出队列中已有的记录，一起写入
+            while not stop and len(records) < self.batch:
+                try:
+                    record = q.get_nowait()
+                except queue.Empty:
+                    break
+                if record is self._sentinel:
+                    stop = True
+                else:
+                    records.append(record)
+
+            self._write(records)
+            if stop:
+                return
+
+
+def init_queue_logging(handler: logging.StreamHandler, loglevel: int):
+    """根日志器只挂载QueueHandler，由后台线程写入handler，返回监听器"""
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, handler)
+
+    root = logging.getLogger()
+    root.setLevel(loglevel)
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(DeferredQueueHandler(log_queue))
+
+    listener.start()
+    # fork出的worker进程中没有后台线程，需要重新启动
+    os.register_at_fork(after_in_child=listener.restart)
+    return listener
@@ -0,0 +1,80 @@
+from collections import deque
+
+from mockserver.trade import BidType, OrderSide
+
+# (买卖方向, 委托类型) -> 用例中的test_action
+ORDER_ACTIONS = {
+    (OrderSide.BUY, BidType.LIMIT): "buy",
+    (OrderSide.BUY, BidType.MARKET): "market_buy",
+    (OrderSide.SELL, BidType.LIMIT): "sell",
+    (OrderSide.SELL, BidType.MARKET): "market_sell",
+}
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def expectation_key(action: str, code: str, volume: int, price: float):
+    """乱序模式的匹配键，数量或价格不是数字时返回None，不与任何步骤匹配
+
+    与顺序模式相同，数量必须相等，价格精确到0.001；市价委托不比较价格。
+    """
+    if action.startswith("market_"):
+        price = 0
+    elif not is_number(price):
+        return None
+
+    if not is_number(volume):
+        return None
+
+    return (action, code, volume, round(price, 3))
+
+
+def build_expectations(items: list) -> dict:
+    """为乱序模式建立待执行交易步骤的索引
+
+    以(动作, 代码, 数量, 价格)为键，值为步骤序号的队列，相同委托按用例顺序匹配。
+    """
+    expects = {}
+    for index, item in enumerate(items):
+        action = item["test_action"]
+        if action not in ORDER_ACTIONS.values() or "parameters" not in item:
+            continue
+
+        params = item["parameters"]
+        key = expectation_key(
+            action, params["code"], params["volume"], params.get("price")
+        )
+        expects.setdefault(key, deque()).append(index)
+
+    return expects
+
+
+def discard_expectation(expects: dict, items: list, index: int):
+    # 从索引中删除已经执行的步骤，用于重放日志
+    item = items[index]
+    params = item.get("parameters")
+    if item["test_action"] not in ORDER_ACTIONS.values() or params is None:
+        return
+
+    key = expectation_key(
+        item["test_action"], params["code"], params["volume"], params.get("price")
+    )
+    pending = expects.get(key)
+    if pending and index in pending:
+        pending.remove(index)
+        if len(pending) == 0:
+            del expects[key]
+
+
+def pop_expectation(expects: dict, key):
+    pending = expects.get(key)
+    if not pending:
+        return None
+
+    index = pending.popleft()
+    if len(pending) == 0:
+        del expects[key]
+
+    return index
@@ -0,0 +1,98 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 延迟按2的幂分桶，第i个桶记录小于2**i微秒的请求，最后一个桶为+Inf
+LATENCY_BUCKETS = 26
+
+
+class LatencyHistogram:
+    """固定分桶的延迟直方图
+
+    所有计数在创建时分配，记录时只做整数运算，不加锁（请求都在事件循环线程中
+    处理）。
+    """
+
+    __slots__ = ("counts", "count", "total_us")
+
+    def __init__(self):
+        self.counts = [0] * (LATENCY_BUCKETS + 1)
+        self.count = 0
+        self.total_us = 0
+
+    def record(self, micros: int):
+        index = micros.bit_length()
+        if index > LATENCY_BUCKETS:
+            index = LATENCY_BUCKETS
+
+        self.counts[index] += 1
+        self.count += 1
+        self.total_us += micros
+
+
+class Counters:
+    __slots__ = ("matches", "mismatches", "unauthorized")
+
+    def __init__(self):
+        self.matches = 0
+        self.mismatches = 0
+        self.unauthorized = 0
+
+
+# 路由 -> 直方图
+histograms = {}
+counters = Counters()
+
+
+def record_latency(route: str, elapsed_ns: int):
+    histogram = histograms.get(route)
+    if histogram is None:
+        histogram = LatencyHistogram()
+        histograms[route] = histogram
+
+    histogram.record(elapsed_ns // 1000)
+
+
+def record_trade_result(status: int):
+    if status == 200:
+        counters.matches += 1
+    else:
+        counters.mismatches += 1
+
+
+def reset_metrics():
+    histograms.clear()
+    counters.__init__()
+
+
+def render_prometheus() -> str:
+    """以Prometheus文本格式输出全部指标"""
+    lines = [
+        "# HELP mockserver_request_latency_seconds request latency per route",
+        "# TYPE mockserver_request_latency_seconds histogram",
+    ]
+    for route, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for i, count in enumerate(histogram.counts):
+            cumulative += count
+            le = "+Inf" if i == LATENCY_BUCKETS else f"{(2 ** i) / 1e6:.6f}"
+            lines.append(
+                f'mockserver_request_latency_seconds_bucket{{route="{route}",le="{le}"}} {cumulative}'
+            )
+        lines.append(
+            f'mockserver_request_latency_seconds_sum{{route="{route}"}} {histogram.total_us / 1e6:.6f}'
+        )
+        lines.append(
+            f'mockserver_request_latency_seconds_count{{route="{route}"}} {histogram.count}'
+        )
+
+    for name, help_text in (
+        ("matches", "trade requests matched with the case"),
+        ("mismatches", "trade requests not matched with the case"),
+        ("unauthorized", "requests rejected with 401"),
+    ):
+        lines.append(f"# HELP mockserver_{name}_total {help_text}")
+        lines.append(f"# TYPE mockserver_{name}_total counter")
+        lines.append(f"mockserver_{name}_total {getattr(counters, name)}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,47 @@
+import glob
+import logging
+from collections import deque
+from os import path
+
+logger = logging.getLogger(__name__)
+
+
+class Playlist:
+    """待执行的用例队列，当前用例的最后一个步骤执行后自动加载下一个"""
+
+    def __init__(self):
+        # (用例名称, 模式)
+        self.pending = deque()
+        self.loaded = 0
+        # 加载失败的用例
+        self.errors = []
+        # 正在加载下一个用例，避免连续的委托更新用例递归加载
+        self.advancing = False
+
+    def clear(self):
+        self.pending = deque()
+        self.loaded = 0
+        self.errors = []
+
+    def to_dict(self) -> dict:
+        return {
+            "pending": [name for name, _ in self.pending],
+            "loaded": self.loaded,
+            "errors": self.errors,
+        }
+
+
+CASE_SUFFIXES = (".txt", ".jsonl")
+
+
+def expand_glob(case_dir: str, pattern: str) -> list:
+    # 按文件名排序，返回相对于用例目录、不带后缀的用例名称
+    for suffix in CASE_SUFFIXES:
+        if pattern.endswith(suffix):
+            pattern = pattern[: -len(suffix)]
+
+    names = set()
+    for suffix in CASE_SUFFIXES:
+        files = glob.glob(path.join(case_dir, pattern + suffix), recursive=True)
+        names.update(path.relpath(file, case_dir)[: -len(suffix)] for file in files)
+    return sorted(name.replace(path.sep, "/") for name in names)
@@ -0,0 +1,127 @@
+import sys
+
+ENTRUST_FIELDS = (
+    "name",
+    "code",
+    "price",
+    "volume",
+    "order_side",
+    "bid_type",
+    "time",
+    "entrust_no",
+    "status",
+    "filled",
+    "filled_vwap",
+    "filled_amount",
+    "eid",
+    "trade_fees",
+    "reason",
+    "recv_at",
+)
+_ENTRUST_INDEX = {name: i for i, name in enumerate(ENTRUST_FIELDS)}
+_ALL_PRESENT = (1 << len(ENTRUST_FIELDS)) - 1
+
+
+class Entrust:
+    """委托记录，同时用作成交记录
+
+    用__slots__保存字段，比解析得到的dict占用的内存少得多。用例中可以省略部分
+    字段或者增加额外的字段，序列化时按原样输出：_present按位记录出现过的字段，
+    未知字段保存在_extra中。
+    """
+
+    __slots__ = ENTRUST_FIELDS + ("_present", "_extra")
+
+    def __init__(self, **fields):
+        present = 0
+        for i, name in enumerate(ENTRUST_FIELDS):
+            if name in fields:
+                present |= 1 << i
+            setattr(self, name, fields.get(name))
+
+        self._present = present
+        self._extra = None
+        self._intern()
+
+    def _intern(self):
+        # 证券代码和名称重复出现，共用同一个字符串对象
+        if isinstance(self.code, str):
+            self.code = sys.intern(self.code)
+        if isinstance(self.name, str):
+            self.name = sys.intern(self.name)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Entrust":
+        record = cls(**{k: v for k, v in data.items() if k in _ENTRUST_INDEX})
+        extra = {k: v for k, v in data.items() if k not in _ENTRUST_INDEX}
+        if len(extra) > 0:
+            record._extra = extra
+        return record
+
+    def replace(self, **changes) -> "Entrust":
+        # 委托状态变化时生成新的记录，已推送的记录保持不变
+        record = Entrust.__new__(Entrust)
+        for name in ENTRUST_FIELDS:
+            setattr(record, name, getattr(self, name))
+        record._present = self._present
+        record._extra = self._extra
+
+        for name, value in changes.items():
+            setattr(record, name, value)
+            record._present |= 1 << _ENTRUST_INDEX[name]
+        return record
+
+    def to_dict(self) -> dict:
+        present = self._present
+        if present == _ALL_PRESENT:
+            data = {name: getattr(self, name) for name in ENTRUST_FIELDS}
+        else:
+            data = {
+                name: getattr(self, name)
+                for i, name in enumerate(ENTRUST_FIELDS)
+                if present & (1 << i)
+            }
+
+        if self._extra is not None:
+            data.update(self._extra)
+        return data
+
+    def __repr__(self):
+        # 日志中输出委托的字段
+        return f"Entrust({self.to_dict()!r})"
+
+
+def as_entrust(data) -> Entrust:
+    if isinstance(data, Entrust):
+        return data
+
+    return Entrust.from_dict(data)
+
+
+class Position:
+    """持仓记录"""
+
+    __slots__ = (
+        "account",
+        "code",
+        "shares",
+        "sellable",
+        "price",
+        "market_value",
+        "amount",
+    )
+
+    def __init__(self, account: str, code: str):
+        self.account = account
+        self.code = sys.intern(code)
+        self.shares = 0
+        self.sellable = 0
+        self.price = 0
+        self.market_value = 0
+        self.amount = 0
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in Position.__slots__}
+
+    def __repr__(self):
+        return f"Position({self.to_dict()!r})"
@@ -0,0 +1,274 @@
+import atexit
+import datetime
+import hashlib
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+from os import path
+
+import mockserver.codec as codec
+import mockserver.journal as journal
+from mockserver.trade import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+# 终结状态的委托不会再更新
+TERMINAL_STATUS = (
+    OrderStatus.ERROR,
+    OrderStatus.ALL_TRANSACTIONS,
+    OrderStatus.CANCEL_ALL_ORDERS,
+)
+
+RETENTION_STORES = ("entrusts", "trades", "history", "events")
+
+
+class RetentionPolicy:
+    """一类记录的保留规则，时间都以会话的虚拟时钟计算，单位为秒
+
+    max_count: 最多保留的记录数
+    max_age: 记录最后一次更新后保留的时长
+    terminal_after: 委托进入终结状态后保留的时长，未终结的委托不受影响
+    """
+
+    def __init__(self, max_count: int = None, max_age=None, terminal_after=None):
+        self.max_count = max_count
+        self.max_age = None if max_age is None else datetime.timedelta(seconds=max_age)
+        self.terminal_after = (
+            None
+            if terminal_after is None
+            else datetime.timedelta(seconds=terminal_after)
+        )
+
+    def is_empty(self) -> bool:
+        return (
+            self.max_count is None
+            and self.max_age is None
+            and self.terminal_after is None
+        )
+
+
+def _option(conf, name: str):
+    # 配置项可以是dict，也可以是cfg4py的配置对象
+    if conf is None:
+        return None
+    if isinstance(conf, dict):
+        return conf.get(name)
+    return getattr(conf, name, None)
+
+
+# 记录类型 -> 保留规则，未配置的类型不清理
+policies = {}
+archive_folder = None
+
+
+def init_retention(conf=None):
+    """读取保留规则，例如：
+
+    retention:
+      archive_folder: /var/lib/mockserver/archive
+      entrusts: {max_count: 100000, terminal_after: 1800}
+      trades: {max_age: 86400}
+      history: {max_count: 10000}
+      events: {max_count: 100000}
+    """
+    global archive_folder
+
+    policies.clear()
+    for store in RETENTION_STORES:
+        store_conf = _option(conf, store)
+        policy = RetentionPolicy(
+            _option(store_conf, "max_count"),
+            _option(store_conf, "max_age"),
+            _option(store_conf, "terminal_after"),
+        )
+        if not policy.is_empty():
+            policies[store] = policy
+
+    archive_folder = _option(conf, "archive_folder")
+    if archive_folder:
+        os.makedirs(archive_folder, exist_ok=True)
+
+    if len(policies) > 0:
+        logger.info(
+            "retention enabled: %s, archive: %s", list(policies), archive_folder
+        )
+
+
+class KeyedRetention:
+    """按键保存的记录（委托、成交）的更新时间，按时间先后排列
+
+    最早更新的记录总在最前面，清理时只需检查队首，开销与被清理的记录数相关。
+    """
+
+    def __init__(self):
+        # 键 -> 最后更新时间
+        self.touched = OrderedDict()
+        # 键 -> 进入终结状态的时间
+        self.terminal = OrderedDict()
+
+    def touch(self, key: str, now: datetime.datetime, terminal: bool):
+        touched = self.touched
+        if key in touched:
+            touched.move_to_end(key)
+        touched[key] = now
+
+        if terminal and key not in self.terminal:
+            self.terminal[key] = now
+
+    def expired(self, policy: RetentionPolicy, now: datetime.datetime) -> list:
+        keys = []
+        touched = self.touched
+        terminal = self.terminal
+
+        if policy.terminal_after is not None:
+            deadline = now - policy.terminal_after
+            while len(terminal) > 0:
+                key, at = next(iter(terminal.items()))
+                if at > deadline:
+                    break
+                terminal.popitem(last=False)
+                touched.pop(key, None)
+                keys.append(key)
+
+        while len(touched) > 0:
+            key, at = next(iter(touched.items()))
+            too_many = policy.max_count is not None and len(touched) > policy.max_count
+            too_old = policy.max_age is not None and at <= now - policy.max_age
+            if not (too_many or too_old):
+                break
+            touched.popitem(last=False)
+            terminal.pop(key, None)
+            keys.append(key)
+
+        return keys
+
+    def discard(self, key: str):
+        self.touched.pop(key, None)
+        self.terminal.pop(key, None)
+
+    def clear(self):
+        self.touched = OrderedDict()
+        self.terminal = OrderedDict()
+
+
+class SessionRetention:
+    """一个会话内各类记录的保留状态"""
+
+    def __init__(self):
+        self.entrusts = KeyedRetention()
+        self.trades = KeyedRetention()
+        # 执行历史中每一条记录的时间
+        self.history = deque()
+
+    def clear(self):
+        self.entrusts.clear()
+        self.trades.clear()
+        self.history = deque()
+
+
+class ArchiveWriter:
+    """后台线程按提交的顺序追加或删除归档文件
+
+    请求线程只把序列化好的内容放入队列，不等待磁盘IO。fork出的worker进程中
+    没有后台线程，第一次提交时启动。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def submit(self, file: str, data: bytes = None):
+        # data为None时删除文件
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(self._queue,),
+                    name="archive-writer",
+                    daemon=True,
+                )
+                thread.start()
+
+            self._queue.put((file, data))
+
+    def wait(self):
+        # 等待已提交的操作完成，读取归档前调用
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def _run(self, tasks: queue.Queue):
+        while True:
+            file, data = tasks.get()
+            try:
+                if data is not None:
+                    with open(file, "ab") as writer:
+                        writer.write(data)
+                elif path.exists(file):
+                    os.remove(file)
+            except OSError as e:
+                logger.warning("failed to write archive %s: %s", file, e)
+            finally:
+                tasks.task_done()
+
+
+archive_writer = ArchiveWriter()
+# 退出前写完队列中的记录
+atexit.register(archive_writer.wait)
+
+
+def archive_file(session_id: str) -> str:
+    name = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+    return path.join(archive_folder, f"{name}.jsonl")
+
+
+def spill(session_id: str, store: str, records: list, now: datetime.datetime):
+    """把清理掉的记录追加到会话的归档文件中，未配置归档目录时直接丢弃"""
+    # 重放日志时归档中已经有这些记录
+    if not archive_folder or len(records) == 0 or journal.is_replaying():
+        return
+
+    # 在调用线程中序列化，写入在后台线程中进行
+    evicted_at = now.strftime("%Y-%m-%d %H:%M:%S.%f")
+    lines = [
+        codec.dumps({"store": store, "evicted_at": evicted_at, "data": data})
+        for data in records
+    ]
+    archive_writer.submit(archive_file(session_id), b"\n".join(lines) + b"\n")
+
+
+def read_archive(session_id: str, store: str = None, key: str = None, limit=None):
+    """按记录类型和委托编号查询归档，按清理的先后顺序返回"""
+    if not archive_folder:
+        return []
+
+    archive_writer.wait()
+    file = archive_file(session_id)
+    if not path.exists(file):
+        return []
+
+    results = []
+    with open(file, "rb") as reader:
+        for line in reader:
+            item = codec.loads(line)
+            if store is not None and item["store"] != store:
+                continue
+            if key is not None:
+                data = item["data"]
+                if not isinstance(data, dict) or data.get("entrust_no") != key:
+                    continue
+
+            results.append(item)
+            if limit is not None and len(results) >= limit:
+                break
+
+    return results
+
+
+def remove_archive(session_id: str):
+    if archive_folder and not journal.is_replaying():
+        archive_writer.submit(archive_file(session_id))
@@ -1,14 +1,25 @@
+import asyncio
 import logging
+import time
 import urllib.parse
 
 from sanic import Blueprint, Sanic, request, response
+from sanic.exceptions import InvalidUsage
 
+import mockserver.codec as codec
 import mockserver.handlers as handler
-from mockserver.handlers import global_accunt_info
+import mockserver.latency as latency
+import mockserver.metrics as metrics
+from mockserver.session import is_valid_account, session_scope, store_blocking
 from mockserver.trade import BidType, OrderSide
 from mockserver.utils import check_request_token, make_response
 
 logger = logging.getLogger(__name__)
+# 逐笔委托的日志，压测时可以通过配置关闭
+order_logger = logging.getLogger("mockserver.orders")
+
+FEED_BATCH_SIZE = 1000
+FEED_POLL_INTERVAL = 1
 
 bp_mockserver = Blueprint("mock-trade-server", strict_slashes=False)
 bp_mockcontroller = Blueprint(
@@ -16,267 +27,614 @@ bp_mockcontroller = Blueprint(
 )
 
 
+def open_session(request, write: bool = True):
+    # 优先使用Session-ID区分会话，否则按账户区分，都没有时使用默认账户
+    session_id = request.headers.get("Session-ID")
+    account_id = request.headers.get("Account-ID")
+    if account_id is not None and not is_valid_account(account_id):
+        account_id = None
+
+    return session_scope(session_id, account_id, write)
+
+
+async def in_session(request, func, *args, write: bool = True):
+    """在会话中执行func(session, *args)，会话存储会阻塞时放到线程池中执行"""
+
+    def run():
+        with open_session(request, write) as session:
+            return func(session, *args)
+
+    if not store_blocking():
+        return run()
+
+    return await asyncio.get_running_loop().run_in_executor(None, run)
+
+
+def trade_order(session, symbol, price, volume, side: OrderSide, bid_type: BidType):
+    result = handler.wrapper_trade_operation(
+        session, symbol, price, volume, side, bid_type
+    )
+    return result, handler.trade_ack_delay(session, result)
+
+
+def batch_orders(session, orders: list):
+    result = handler.wrapper_batch_orders(session, orders)
+    # 整批委托一次应答
+    entrusts = [item["data"] for item in result["data"] if item["status"] == 0]
+    return result, handler.order_ack_delay(session, entrusts)
+
+
+def cancel_orders(session, cancel, entrust_no):
+    result = cancel(session, entrust_no)
+    return result, handler.order_ack_delay(session, [])
+
+
+def read_events(session, since_seq: int, waiter: asyncio.Event, loop):
+    result = handler.wrapper_get_events(session, since_seq, FEED_BATCH_SIZE)
+    session.events.watch(waiter, loop)
+    return result
+
+
+def unwatch_events(session, waiter: asyncio.Event):
+    session.events.unwatch(waiter)
+
+
+def read_json(request):
+    # 使用配置的编解码器解析请求体，结果缓存在request.ctx中
+    if not hasattr(request.ctx, "params"):
+        body = request.body
+        try:
+            request.ctx.params = codec.loads(body) if body else None
+        except ValueError:
+            raise InvalidUsage("Failed when parsing body as json")
+
+    return request.ctx.params
+
+
+def non_negative_int(value, name: str):
+    # 游标和条数必须是非负整数，None表示未指定
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"{name} must be non-negative integer")
+    return value
+
+
+def json_reply(body, status: int = 200):
+    return response.raw(
+        codec.dumps(body), status=status, content_type="application/json"
+    )
+
+
+def make_trade_reply(result: dict):
+    # 交易类应答在加载用例时已经序列化，直接返回
+    metrics.record_trade_result(result["status"])
+    body = result.get("body")
+    if body is not None:
+        return response.raw(body, content_type="application/json")
+
+    if result["status"] != 200:
+        return json_reply(make_response(-1, result["msg"]))
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+async def delayed_trade_reply(result: dict, delay: float):
+    # 模拟券商的应答延迟，等待时已经释放会话，不阻塞其它请求
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    return make_trade_reply(result)
+
+
+async def start_timer(request):
+    request.ctx.start_ns = time.perf_counter_ns()
+
+
+async def record_latency(request, response):
+    # 按注册的路由统计，不按请求路径，尾部的/和路径参数不产生新的统计项。
+    # 401的请求只计入unauthorized
+    start_ns = getattr(request.ctx, "start_ns", None)
+    if start_ns is None or response.status == 401:
+        return
+
+    route = "/" + request.route.path if request.route is not None else "unmatched"
+    metrics.record_latency(route, time.perf_counter_ns() - start_ns)
+
+
+# 计时中间件必须先于其它请求中间件注册
+for bp in (bp_mockcontroller, bp_mockserver):
+    bp.middleware(start_timer, "request")
+    bp.middleware(record_latency, "response")
+
+
 # -------------- mock server controller  ---------------
 @bp_mockcontroller.route("/load", methods=["POST"])
 async def bp_mock_load(request):
-    case_name = request.json.get("case")
-    result = handler.wrapper_read_case_file(case_name)
+    params = read_json(request)
+    case_name = params.get("case")
+    mode = params.get("mode", "ordered")
+    result = await in_session(request, handler.wrapper_read_case_file, case_name, mode)
 
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockcontroller.route("/load_data", methods=["POST"])
 async def bp_mock_load2(request):
-    case_data = request.json
+    case_data = read_json(request)
+    mode = request.args.get("mode", "ordered")
     if case_data is None or isinstance(case_data, list) is False:
-        return response.json(make_response(-1, "case data must be a list"))
+        return json_reply(make_response(-1, "case data must be a list"))
+
+    result = await in_session(request, handler.wrapper_load_case_data, case_data, mode)
 
-    result = handler.wrapper_load_case_data(case_data)
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 # 如果是委托更新指令，直接执行，然后进到下一步
 @bp_mockcontroller.route("/proceed")
 async def bp_mock_proceed(request):
-    result = handler.wrapper_proceed_non_trade_action()
+    result = await in_session(request, handler.wrapper_proceed_non_trade_action)
+
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockcontroller.route("/current")
 async def bp_mock_current(request):
-    result = handler.wrapper_exec_current()
+    result = await in_session(request, handler.wrapper_exec_current)
 
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockcontroller.route("/history")
 async def bp_mock_history(request):
-    result = handler.wrapper_exec_history()
+    result = await in_session(request, handler.wrapper_exec_history)
+
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockcontroller.route("/reset")
 async def bp_mock_reset_mockdata(request):
-    handler.wrapper_reset_exec_data(False)
-    return response.json(make_response(0, "OK", {"data": "all data cleared"}))
+    await in_session(request, handler.wrapper_reset_exec_data, False)
+
+    return json_reply(make_response(0, "OK", {"data": "all data cleared"}))
 
 
 @bp_mockcontroller.route("/clear")
 async def bp_mock_clear_mockdata(request):
-    handler.wrapper_reset_exec_data(True)
-    return response.json(make_response(0, "OK", {"data": "all data cleared"}))
+    await in_session(request, handler.wrapper_reset_exec_data, True)
+
+    return json_reply(make_response(0, "OK", {"data": "all data cleared"}))
+
+
+@bp_mockcontroller.route("/simulation", methods=["POST"])
+async def bp_mock_simulation(request):
+    params = read_json(request) or {}
+    result = await in_session(
+        request, handler.wrapper_set_simulation, params.get("enabled", True)
+    )
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+# 播放列表：{"cases": ["c1", "c2"], "glob": "nightly/*", "mode": "ordered"}
+@bp_mockcontroller.route("/playlist", methods=["GET", "POST"])
+async def bp_mock_playlist(request):
+    if request.method == "GET":
+        result = await in_session(request, handler.wrapper_get_playlist, write=False)
+        return json_reply(make_response(0, "OK", result["data"]))
+
+    params = read_json(request)
+    if not isinstance(params, dict):
+        return json_reply(make_response(-1, "playlist must be a json object"))
+
+    result = await in_session(request, handler.wrapper_enqueue_playlist, params)
+
+    if result["status"] != 200:
+        return json_reply(make_response(-1, result["msg"]))
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+@bp_mockcontroller.route("/playlist/clear", methods=["POST"])
+async def bp_mock_playlist_clear(request):
+    result = await in_session(request, handler.wrapper_clear_playlist)
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+@bp_mockcontroller.route("/clock")
+async def bp_mock_clock(request):
+    result = await in_session(request, handler.wrapper_get_clock)
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+# 设置虚拟时钟：{"time": "2022-03-09 09:30:00", "frozen": true}
+@bp_mockcontroller.route("/clock/set", methods=["POST"])
+async def bp_mock_clock_set(request):
+    params = read_json(request) or {}
+    result = await in_session(request, handler.wrapper_set_clock, params)
+
+    if result["status"] != 200:
+        return json_reply(make_response(-1, result["msg"]))
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+# 拨快虚拟时钟：{"days": 1, "hours": 0, "minutes": 0, "seconds": 0}
+@bp_mockcontroller.route("/clock/advance", methods=["POST"])
+async def bp_mock_clock_advance(request):
+    params = read_json(request) or {}
+    result = await in_session(request, handler.wrapper_advance_clock, params)
+
+    if result["status"] != 200:
+        return json_reply(make_response(-1, result["msg"]))
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+# 查询归档的记录：?store=entrusts&entrust_no=xxx&limit=100
+@bp_mockcontroller.route("/archive")
+async def bp_mock_archive(request):
+    try:
+        limit = request.args.get("limit")
+        limit = int(limit) if limit is not None else None
+    except ValueError:
+        return json_reply(make_response(-1, "limit must be integer"))
+
+    store = request.args.get("store")
+    entrust_no = request.args.get("entrust_no")
+    result = await in_session(
+        request, handler.wrapper_get_archive, store, entrust_no, limit, write=False
+    )
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+# 委托延迟：{"ack": {"dist": "fixed", "ms": 20}, "fills": [...], "seed": 42}
+@bp_mockcontroller.route("/latency", methods=["GET", "POST"])
+async def bp_mock_latency(request):
+    if request.method == "GET":
+        result = await in_session(request, handler.wrapper_get_latency, write=False)
+        return json_reply(make_response(0, "OK", result["data"]))
+
+    params = read_json(request) or {}
+    if not isinstance(params, dict):
+        return json_reply(make_response(-1, "latency must be a json object"))
+
+    result = await in_session(request, handler.wrapper_set_latency, params)
+
+    if result["status"] != 200:
+        return json_reply(make_response(-1, result["msg"]))
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+@bp_mockcontroller.route("/metrics")
+async def bp_mock_metrics(request):
+    return response.text(
+        metrics.render_prometheus(), content_type="text/plain; version=0.0.4"
+    )
 
 
 @bp_mockcontroller.route("/")
 async def bp_mockserver_default_route(request):
-    return response.text("load, proceed, current, history, reset")
+    return response.text(
+        "load, proceed, current, history, reset, playlist, simulation, clock, latency, archive, metrics"
+    )
 
 
 # ------------------ mock trade server ------------------------
 
 
-def check_trade_server_account(account_id: str):
-    acct_info = global_accunt_info["info"]
-    if account_id in acct_info["account"]:
-        return True
-    else:
-        return False
-
-
 @bp_mockserver.middleware("request")
 async def validate_request(request: request):
 
     is_authenticated = check_request_token(request.headers.get("Authorization"))
     if not is_authenticated:
-        return response.json(make_response(401, "invalid access token"), 401)
+        metrics.counters.unauthorized += 1
+        return json_reply(make_response(401, "invalid access token"), 401)
 
     account = request.headers.get("Account-ID")
-    if account is None or (not check_trade_server_account(account)):
-        return response.json(make_response(401, "invalid account id"), 401)
+    if account is None or (not is_valid_account(account)):
+        metrics.counters.unauthorized += 1
+        return json_reply(make_response(401, "invalid account id"), 401)
 
 
 @bp_mockserver.route("/balance", methods=["POST"])
 async def bp_mock_get_balance(request):
-    account_id = request.headers.get("Account-ID")
+    result = await in_session(request, handler.wrapper_get_balance, write=False)
 
-    result = handler.wrapper_get_balance(account_id)
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockserver.route("/positions", methods=["POST"])
 async def bp_mock_get_positions(request):
-    account_id = request.headers.get("Account-ID")
+    result = await in_session(request, handler.wrapper_get_positions, write=False)
 
-    result = handler.wrapper_get_positions(account_id)
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockserver.route("/buy", methods=["POST"])
 async def bp_mock_buy(request):
-    account_id = request.headers.get("Account-ID")
-    symbol = request.json.get("security")
-    price = request.json.get("price")
-    volume = request.json.get("volume")
-    logger.info(f"buy: code: {symbol}, price: {price}, volume: {volume}")
+    symbol = read_json(request).get("security")
+    price = read_json(request).get("price")
+    volume = read_json(request).get("volume")
+    order_logger.info("buy: code: %s, price: %s, volume: %s", symbol, price, volume)
 
-    result = handler.wrapper_trade_operation(
-        account_id, symbol, price, volume, OrderSide.BUY, BidType.LIMIT
+    result, delay = await in_session(
+        request, trade_order, symbol, price, volume, OrderSide.BUY, BidType.LIMIT
     )
-    if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
 
-    # we can check result.status if this entrust success
-    logger.info(f"buy result: {result['data']}")
-    return response.json(make_response(0, "OK", result["data"]))
+    if result["status"] == 200:
+        # we can check result.status if this entrust success
+        order_logger.info("buy result: %s", result["data"])
+
+    return await delayed_trade_reply(result, delay)
 
 
 @bp_mockserver.route("/market_buy", methods=["POST"])
 async def bp_mock_market_buy(request):
-    account_id = request.headers.get("Account-ID")
-    symbol = request.json.get("security")
-    price = request.json.get("price")
-    volume = request.json.get("volume")
-    logger.info(f"buy: code: {symbol}, price: {price}, volume: {volume}")
+    symbol = read_json(request).get("security")
+    price = read_json(request).get("price")
+    volume = read_json(request).get("volume")
+    order_logger.info(
+        "market_buy: code: %s, price: %s, volume: %s", symbol, price, volume
+    )
 
-    result = handler.wrapper_trade_operation(
-        account_id, symbol, price, volume, OrderSide.BUY, BidType.MARKET
+    result, delay = await in_session(
+        request, trade_order, symbol, price, volume, OrderSide.BUY, BidType.MARKET
     )
-    if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
 
-    # we can check result.status if this entrust success
-    logger.info(f"buy result: {result['data']}")
-    return response.json(make_response(0, "OK", result["data"]))
+    if result["status"] == 200:
+        # we can check result.status if this entrust success
+        order_logger.info("market_buy result: %s", result["data"])
+
+    return await delayed_trade_reply(result, delay)
 
 
 @bp_mockserver.route("/sell", methods=["POST"])
 async def bp_mock_sell(request):
-    account_id = request.headers.get("Account-ID")
-    symbol = request.json.get("security")
-    price = request.json.get("price")
-    volume = request.json.get("volume")
-    logger.info(f"buy: code: {symbol}, price: {price}, volume: {volume}")
+    symbol = read_json(request).get("security")
+    price = read_json(request).get("price")
+    volume = read_json(request).get("volume")
+    order_logger.info("sell: code: %s, price: %s, volume: %s", symbol, price, volume)
 
-    result = handler.wrapper_trade_operation(
-        account_id, symbol, price, volume, OrderSide.SELL, BidType.LIMIT
+    result, delay = await in_session(
+        request, trade_order, symbol, price, volume, OrderSide.SELL, BidType.LIMIT
     )
-    if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
 
-    # we can check result.status if this entrust success
-    logger.info(f"buy result: {result['data']}")
-    return response.json(make_response(0, "OK", result["data"]))
+    if result["status"] == 200:
+        # we can check result.status if this entrust success
+        order_logger.info("sell result: %s", result["data"])
+
+    return await delayed_trade_reply(result, delay)
 
 
 @bp_mockserver.route("/market_sell", methods=["POST"])
 async def bp_mock_market_sell(request):
-    account_id = request.headers.get("Account-ID")
-    symbol = request.json.get("security")
-    price = request.json.get("price")
-    volume = request.json.get("volume")
-    logger.info(f"buy: code: {symbol}, price: {price}, volume: {volume}")
+    symbol = read_json(request).get("security")
+    price = read_json(request).get("price")
+    volume = read_json(request).get("volume")
+    order_logger.info(
+        "market_sell: code: %s, price: %s, volume: %s", symbol, price, volume
+    )
 
-    result = handler.wrapper_trade_operation(
-        account_id, symbol, price, volume, OrderSide.SELL, BidType.MARKET
+    result, delay = await in_session(
+        request, trade_order, symbol, price, volume, OrderSide.SELL, BidType.MARKET
     )
-    if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
 
-    # we can check result.status if this entrust success
-    logger.info(f"buy result: {result['data']}")
-    return response.json(make_response(0, "OK", result["data"]))
+    if result["status"] == 200:
+        # we can check result.status if this entrust success
+        order_logger.info("market_sell result: %s", result["data"])
+
+    return await delayed_trade_reply(result, delay)
+
+
+@bp_mockserver.route("/batch_orders", methods=["POST"])
+async def bp_mock_batch_orders(request):
+    params = read_json(request)
+    orders = params.get("orders") if params is not None else None
+    if not isinstance(orders, list):
+        return json_reply(make_response(-1, "batch_orders: orders must be list"))
+    order_logger.info(
+        "batch orders: %s -> %d", request.headers.get("Account-ID"), len(orders)
+    )
+
+    result, delay = await in_session(request, batch_orders, orders)
+
+    for item in result["data"]:
+        metrics.record_trade_result(200 if item["status"] == 0 else 400)
+
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 @bp_mockserver.route("/cancel_entrust", methods=["POST"])
 async def bp_mock_cancel_entrust(request):
-    account_id = request.headers.get("Account-ID")
-
-    entrust_no = request.json.get("entrust_no")
-    logger.info("cancel entrusts: %s -> %s", account_id, entrust_no)
+    entrust_no = read_json(request).get("entrust_no")
+    order_logger.info(
+        "cancel entrusts: %s -> %s", request.headers.get("Account-ID"), entrust_no
+    )
     if isinstance(entrust_no, list):
-        return response.json(
+        return json_reply(
             make_response(
                 -1, "cancel_entrust: only 1 entrust_no acceptable, no list permitted"
             )
         )
 
-    result = handler.wrapper_cancel_entrust(account_id, entrust_no)
-    if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+    result, delay = await in_session(
+        request, cancel_orders, handler.wrapper_cancel_entrust, entrust_no
+    )
+
+    if result["status"] == 200:
+        # we can check result.status if this entrust success
+        order_logger.info("cancel result: %s", result["data"])
 
-    # we can check result.status if this entrust success
-    logger.info(f"cancel result: {result['data']}")
-    return response.json(make_response(0, "OK", result["data"]))
+    return await delayed_trade_reply(result, delay)
 
 
 @bp_mockserver.route("/cancel_entrusts", methods=["POST"])
 async def bp_mock_cancel_entrusts(request):
-    account_id = request.headers.get("Account-ID")
-
-    order_list = request.json.get("entrust_no")
-    logger.info("cancel entrusts: %s -> %s", account_id, order_list)
+    order_list = read_json(request).get("entrust_no")
+    order_logger.info(
+        "cancel entrusts: %s -> %s", request.headers.get("Account-ID"), order_list
+    )
     if not isinstance(order_list, list):
-        return response.json(
-            make_response(-1, "cancel_entrusts: entrust_no must be list")
-        )
+        return json_reply(make_response(-1, "cancel_entrusts: entrust_no must be list"))
 
-    result = handler.wrapper_cancel_entrusts(account_id, order_list)
-    if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+    result, delay = await in_session(
+        request, cancel_orders, handler.wrapper_cancel_entrusts, order_list
+    )
 
-    # we can check result.status if this entrust success
-    logger.info(f"cancel result: {result['data']}")
-    return response.json(make_response(0, "OK", result["data"]))
+    if result["status"] == 200:
+        # we can check result.status if this entrust success
+        order_logger.info("cancel result: %s", result["data"])
+
+    return await delayed_trade_reply(result, delay)
 
 
 @bp_mockserver.route("/today_entrusts", methods=["POST"])
 async def bp_mock_get_today_all_entrusts(request):
-    account_id = request.headers.get("Account-ID")
-
     order_list = None
-    if request.json is not None:
-        order_list = request.json.get("entrust_no")
-    logger.info("today_entrusts: %s -> %s", account_id, order_list)
+    since_seq = None
+    limit = None
+    params = read_json(request)
+    if params is not None:
+        order_list = params.get("entrust_no")
+        since_seq = params.get("since_seq")
+        limit = params.get("limit")
+    order_logger.info(
+        "today_entrusts: %s -> %s", request.headers.get("Account-ID"), order_list
+    )
+    try:
+        since_seq = non_negative_int(since_seq, "since_seq")
+        limit = non_negative_int(limit, "limit")
+    except ValueError as e:
+        return json_reply(make_response(-1, str(e)))
+
+    result = await in_session(
+        request,
+        handler.wrapper_get_today_entrusts,
+        order_list,
+        since_seq,
+        limit,
+        write=False,
+    )
 
-    result = handler.wrapper_get_today_entrusts(order_list)
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
 
-    return response.json(make_response(0, "OK", result["data"]))
+    return json_reply(make_response(0, "OK", result["data"]))
 
 
 # 当前z trade server不用这个接口
 @bp_mockserver.route("/today_trades", methods=["POST"])
 async def bp_mock_get_today_all_trades(request):
-    account_id = request.headers.get("Account-ID")
-    print(account_id)
+    since_seq = None
+    limit = None
+    params = read_json(request)
+    if params is not None:
+        since_seq = params.get("since_seq")
+        limit = params.get("limit")
+    try:
+        since_seq = non_negative_int(since_seq, "since_seq")
+        limit = non_negative_int(limit, "limit")
+    except ValueError as e:
+        return json_reply(make_response(-1, str(e)))
+
+    result = await in_session(
+        request, handler.wrapper_get_today_trades, since_seq, limit, write=False
+    )
 
-    result = handler.wrapper_get_today_trades()
     if result["status"] != 200:
-        return response.json(make_response(-1, result["msg"]))
+        return json_reply(make_response(-1, result["msg"]))
+
+    return json_reply(make_response(0, "OK", result["data"]))
+
+
+@bp_mockserver.websocket("/entrust_feed")
+async def bp_mock_entrust_feed(request, ws):
+    # 推送委托和成交的变化，客户端通过since_seq指定从哪个序号之后开始推送
+    try:
+        since_seq = non_negative_int(int(request.args.get("since_seq", 0)), "since_seq")
+    except ValueError:
+        # 参数错误时返回错误信息后关闭连接
+        reply = make_response(-1, "since_seq must be non-negative integer")
+        await ws.send(codec.dumps(reply).decode("utf-8"))
+        await ws.close()
+        return
+
+    logger.info("entrust feed: %s -> %d", request.headers.get("Account-ID"), since_seq)
+
+    # 在事件循环的线程中创建，读取记录可能在线程池中执行
+    loop = asyncio.get_running_loop()
+    waiter = asyncio.Event()
+    closed = asyncio.ensure_future(wait_closed(ws))
+
+    try:
+        while not closed.done():
+            waiter.clear()
+            result = await in_session(
+                request, read_events, since_seq, waiter, loop, write=False
+            )
 
-    return response.json(make_response(0, "OK", result["data"]))
+            events = result["data"]
+            for event in events:
+                await ws.send(codec.dumps(event).decode("utf-8"))
+                since_seq = event["seq"]
+
+            if len(events) == 0:
+                # 其它worker中的变化无法唤醒本进程，超时后重新检查
+                woken = asyncio.ensure_future(waiter.wait())
+                await asyncio.wait(
+                    [woken, closed],
+                    timeout=FEED_POLL_INTERVAL,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                woken.cancel()
+    finally:
+        # 客户端断开，或者sanic在连接关闭时取消了本任务
+        closed.cancel()
+        logger.info("entrust feed closed: %s", request.headers.get("Account-ID"))
+        await in_session(request, unwatch_events, waiter, write=False)
+
+
+async def wait_closed(ws):
+    # 客户端不发送消息，收到的内容忽略，连接关闭时返回
+    try:
+        while True:
+            await ws.recv()
+    except (asyncio.CancelledError, Exception):
+        # 连接关闭时抛出的异常类型与sanic版本有关
+        pass
+
+
+async def bind_timer_loop(app: Sanic):
+    latency.bind_loop(asyncio.get_running_loop())
 
 
 def initialize_blueprint(app: Sanic):
@@ -288,5 +646,6 @@ def initialize_blueprint(app: Sanic):
 
     app.blueprint(bp_mockcontroller)
     app.blueprint(bp_mockserver)
+    app.register_listener(bind_timer_loop, "after_server_start")
 
     logger.info("blueprint v1 added into app object")
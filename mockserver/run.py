@@ -1,18 +1,20 @@
 # -*- coding: utf-8 -*-
 # @Author   : henry
 # @Time     : 2022-03-09 15:08
+import atexit
 import logging
 import os
 from os import path
 
 import cfg4py
 
+from mockserver.logqueue import init_queue_logging
 from mockserver.server import server_start
 
 logger = logging.getLogger(__name__)
 
 
-def init_logger(filename: str, loglevel: int):
+def init_logger(filename: str, loglevel: int, log_orders: bool = True):
     LOG_FORMAT = r"%(asctime)s %(levelname)s %(filename)s[line:%(lineno)d] %(message)s"
     DATE_FORMAT = r"%Y-%m-%d  %H:%M:%S %a"
 
@@ -22,9 +24,12 @@ def init_logger(filename: str, loglevel: int):
     formatter = logging.Formatter(fmt=LOG_FORMAT, datefmt=DATE_FORMAT)
     fh.setFormatter(formatter)
 
-    logging.basicConfig(
-        level=logging.DEBUG, format=LOG_FORMAT, datefmt=DATE_FORMAT, handlers=[fh]
-    )
+    # 日志通过队列交给后台线程写入文件，不阻塞事件循环
+    listener = init_queue_logging(fh, loglevel)
+    atexit.register(listener.stop)
+
+    # 压测时关闭逐笔委托的日志
+    logging.getLogger("mockserver.orders").disabled = not log_orders
 
 
 def start():
@@ -43,8 +48,9 @@ def start():
     # read configuration and init server
     server_config = cfg4py.get_instance()
     loglevel = server_config.log_level
+    log_orders = getattr(server_config.server_info, "log_orders", True)
     logfile = path.normpath(path.join(cur_dir, "server.log"))
-    init_logger(logfile, loglevel)
+    init_logger(logfile, loglevel, log_orders)
 
     logger.info("mock trade server start .......")
     server_start()
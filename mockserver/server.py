@@ -1,10 +1,20 @@
+import atexit
 import logging
+import os
+import shutil
+import tempfile
 
 import cfg4py
 from sanic import Sanic
 
-from mockserver.handlers import global_accunt_info
+from mockserver.case_cache import case_cache
+from mockserver.codec import init_codec
+from mockserver.handlers import apply_transition, replay_transition
+from mockserver.journal import StateJournal
+from mockserver.retention import init_retention
 from mockserver.route_map import initialize_blueprint
+from mockserver.session import init_accounts, init_journal_store, init_state_store
+from mockserver.simulator import init_bar_store
 
 logger = logging.getLogger(__name__)
 
@@ -33,16 +43,81 @@ def server_start() -> int:
     server_info = server_config.server_info
     account_id = server_info.account_id
     account_capital = server_info.account_captital
-    global_accunt_info["info"] = {
-        "account": account_id,
-        "available": account_capital,
-        "pnl": 0,
-        "total": account_capital,
-        "ppnl": 0,
-    }
+    # 额外的账户共用相同的初始资金，每个账户（或Session-ID）对应独立的会话
+    accounts = getattr(server_info, "accounts", None)
+    init_accounts(account_id, account_capital, accounts)
+
+    init_codec(getattr(server_info, "json_codec", "auto"))
+    init_bar_store(getattr(server_info, "bar_folder", None))
+    case_cache.maxsize = getattr(server_info, "case_cache_size", 256)
+    # 长时间运行时按保留规则清理委托、成交和执行历史
+    init_retention(getattr(server_info, "retention", None))
 
     initialize_blueprint(app)
 
+    # 多个worker进程时会话状态必须保存在共享存储中
+    workers = getattr(server_info, "workers", 1) or 1
+    backend = getattr(server_info, "state_backend", "memory")
+    if workers > 1 and backend == "memory":
+        logger.warning("memory state backend cannot be shared by workers, use sqlite")
+        backend = "sqlite"
+    state_folder = getattr(server_info, "state_folder", None)
+    if state_folder is None and backend != "memory":
+        # 未指定目录时每个实例使用单独的临时目录，不影响同一主机上的其它实例
+        state_folder = tempfile.mkdtemp(prefix=f"mockserver-state-{server_info.port}-")
+        atexit.register(remove_state_folder, state_folder, os.getpid())
+    init_state_store(
+        backend,
+        state_folder,
+        apply_transition,
+        getattr(server_info, "state_snapshot_every", 1000),
+        # 压测等场景不断产生新的会话，限制内存中的会话数
+        getattr(server_info, "max_sessions", 10000),
+        getattr(server_info, "session_idle_ttl", None),
+    )
+
+    # 内存存储启用预写日志后，重启时从快照和日志恢复会话
+    wal_folder = getattr(server_info, "wal_folder", None)
+    if wal_folder and backend == "memory":
+        state_journal = StateJournal(
+            wal_folder,
+            getattr(server_info, "wal_snapshot_every", 10000),
+            getattr(server_info, "wal_fsync", False),
+        )
+        init_journal_store(state_journal, replay_transition)
+
     port = server_info.port
-    logger.info("server initialized at port: %d", port)
-    app.run(host="0.0.0.0", port=port)
+    unix_socket = getattr(server_info, "unix_socket", None)
+    listen_tcp = getattr(server_info, "listen_tcp", True)
+    logger.info("server initialized at port: %d, workers: %d", port, workers)
+    run_app(port, unix_socket, listen_tcp, workers)
+
+
+def remove_state_folder(folder: str, pid: int):
+    # 只由创建目录的主进程删除
+    if os.getpid() == pid:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def run_app(port: int, unix_socket: str, listen_tcp: bool, workers: int):
+    # 同一主机上的客户端可以通过unix domain socket访问，省去TCP回环的开销。
+    # 已有的文件由sanic检查：不是socket时拒绝启动，残留的socket被替换
+    if not unix_socket:
+        app.run(host="0.0.0.0", port=port, workers=workers)
+        return
+
+    if not listen_tcp:
+        logger.info("server listening on unix socket: %s", unix_socket)
+        app.run(unix=unix_socket, workers=workers)
+        return
+
+    # 同时监听TCP和unix socket需要sanic 22.3以上版本的app.prepare
+    if not hasattr(app, "prepare"):
+        logger.error("listening on tcp and unix socket requires sanic>=22.3")
+        app.run(host="0.0.0.0", port=port, workers=workers)
+        return
+
+    logger.info("server listening on port %d and unix socket: %s", port, unix_socket)
+    app.prepare(host="0.0.0.0", port=port, workers=workers)
+    app.prepare(unix=unix_socket, workers=workers)
+    Sanic.serve()
@@ -0,0 +1,157 @@
+import datetime
+import logging
+
+from mockserver.clock import VirtualClock
+from mockserver.events import EventJournal
+from mockserver.journal import StateJournal, init_journal, record
+from mockserver.latency import SessionLatency
+from mockserver.ledger import PositionLedger
+from mockserver.playlist import Playlist
+from mockserver.retention import SessionRetention
+from mockserver.state import MemoryStateStore, SqliteStateStore, create_state_store
+
+logger = logging.getLogger(__name__)
+
+
+class MockSession:
+    """一个测试会话，独立持有用例执行游标、委托、成交和持仓信息"""
+
+    def __init__(self, session_id: str, account_id: str, capital: float):
+        self.session_id = session_id
+        self.account_id = account_id
+        self.capital = capital
+
+        self.accunt_info = {"entursts": {}, "trades": {}}
+        # 资金和持仓
+        self.ledger = PositionLedger(account_id, capital)
+        self.case_data = {
+            "case": "",
+            "items": [],
+            "index": -1,
+            "executed": 0,
+            "date": None,
+            "responses": [],
+            "mode": "ordered",
+            "expects": {},
+            "done": set(),
+        }
+        self.case_exec_list = []
+        # 委托和成交的变化记录，用于推送
+        self.events = EventJournal()
+        # 委托、成交和执行历史的保留状态
+        self.retention = SessionRetention()
+        # 待执行的用例队列
+        self.playlist = Playlist()
+
+        # 模拟撮合模式，委托按本地行情撮合
+        self.simulation = False
+        # 证券代码 -> (最近一根bar的位置, 已成交数量)
+        self.bar_used = {}
+        # 委托应答延迟和成交推进
+        self.latency = SessionLatency()
+
+        # 委托时间、交易日切换都以会话的虚拟时钟为准
+        self.clock = VirtualClock()
+        self.trade_date = None
+
+    def now(self) -> datetime.datetime:
+        """读取虚拟时钟，跨过交易日时先完成日切"""
+        now = self.clock.now()
+        today = now.date()
+        if self.trade_date is None:
+            self.trade_date = today
+        elif today > self.trade_date:
+            self.roll_day(today)
+
+        return now
+
+    def roll_day(self, today: datetime.date):
+        record(self, "day_roll", today)
+        last_date = self.trade_date
+        self.trade_date = today
+        logger.info("session %s day roll: %s -> %s", self.session_id, last_date, today)
+        self.events.append("day_roll", {"from": str(last_date), "to": str(today)})
+        # 上一交易日买入的股份可以卖出
+        self.ledger.release_sellable()
+
+
+# 账户ID -> 初始资金
+_accounts = {}
+_default_account = None
+_store = MemoryStateStore()
+
+
+def init_accounts(account_id: str, capital: float, accounts: list = None):
+    """注册可以访问模拟服务器的账户，第一个账户作为控制接口的默认会话"""
+    global _default_account
+
+    _accounts.clear()
+
+    _default_account = account_id
+    _accounts[account_id] = capital
+    for extra in accounts or []:
+        _accounts[extra] = capital
+
+
+def init_state_store(
+    backend: str = "memory",
+    folder: str = None,
+    apply=None,
+    snapshot_every=1000,
+    max_sessions: int = None,
+    idle_ttl: float = None,
+):
+    """选择会话状态的存储方式，多个worker进程时需要使用共享的存储
+
+    共享存储通过apply(会话, 操作, 虚拟时间, 参数)应用其它进程产生的状态变化。
+    已有的会话状态保留，不在启动时清除。内存存储最多保留max_sessions个会话，
+    超过idle_ttl秒未使用的会话被删除。
+    """
+    global _store
+
+    _store = create_state_store(backend, folder, snapshot_every, max_sessions, idle_ttl)
+    if isinstance(_store, SqliteStateStore):
+        _store.attach_replay(apply)
+        init_journal(_store)
+    logger.info("session state backend: %s", backend)
+
+
+def discard_session(session: MockSession):
+    # 在会话的with语句中调用，退出时以新建的会话替换，事件序号继续递增
+    _store.discard(session.session_id)
+
+
+def store_blocking() -> bool:
+    # 会话存储的读写是否会阻塞事件循环
+    return _store.blocking
+
+
+def init_journal_store(state_journal: StateJournal, replay):
+    """内存存储启用预写日志，先恢复上次退出前的会话"""
+    if not isinstance(_store, MemoryStateStore):
+        logger.warning("write-ahead log only applies to memory state backend")
+        return
+
+    _store.attach_journal(state_journal, replay)
+    init_journal(state_journal)
+
+
+def is_valid_account(account_id: str) -> bool:
+    return account_id in _accounts
+
+
+def session_scope(session_id: str = None, account_id: str = None, write=True):
+    """根据会话ID取得会话，不存在则创建，在with语句中使用
+
+    会话ID为空时使用账户ID作为会话ID；两者都为空时使用默认账户。只读的请求
+    设置write=False，修改不会写回共享存储。
+    """
+    if account_id is None:
+        account_id = _default_account
+    if session_id is None:
+        session_id = account_id
+
+    def factory():
+        return MockSession(session_id, account_id, _accounts.get(account_id, 0))
+
+    return _store.session(session_id, factory, write)
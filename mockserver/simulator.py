@@ -0,0 +1,232 @@
+import bisect
+import csv
+import datetime
+import logging
+import os
+import uuid
+from os import path
+
+from mockserver.records import Entrust
+from mockserver.trade import BidType, OrderSide, OrderStatus
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pq = None
+
+
+BAR_FIELDS = ("frame", "open", "high", "low", "close", "volume")
+
+
+class Bars:
+    """一个证券的行情数据，按frame升序排列"""
+
+    def __init__(self, code: str, frames, columns: dict):
+        self.code = code
+        self.frames = frames
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.frames)
+
+    def index_at(self, now: datetime.datetime) -> int:
+        # 时间不晚于now的最后一根bar的位置，now早于全部数据时取第一根
+        if len(self.frames) == 0:
+            return None
+
+        if np is not None and isinstance(self.frames, np.ndarray):
+            pos = int(self.frames.searchsorted(np.datetime64(now), side="right"))
+        else:
+            pos = bisect.bisect_right(self.frames, now)
+        return max(pos - 1, 0)
+
+    def bar(self, pos: int) -> tuple:
+        return tuple(float(self.columns[name][pos]) for name in BAR_FIELDS[1:])
+
+    def bar_at(self, now: datetime.datetime):
+        pos = self.index_at(now)
+        return self.bar(pos) if pos is not None else None
+
+
+def _load_npy(code: str, file: str) -> Bars:
+    # 结构化数组以只读方式映射到内存，只有访问到的页面才会读入
+    data = np.load(file, mmap_mode="r")
+    return Bars(code, data["frame"], {name: data[name] for name in BAR_FIELDS[1:]})
+
+
+def _load_csv(code: str, file: str) -> Bars:
+    frames = []
+    columns = {name: [] for name in BAR_FIELDS[1:]}
+    with open(file, "r", encoding="utf-8") as reader:
+        for row in csv.DictReader(reader):
+            frames.append(datetime.datetime.fromisoformat(row["frame"]))
+            for name in BAR_FIELDS[1:]:
+                columns[name].append(float(row[name]))
+
+    return Bars(code, frames, columns)
+
+
+def _load_parquet(code: str, file: str) -> Bars:
+    data = pq.read_table(file, columns=list(BAR_FIELDS)).to_pydict()
+    frames = [
+        x if isinstance(x, datetime.datetime) else datetime.datetime.fromisoformat(x)
+        for x in data["frame"]
+    ]
+    return Bars(code, frames, {name: data[name] for name in BAR_FIELDS[1:]})
+
+
+class BarStore:
+    """本地行情文件，每个证券一个文件：<code>.npy、<code>.parquet或<code>.csv
+
+    文件在第一次用到时才加载，npy文件使用内存映射。
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._bars = {}
+
+        loaders = []
+        if np is not None:
+            loaders.append(("npy", _load_npy))
+        if pq is not None:
+            loaders.append(("parquet", _load_parquet))
+        loaders.append(("csv", _load_csv))
+        self._loaders = loaders
+
+    def get(self, code: str):
+        bars = self._bars.get(code)
+        if bars is not None:
+            return bars
+
+        for ext, loader in self._loaders:
+            file = path.join(self.folder, f"{code}.{ext}")
+            if os.path.exists(file):
+                bars = loader(code, file)
+                self._bars[code] = bars
+                logger.info("bars loaded: %s, %d bars", file, len(bars))
+                return bars
+
+        return None
+
+
+bar_store = None
+
+
+def init_bar_store(folder: str):
+    global bar_store
+
+    bar_store = BarStore(folder) if folder else None
+
+
+def make_entrust(
+    code: str,
+    price: float,
+    volume: int,
+    order_side: OrderSide,
+    bid_type: BidType,
+    now: datetime.datetime,
+):
+    # 与用例中trade_result相同格式的委托信息
+    datestr = now.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return Entrust(
+        name=code,
+        code=code,
+        price=price,
+        volume=volume,
+        order_side=int(order_side),
+        bid_type=int(bid_type),
+        time=datestr,
+        entrust_no=str(uuid.uuid4()),
+        status=int(OrderStatus.NO_DEAL),
+        filled=0,
+        filled_vwap=0,
+        filled_amount=0,
+        eid=str(uuid.uuid4()),
+        trade_fees=0,
+        reason="",
+        recv_at=datestr,
+    )
+
+
+def match_order(
+    code: str,
+    price: float,
+    volume: int,
+    order_side: OrderSide,
+    bid_type: BidType,
+    sellable: int,
+    available: float,
+    bar_used: dict,
+    now: datetime.datetime,
+):
+    """按当前时间对应的bar撮合委托，返回委托信息
+
+    限价买单在价格不低于最低价时成交，成交价为委托价和收盘价中较低者；限价卖单
+    在价格不高于最高价时成交，成交价为委托价和收盘价中较高者；市价委托按收盘价
+    成交。同一根bar上全部委托的成交数量不超过bar的成交量，超出部分为部分成交。
+    bar_used记录每个证券最近一根bar的位置和已经成交的数量，撮合后更新。
+
+    卖出数量超过可卖数量、买入金额（市价委托按收盘价计算）超过可用资金时为废单。
+    """
+    entrust = make_entrust(code, price, volume, order_side, bid_type, now)
+
+    if bar_store is None:
+        entrust.status = int(OrderStatus.ERROR)
+        entrust.reason = "no bar folder configured"
+        return entrust
+
+    bars = bar_store.get(code)
+    pos = bars.index_at(now) if bars is not None else None
+    if pos is None:
+        entrust.status = int(OrderStatus.ERROR)
+        entrust.reason = f"no bars found: {code}"
+        return entrust
+
+    _, high, low, close, bar_volume = bars.bar(pos)
+    if order_side == OrderSide.SELL and volume > sellable:
+        entrust.status = int(OrderStatus.ERROR)
+        entrust.reason = f"not enough sellable shares: {sellable}"
+        return entrust
+
+    if order_side == OrderSide.BUY:
+        cost = volume * (close if bid_type == BidType.MARKET else price)
+        if cost > available:
+            entrust.status = int(OrderStatus.ERROR)
+            entrust.reason = f"not enough cash: {available}"
+            return entrust
+
+    if bid_type == BidType.MARKET:
+        fill_price = close
+    elif order_side == OrderSide.BUY:
+        fill_price = min(price, close) if price >= low else None
+    else:
+        fill_price = max(price, close) if price <= high else None
+
+    if fill_price is None:
+        return entrust
+
+    last_pos, used = bar_used.get(code, (None, 0))
+    if last_pos != pos:
+        used = 0
+    filled = min(volume, int(bar_volume) - used)
+    if filled <= 0:
+        return entrust
+
+    bar_used[code] = (pos, used + filled)
+
+    entrust.filled = filled
+    entrust.filled_vwap = fill_price
+    entrust.filled_amount = filled * fill_price
+    if filled == volume:
+        entrust.status = int(OrderStatus.ALL_TRANSACTIONS)
+    else:
+        entrust.status = int(OrderStatus.PARTIAL_TRANSACTION)
+
+    return entrust
@@ -0,0 +1,373 @@
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from os import path
+
+import mockserver.journal as journal
+
+logger = logging.getLogger(__name__)
+
+
+def renew_session(session, factory):
+    # 删除会话时以新会话替换，事件日志保留，序号继续递增，客户端的游标仍然有效
+    fresh = factory()
+    fresh.events = session.events
+    return fresh
+
+
+class MemoryStateStore:
+    """会话保存在当前进程内存中，只适用于单个worker
+
+    会话数超过max_sessions时删除最久未使用的会话，超过idle_ttl秒未使用的会话
+    同样删除，之后再次访问时重新创建。
+    """
+
+    blocking = False
+
+    def __init__(self, max_sessions: int = None, idle_ttl: float = None):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        # 会话ID -> 会话，按最近使用的先后排列
+        self._sessions = OrderedDict()
+        # 会话ID -> 最近使用的时间
+        self._used = {}
+        # 本次请求中被删除的会话
+        self._discarded = set()
+        # 预写日志，未启用时重启后会话全部丢失
+        self.journal = None
+
+    @contextmanager
+    def session(self, session_id: str, factory, write: bool = True):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = factory()
+            self._sessions[session_id] = session
+            logger.info("session created: %s", session_id)
+        else:
+            self._sessions.move_to_end(session_id)
+        self._used[session_id] = time.monotonic()
+        self._evict()
+
+        try:
+            yield session
+
+            if session_id in self._discarded:
+                self._sessions[session_id] = renew_session(session, factory)
+        finally:
+            self._discarded.discard(session_id)
+
+        # 请求处理完毕，会话状态一致时才保存快照
+        journal = self.journal
+        if journal is not None and journal.should_snapshot():
+            journal.snapshot(self._sessions)
+
+    def _evict(self):
+        # 最近使用的会话在最后，从头部开始删除
+        now = time.monotonic()
+        sessions = self._sessions
+        while len(sessions) > 1:
+            session_id = next(iter(sessions))
+            full = self.max_sessions is not None and len(sessions) > self.max_sessions
+            idle = self.idle_ttl is not None
+            idle = idle and now - self._used.get(session_id, now) > self.idle_ttl
+            if not (full or idle):
+                break
+
+            self._sessions.pop(session_id, None)
+            self._used.pop(session_id, None)
+            # 恢复时同样删除，不重建已经删除的会话
+            if self.journal is not None:
+                self.journal.evict(session_id)
+            logger.info("session evicted: %s", session_id)
+
+    def discard(self, session_id: str):
+        # 只能在该会话的with语句中调用，退出时会话恢复为新建时的状态
+        self._discarded.add(session_id)
+
+    def attach_journal(self, journal, replay):
+        # 从快照和日志恢复会话，之后的状态变化写入日志
+        journal.recover(self._sessions, replay)
+        self.journal = journal
+
+    def clear(self):
+        self._sessions.clear()
+        self._used.clear()
+
+
+class SqliteStateStore:
+    """会话保存在本地SQLite文件中，所有worker进程共享
+
+    每个会话使用单独的数据库文件，不同会话之间互不阻塞；同一会话的请求通过
+    SQLite的写锁串行执行。会话的每次状态变化（委托、游标、加载用例等，与预写
+    日志的记录相同）作为一行追加到transitions表，写入的开销与会话的大小无关。
+    每个进程缓存会话对象和已应用的序号，进入会话时只重放其它进程追加的记录；
+    每snapshot_every条记录保存一次完整的会话，之前的记录随之删除。
+
+    SQLite的读写会阻塞，请求在线程池中访问会话（blocking为True）。进程内最多
+    保留max_sessions个会话的连接和缓存，超过idle_ttl秒未使用的同样关闭，会话
+    数据仍保存在文件中，再次访问时重新读取。
+    """
+
+    blocking = True
+
+    def __init__(
+        self,
+        folder: str,
+        timeout: float = 30,
+        snapshot_every: int = 1000,
+        max_sessions: int = None,
+        idle_ttl: float = None,
+    ):
+        self.folder = folder
+        self.timeout = timeout
+        self.snapshot_every = snapshot_every
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        # apply(会话, 操作, 虚拟时间, 参数)，把其它进程的一条记录应用到会话上
+        self.apply = None
+
+        self._pid = None
+        self._mutex = threading.Lock()
+        # 会话ID -> 进程内的锁，同一进程内的线程也要串行访问会话
+        self._locks = {}
+        # 会话ID -> sqlite连接
+        self._conns = {}
+        # 会话ID -> (已应用的序号, 会话)
+        self._cache = {}
+        # 会话ID -> 最近使用的时间，按最近使用的先后排列
+        self._used = OrderedDict()
+        # 会话ID -> 正在访问该会话的请求数，访问中的会话不能关闭
+        self._active = {}
+        # 会话ID -> 本次请求中产生的记录
+        self._pending = {}
+        # 本次请求中被删除的会话
+        self._discarded = set()
+
+        os.makedirs(folder, exist_ok=True)
+
+    def attach_replay(self, apply):
+        self.apply = apply
+
+    def _enter(self, session_id: str) -> threading.Lock:
+        # sqlite连接不能跨进程使用，fork出的worker重新建立连接
+        with self._mutex:
+            pid = os.getpid()
+            if pid != self._pid:
+                self._pid = pid
+                self._locks = {}
+                self._conns = {}
+                self._cache = {}
+                self._used = OrderedDict()
+                self._active = {}
+
+            lock = self._locks.get(session_id)
+            if lock is None:
+                lock = self._locks[session_id] = threading.Lock()
+            self._active[session_id] = self._active.get(session_id, 0) + 1
+            return lock
+
+    def _leave(self, session_id: str):
+        with self._mutex:
+            self._active[session_id] -= 1
+            self._used[session_id] = time.monotonic()
+            self._used.move_to_end(session_id)
+            self._evict()
+
+    def _evict(self):
+        # 在self._mutex中调用，从最久未使用的会话开始关闭，跳过正在访问的会话
+        now = time.monotonic()
+        count = len(self._used)
+        for session_id, used in list(self._used.items()):
+            full = self.max_sessions is not None and count > self.max_sessions
+            idle = self.idle_ttl is not None and now - used > self.idle_ttl
+            if not (full or idle):
+                break
+            if self._active[session_id] > 0:
+                continue
+
+            self._close(session_id)
+            count -= 1
+            logger.info("session closed: %s", session_id)
+
+    def _close(self, session_id: str):
+        del self._used[session_id]
+        del self._active[session_id]
+        del self._locks[session_id]
+        self._cache.pop(session_id, None)
+        conn = self._conns.pop(session_id, None)
+        if conn is not None:
+            conn.close()
+
+    def _connect(self, session_id: str):
+        conn = self._conns.get(session_id)
+        if conn is None:
+            conn = sqlite3.connect(
+                self._db_file(session_id),
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot "
+                "(id INTEGER PRIMARY KEY, seq INTEGER, state BLOB)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS transitions "
+                "(seq INTEGER PRIMARY KEY, op TEXT, data BLOB)"
+            )
+            self._conns[session_id] = conn
+
+        return conn
+
+    def _db_file(self, session_id: str) -> str:
+        name = hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+        return path.join(self.folder, f"{name}.db")
+
+    def _load(self, conn, session_id: str, factory):
+        row = conn.execute("SELECT seq FROM snapshot WHERE id = 0").fetchone()
+        snapshot_seq = row[0] if row is not None else 0
+
+        cached = self._cache.get(session_id)
+        if cached is not None and cached[0] >= snapshot_seq:
+            seq, session = cached
+        elif row is not None:
+            state = conn.execute("SELECT state FROM snapshot WHERE id = 0").fetchone()
+            seq, session = snapshot_seq, pickle.loads(state[0])
+        else:
+            seq, session = 0, factory()
+            logger.info("session created: %s", session_id)
+
+        # 重放其它进程追加的记录，通常只有几条
+        rows = conn.execute(
+            "SELECT seq, op, data FROM transitions WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+        if len(rows) > 0:
+            with journal.replaying():
+                for seq, op, data in rows:
+                    now, args = pickle.loads(data)
+                    self.apply(session, op, now, args)
+
+        return seq, session
+
+    def append(self, session_id: str, account_id: str, op: str, now, args: tuple):
+        # 作为journal.record()的目标，记录先暂存，请求结束时与事务一起提交
+        pending = self._pending.get(session_id)
+        if pending is None:
+            logger.warning(
+                "state change outside of session scope: %s, %s", session_id, op
+            )
+            return
+
+        pending.append((op, now, args))
+
+    def _save(self, conn, session_id: str, seq: int, session, pending: list) -> int:
+        for op, now, args in pending:
+            data = pickle.dumps((now, args), protocol=pickle.HIGHEST_PROTOCOL)
+            cursor = conn.execute(
+                "INSERT INTO transitions (seq, op, data) VALUES (?, ?, ?)",
+                (seq + 1, op, data),
+            )
+            seq = cursor.lastrowid
+
+        # 记录数达到snapshot_every时保存完整的会话，之前的记录不再需要
+        every = self.snapshot_every
+        if (seq - len(pending)) // every != seq // every:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshot (id, seq, state) VALUES (0, ?, ?)",
+                (seq, pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)),
+            )
+            conn.execute("DELETE FROM transitions WHERE seq <= ?", (seq,))
+
+        return seq
+
+    def _reset(self, conn, seq: int, session) -> int:
+        # 删除会话时以新会话作为快照，删除全部记录，其它进程的缓存随之失效
+        seq += 1
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshot (id, seq, state) VALUES (0, ?, ?)",
+            (seq, pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)),
+        )
+        conn.execute("DELETE FROM transitions")
+        return seq
+
+    def discard(self, session_id: str):
+        # 只能在该会话的with语句中调用，退出时会话恢复为新建时的状态
+        self._discarded.add(session_id)
+
+    @contextmanager
+    def session(self, session_id: str, factory, write: bool = True):
+        lock = self._enter(session_id)
+        try:
+            with lock:
+                with self._transaction(session_id, factory, write) as session:
+                    yield session
+        finally:
+            self._leave(session_id)
+
+    @contextmanager
+    def _transaction(self, session_id: str, factory, write: bool):
+        conn = self._connect(session_id)
+        conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+        pending = self._pending[session_id] = []
+        try:
+            seq, session = self._load(conn, session_id, factory)
+
+            yield session
+
+            if session_id in self._discarded:
+                session = renew_session(session, factory)
+                seq = self._reset(conn, seq, session)
+            # 只读的请求也可能产生状态变化（如日切），同样需要写入
+            elif len(pending) > 0:
+                seq = self._save(conn, session_id, seq, session, pending)
+            conn.execute("COMMIT")
+            self._cache[session_id] = (seq, session)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            # 会话对象可能已经被部分修改，丢弃本地缓存
+            self._cache.pop(session_id, None)
+            raise
+        finally:
+            del self._pending[session_id]
+            self._discarded.discard(session_id)
+
+    def clear(self):
+        with self._mutex:
+            for conn in self._conns.values():
+                conn.close()
+            self._conns = {}
+            self._cache = {}
+            self._used.clear()
+
+            shutil.rmtree(self.folder, ignore_errors=True)
+            os.makedirs(self.folder, exist_ok=True)
+
+
+def create_state_store(
+    backend: str = "memory",
+    folder: str = None,
+    snapshot_every: int = 1000,
+    max_sessions: int = None,
+    idle_ttl: float = None,
+):
+    if backend == "memory":
+        return MemoryStateStore(max_sessions, idle_ttl)
+
+    if backend == "sqlite":
+        return SqliteStateStore(
+            folder,
+            snapshot_every=snapshot_every,
+            max_sessions=max_sessions,
+            idle_ttl=idle_ttl,
+        )
+
+    raise ValueError(f"unknown state backend: {backend}")
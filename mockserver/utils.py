@@ -7,6 +7,8 @@ from typing import Union
 
 import cfg4py
 
+import mockserver.codec as codec
+
 logger = logging.getLogger(__name__)
 
 
@@ -34,3 +36,10 @@ def make_response(
         "msg": err_msg,
         "data": data,
     }
+
+
+def dump_response(
+    err_code: Union[Enum, int], err_msg: str = None, data: Union[dict, list] = None
+) -> bytes:
+    # 预先序列化应答，格式与make_response()一致
+    return codec.dumps(make_response(err_code, err_msg, data))
@@ -0,0 +1,62 @@
+"""测试用例步骤的构造函数"""
+
+CODE = "000001.XSHE"
+
+
+def entrust(
+    entrust_no: str,
+    status: int = 3,
+    filled: int = 100,
+    code: str = CODE,
+    price: float = 10.0,
+    volume: int = 100,
+    side: int = 1,
+    **fields,
+) -> dict:
+    data = {
+        "entrust_no": entrust_no,
+        "code": code,
+        "price": price,
+        "volume": volume,
+        "order_side": side,
+        "bid_type": 1,
+        "status": status,
+        "filled": filled,
+        "filled_amount": round(filled * price, 2),
+    }
+    data.update(fields)
+    return data
+
+
+def order_step(stage: str, action: str, result: dict) -> dict:
+    return {
+        "stage": stage,
+        "test_action": action,
+        "parameters": {
+            "code": result["code"],
+            "price": result["price"],
+            "volume": result["volume"],
+        },
+        "trade_result": result,
+    }
+
+
+def buy_step(stage: str, entrust_no: str, **kwargs) -> dict:
+    return order_step(stage, "buy", entrust(entrust_no, **kwargs))
+
+
+def sell_step(stage: str, entrust_no: str, **kwargs) -> dict:
+    return order_step(stage, "sell", entrust(entrust_no, side=-1, **kwargs))
+
+
+def update_step(stage: str, entrust_no: str, **kwargs) -> dict:
+    return {
+        "stage": stage,
+        "test_action": "entrust_update",
+        "entrust_update": entrust(entrust_no, **kwargs),
+    }
+
+
+def order(code: str = CODE, price: float = 10.0, volume: int = 100) -> dict:
+    # 交易接口的请求参数
+    return {"security": code, "price": price, "volume": volume}
@@ -0,0 +1,76 @@
+import uuid
+
+import cfg4py
+import pytest
+
+ACCESS_TOKEN = "test-token"
+ACCOUNT_ID = "test-account"
+CAPITAL = 1000000
+
+
+class Client:
+    """测试用的客户端，每个测试使用单独的Session-ID"""
+
+    def __init__(self, app, session_id: str = None):
+        self.app = app
+        self.session_id = session_id or uuid.uuid4().hex
+
+    def headers(self, session_id: str = None) -> dict:
+        return {
+            "Authorization": ACCESS_TOKEN,
+            "Account-ID": ACCOUNT_ID,
+            "Session-ID": session_id or self.session_id,
+        }
+
+    def call(self, method: str, url: str, json=None, session_id: str = None):
+        kwargs = {"headers": self.headers(session_id)}
+        if json is not None:
+            kwargs["json"] = json
+        _, response = getattr(self.app.test_client, method)(url, **kwargs)
+        assert response.status == 200, response.body
+        return response.json
+
+    def get(self, url: str, **kwargs):
+        return self.call("get", url, **kwargs)
+
+    def post(self, url: str, json=None, **kwargs):
+        return self.call("post", url, json=json, **kwargs)
+
+
+@pytest.fixture(scope="session")
+def case_folder(tmp_path_factory):
+    return tmp_path_factory.mktemp("cases")
+
+
+@pytest.fixture(scope="session")
+def config(tmp_path_factory, case_folder):
+    config_dir = tmp_path_factory.mktemp("config")
+    (config_dir / "defaults.yaml").write_text(
+        "server_info:\n"
+        f"  access_token: {ACCESS_TOKEN}\n"
+        f"  account_id: {ACCOUNT_ID}\n"
+        f"  account_captital: {CAPITAL}\n"
+        f"  case_folder: {case_folder}\n"
+        "  port: 7080\n"
+    )
+    cfg4py.init(str(config_dir), False)
+    return cfg4py.get_instance()
+
+
+@pytest.fixture(scope="session")
+def app(config):
+    from mockserver.codec import init_codec
+    from mockserver.route_map import initialize_blueprint
+    from mockserver.server import app
+    from mockserver.session import init_accounts, init_state_store
+
+    init_accounts(ACCOUNT_ID, CAPITAL)
+    init_codec("auto")
+    init_state_store("memory")
+    initialize_blueprint(app)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return Client(app)
@@ -0,0 +1,37 @@
+from tests.cases import CODE, buy_step, sell_step
+
+
+def batch_order(price: float, side: int, **fields) -> dict:
+    data = {"security": CODE, "price": price, "volume": 100, "order_side": side}
+    data.update(fields)
+    return data
+
+
+def test_batch_orders(client):
+    steps = [buy_step("s1", "e1"), sell_step("s2", "e2"), buy_step("s3", "e3")]
+    client.post("/mock/load_data", steps)
+
+    orders = [
+        batch_order(10.0, 1),
+        batch_order(10.0, 0),
+        batch_order(11.0, -1),
+        batch_order(10.0, -1),
+        batch_order(10.0, 1),
+    ]
+    reply = client.post("/batch_orders", {"orders": orders})
+    assert reply["status"] == 0
+
+    # 每个委托单独返回结果，顺序与输入一致，中间失败的委托不影响后面的委托
+    results = reply["data"]
+    assert [x["status"] for x in results] == [0, -1, -1, 0, 0]
+    assert "invalid order" in results[1]["msg"]
+    entrusts = [results[i]["data"]["entrust_no"] for i in (0, 3, 4)]
+    assert entrusts == ["e1", "e2", "e3"]
+
+    assert list(client.post("/today_entrusts")["data"]) == ["e1", "e2", "e3"]
+
+
+def test_batch_orders_must_be_list(client):
+    reply = client.post("/batch_orders", {"orders": batch_order(10.0, 1)})
+    assert reply["status"] == -1
+    assert reply["msg"] == "batch_orders: orders must be list"
@@ -0,0 +1,79 @@
+import asyncio
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+import mockserver.bench as bench
+from mockserver.compiler import compile_case
+from tests.conftest import ACCESS_TOKEN, ACCOUNT_ID
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_summarize():
+    report = bench.summarize([0.003, 0.001, 0.002, 0.004], 1, 2)
+
+    assert report == {
+        "requests": 4,
+        "errors": 1,
+        "seconds": 2,
+        "throughput": 2.0,
+        "p50_ms": 3.0,
+        "p99_ms": 4.0,
+        "p999_ms": 4.0,
+    }
+    assert bench.percentile([], 0.5) == 0
+
+
+def test_generated_case_is_valid():
+    steps = compile_case(bench.generate_case(3))
+    assert [x.stage for x in steps] == ["buy-0", "buy-1", "buy-2"]
+
+
+def test_compare_transports_requires_unix(capsys):
+    with pytest.raises(SystemExit):
+        bench.parse_args(["--token", "t", "--account", "a", "--compare-transports"])
+    assert "--compare-transports requires --unix" in capsys.readouterr().err
+
+
+def test_run_benchmark(app):
+    args = SimpleNamespace(
+        host="127.0.0.1",
+        port=free_port(),
+        unix=None,
+        token=ACCESS_TOKEN,
+        account=ACCOUNT_ID,
+        requests=20,
+        concurrency=4,
+    )
+
+    async def scenario():
+        # 在同一个事件循环中启动服务器，压测全部接口
+        server = await app.create_server(
+            host=args.host, port=args.port, return_asyncio_server=True
+        )
+        await server.startup()
+        await server.before_start()
+        await server.after_start()
+        try:
+            return await bench.run_benchmark(args)
+        finally:
+            await server.before_stop()
+            await server.close()
+            await server.after_stop()
+
+    report = asyncio.run(scenario())
+    assert list(report) == [
+        "/buy",
+        "/positions",
+        "/today_entrusts",
+        "/mock/current",
+        "/mock/history",
+    ]
+    for result in report.values():
+        assert (result["requests"], result["errors"]) == (20, 0)
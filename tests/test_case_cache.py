@@ -0,0 +1,54 @@
+import json
+import os
+
+from mockserver.case_cache import CaseCache, case_items
+from tests.cases import buy_step
+
+
+def write_case(folder, name: str, steps: list) -> str:
+    case_file = folder / f"{name}.txt"
+    case_file.write_text(json.dumps(steps))
+    return str(case_file)
+
+
+def test_reuse_until_file_changes(tmp_path):
+    cache = CaseCache()
+    case_file = write_case(tmp_path, "case", [buy_step("s1", "e1")])
+
+    steps = cache.get(case_file)
+    assert cache.get(case_file) is steps
+
+    # 大小变化
+    write_case(tmp_path, "case", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+    steps = cache.get(case_file)
+    assert [x.stage for x in steps] == ["s1", "s2"]
+
+    # 大小不变，修改时间变化
+    write_case(tmp_path, "case", [buy_step("s1", "e1"), buy_step("s3", "e3")])
+    os.utime(case_file, ns=(0, 0))
+    assert [x.stage for x in cache.get(case_file)] == ["s1", "s3"]
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = CaseCache(maxsize=2)
+    files = [write_case(tmp_path, f"c{i}", [buy_step("s1", "e1")]) for i in range(3)]
+
+    first = cache.get(files[0])
+    cache.get(files[1])
+    assert cache.get(files[0]) is first
+
+    # 最久未使用的c1被清除
+    cache.get(files[2])
+    assert list(cache._entries) == [files[0], files[2]]
+
+
+def test_items_are_independent(tmp_path):
+    cache = CaseCache()
+    case_file = write_case(tmp_path, "case", [buy_step("s1", "e1")])
+
+    items = case_items(cache.get(case_file), "case")
+    items[0]["trade_result"]["entrust_no"] = "changed"
+
+    # 加载时改写的步骤不影响缓存
+    items = case_items(cache.get(case_file), "case")
+    assert items[0]["trade_result"]["entrust_no"] == "e1"
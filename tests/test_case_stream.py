@@ -0,0 +1,74 @@
+import json
+
+import pytest
+
+from mockserver.case_stream import CaseFileStream, CaseStream
+from tests.cases import buy_step, order, update_step
+
+
+def write_case(folder, name: str, lines: list):
+    file = folder / f"{name}.jsonl"
+    file.write_text("\n".join(lines) + "\n")
+    return str(file)
+
+
+def test_stream_window(tmp_path):
+    lines = [json.dumps(buy_step(f"s{i}", f"e{i}")) for i in range(100)]
+    stream = CaseFileStream(write_case(tmp_path, "case", lines), window=8)
+
+    assert stream[0]["stage"] == "s0"
+    assert len(stream.items) == 8
+
+    # 游标前进时已执行的步骤从内存中释放
+    for i in range(51):
+        stream.release(i)
+        assert stream[i]["stage"] == f"s{i}"
+    assert stream.base == 50
+    assert len(stream.items) <= 8
+    with pytest.raises(IndexError):
+        stream[10]
+
+    assert not stream.is_last(98)
+    assert stream.is_last(99)
+    stream.close()
+
+
+def test_case_stream_is_abstract():
+    with pytest.raises(TypeError):
+        CaseStream("case")
+
+
+def test_stream_run_to_end(client, case_folder):
+    name = f"stream-{client.session_id}"
+    steps = []
+    for i in range(3):
+        steps += [buy_step(f"s{i}", f"e{i}"), update_step(f"u{i}", f"e{i}")]
+    write_case(case_folder, name, [json.dumps(x) for x in steps])
+
+    assert client.post("/mock/load", {"case": name})["status"] == 0
+    for i in range(3):
+        reply = client.post("/buy", order())
+        assert reply["data"]["entrust_no"] == f"e{i}"
+        assert client.get("/mock/proceed")["status"] == 0
+
+    reply = client.post("/buy", order())
+    assert reply["status"] == -1
+    assert "no more stages" in reply["msg"]
+
+
+def test_stream_reports_invalid_line(client, case_folder):
+    name = f"broken-{client.session_id}"
+    lines = [json.dumps(buy_step(f"s{i}", f"e{i}")) for i in range(2)]
+    lines.append("{not json")
+    write_case(case_folder, name, lines)
+
+    assert client.post("/mock/load", {"case": name})["status"] == 0
+    assert client.post("/buy", order())["data"]["entrust_no"] == "e0"
+
+    # 错误之前的最后一个步骤不再正常执行，应答中给出读取错误
+    reply = client.post("/buy", order())
+    assert reply["status"] == -1
+    assert "invalid step in case" in reply["msg"]
+
+    reply = client.get("/mock/current")
+    assert "error" in reply["data"]
@@ -0,0 +1,24 @@
+import datetime
+
+import pytest
+
+from mockserver.clock import parse_time
+
+
+def test_parse_naive_time():
+    assert parse_time("2022-03-09 09:30:00") == datetime.datetime(2022, 3, 9, 9, 30)
+
+
+def test_parse_aware_time_as_local():
+    now = parse_time("2022-03-09T09:30:00+08:00")
+
+    assert now.tzinfo is None
+    expected = datetime.datetime(
+        2022, 3, 9, 1, 30, tzinfo=datetime.timezone.utc
+    ).astimezone()
+    assert now == expected.replace(tzinfo=None)
+
+
+def test_parse_invalid_time():
+    with pytest.raises(ValueError):
+        parse_time(20220309)
@@ -0,0 +1,37 @@
+import datetime
+
+import pytest
+
+import mockserver.codec as codec
+from mockserver.records import as_entrust
+from tests.cases import entrust
+
+
+@pytest.fixture
+def restore_codec():
+    yield codec.init_codec
+    codec.init_codec("auto")
+
+
+@pytest.mark.parametrize("name", ["orjson", "ujson", "json"])
+def test_codecs_agree(restore_codec, name):
+    assert restore_codec(name) == name
+
+    # 记录对象按to_dict()输出，其他无法序列化的对象转换为字符串
+    data = {
+        "entrust": as_entrust(entrust("e1")),
+        "reason": "资金不足",
+        "time": datetime.date(2022, 3, 10),
+    }
+    body = codec.dumps(data)
+    assert isinstance(body, bytes)
+    assert codec.loads(body) == {
+        "entrust": entrust("e1"),
+        "reason": "资金不足",
+        "time": "2022-03-10",
+    }
+
+
+def test_unknown_codec_falls_back_to_json(restore_codec):
+    assert restore_codec("simdjson") == "json"
+    assert codec.dumps({"a": 1}) == b'{"a":1}'
@@ -0,0 +1,86 @@
+import json
+import os
+
+import pytest
+
+from mockserver.compiler import (
+    CaseStep,
+    artifact_path,
+    compile_case,
+    compile_step,
+    main,
+    read_artifact,
+)
+from tests.cases import buy_step, entrust, order_step, update_step
+
+
+def market_step(stage: str, entrust_no: str, action: str = "market_buy") -> dict:
+    # 市价委托的参数中没有价格
+    step = order_step(stage, action, entrust(entrust_no, bid_type=2))
+    del step["parameters"]["price"]
+    return step
+
+
+def write_case(folder, name: str, steps: list) -> str:
+    case_file = folder / f"{name}.txt"
+    case_file.write_text(json.dumps(steps))
+    return str(case_file)
+
+
+def test_compile_case():
+    steps = [buy_step("s1", "e1", status=1, filled=0), update_step("u1", "e1")]
+
+    compiled = compile_case(steps)
+    assert [type(x) for x in compiled] == [CaseStep, CaseStep]
+    assert [x.to_item() for x in compiled] == steps
+
+
+@pytest.mark.parametrize("action", ["market_buy", "market_sell"])
+def test_market_order_without_price(action):
+    step = compile_step(0, market_step("m1", "e1", action))
+
+    assert step.action == action
+    assert "price" not in step.parameters
+
+
+@pytest.mark.parametrize(
+    "step, error",
+    [
+        (dict(buy_step("s1", "e1"), parameters={"code": "000001.XSHE"}), "volume"),
+        (
+            dict(buy_step("s1", "e1"), parameters={"code": "A", "volume": 100}),
+            "price must be number",
+        ),
+        (dict(buy_step("s1", "e1"), test_action="short"), "unknown test_action"),
+        (update_step("u1", "e1", status=9), "invalid status"),
+    ],
+)
+def test_invalid_step(step, error):
+    with pytest.raises(ValueError, match=error):
+        compile_step(0, step)
+
+
+def test_compiler_cli(tmp_path, capsys):
+    good = write_case(tmp_path, "good", [buy_step("s1", "e1"), market_step("m1", "e2")])
+    bad = write_case(tmp_path, "bad", [buy_step("s1", "e1"), {"stage": "x"}])
+
+    assert main([str(tmp_path)]) == 1
+    error = "stage or test_action not defined in step 1"
+    assert capsys.readouterr().out.strip() == f"{bad}: {error}"
+
+    # 编译结果与源文件一致时直接使用
+    steps = read_artifact(good)
+    assert [x.stage for x in steps] == ["s1", "m1"]
+    assert not os.path.exists(artifact_path(bad))
+
+    os.remove(bad)
+    assert main([str(tmp_path)]) == 0
+
+
+def test_artifact_out_of_date(tmp_path):
+    case_file = write_case(tmp_path, "case", [buy_step("s1", "e1")])
+    assert main([str(tmp_path)]) == 0
+
+    write_case(tmp_path, "case", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+    os.utime(case_file, ns=(0, 0))
+    assert read_artifact(case_file) is None
@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+import mockserver.handlers as handler
+import mockserver.journal as journal
+from mockserver.journal import StateJournal
+from mockserver.session import MockSession
+from mockserver.state import MemoryStateStore
+from mockserver.trade import BidType, OrderSide
+from tests.cases import buy_step, update_step
+
+STEPS = [
+    buy_step("s1", "e1", status=1, filled=0),
+    update_step("u1", "e1"),
+    buy_step("s2", "e2"),
+    buy_step("s3", "e3"),
+]
+
+
+def factory(session_id: str = "s"):
+    return MockSession(session_id, "acct", 10000)
+
+
+def open_store(folder: str, snapshot_every: int, monkeypatch, max_sessions=None):
+    """与server.py相同：恢复会话，之后的状态变化写入预写日志"""
+    store = MemoryStateStore(max_sessions)
+    state_journal = StateJournal(folder, snapshot_every)
+
+    def replay(session_id, account_id, op, now, args):
+        with store.session(session_id, lambda: factory(session_id)) as session:
+            handler.apply_transition(session, op, now, args)
+
+    store.attach_journal(state_journal, replay)
+    monkeypatch.setattr(journal, "journal", state_journal)
+    return store, state_journal
+
+
+def buy(session):
+    return handler.wrapper_trade_operation(
+        session, "000001.XSHE", 10.0, 100, OrderSide.BUY, BidType.LIMIT
+    )
+
+
+def summary(session) -> dict:
+    case_data = session.case_data
+    return {
+        "cursor": (case_data["index"], case_data["executed"]),
+        "entrusts": {
+            k: (v.status, v.filled) for k, v in session.accunt_info["entursts"].items()
+        },
+        "positions": {
+            k: (v.shares, v.amount) for k, v in session.ledger.positions.items()
+        },
+        "cash": session.ledger.cash,
+        "events": session.events.seq,
+    }
+
+
+@pytest.mark.parametrize("snapshot_every", [1000, 3])
+def test_recover_from_snapshot_and_log(config, tmp_path, monkeypatch, snapshot_every):
+    folder = str(tmp_path)
+    store, state_journal = open_store(folder, snapshot_every, monkeypatch)
+    with store.session("s", factory) as session:
+        handler.wrapper_load_case_data(session, STEPS, "ordered")
+    for call in (buy, handler.wrapper_proceed_non_trade_action, buy):
+        with store.session("s", factory) as session:
+            assert call(session)["status"] == 200
+    expected = summary(session)
+    state_journal.close()
+
+    if snapshot_every == 3:
+        assert os.path.exists(state_journal._snapshot_file())
+
+    # 模拟进程重启
+    store, state_journal = open_store(folder, snapshot_every, monkeypatch)
+    with store.session("s", factory) as session:
+        assert summary(session) == expected
+
+        # 恢复后继续执行下一个步骤
+        result = buy(session)
+        assert result["status"] == 200
+        assert result["data"]["entrust_no"] == "e3"
+    state_journal.close()
+
+
+def load(store, session_id: str):
+    with store.session(session_id, lambda: factory(session_id)) as session:
+        handler.wrapper_load_case_data(session, STEPS, "ordered")
+
+
+def test_evicted_sessions_not_recovered(config, tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    store, state_journal = open_store(folder, 1000, monkeypatch, max_sessions=1)
+    load(store, "a")
+    load(store, "b")
+    assert list(store._sessions) == ["b"]
+    state_journal.close()
+
+    store, state_journal = open_store(folder, 1000, monkeypatch)
+    assert list(store._sessions) == ["b"]
+    state_journal.close()
+
+
+def test_snapshot_reuses_unchanged_sessions(config, tmp_path, monkeypatch):
+    folder = str(tmp_path)
+    store, state_journal = open_store(folder, 1, monkeypatch)
+    # 等待后台线程写完，下一次请求结束时才能开始新的快照
+    for session_id in ("a", "b"):
+        load(store, session_id)
+        state_journal._snapshot_thread.join()
+    saved = dict(state_journal._saved)
+
+    # 只有b在上次快照之后有记录，a沿用上次序列化的结果
+    with store.session("b", factory) as session:
+        assert buy(session)["status"] == 200
+    state_journal.close()
+    assert state_journal._saved["a"] is saved["a"]
+    assert state_journal._saved["b"] is not saved["b"]
+
+    store, state_journal = open_store(folder, 1, monkeypatch)
+    assert sorted(store._sessions) == ["a", "b"]
+    with store.session("b", factory) as session:
+        assert session.case_data["index"] == 1
+    state_journal.close()
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import mockserver.handlers as handler
+import mockserver.latency as latency
+from mockserver.session import session_scope
+from mockserver.trade import BidType, OrderSide, OrderStatus
+from tests.cases import buy_step, order
+from tests.conftest import ACCOUNT_ID
+
+FILLS = {
+    "fills": [
+        {"delay": {"dist": "fixed", "ms": 100}, "status": 2, "ratio": 0.4},
+        {"delay": {"dist": "fixed", "ms": 100}, "status": 3},
+    ]
+}
+
+
+def place_order(session_id: str) -> str:
+    with session_scope(session_id, ACCOUNT_ID) as session:
+        assert handler.wrapper_set_latency(session, FILLS)["status"] == 200
+        steps = [buy_step("s1", "e1", status=1, filled=0), buy_step("s2", "e2")]
+        handler.wrapper_load_case_data(session, steps, "ordered")
+
+        result = handler.wrapper_trade_operation(
+            session, "000001.XSHE", 10.0, 100, OrderSide.BUY, BidType.LIMIT
+        )
+        handler.trade_ack_delay(session, result)
+        return result["data"]["entrust_no"]
+
+
+def entrust_state(session_id: str, entrust_no: str) -> tuple:
+    with session_scope(session_id, ACCOUNT_ID, write=False) as session:
+        entrust = session.accunt_info["entursts"][entrust_no]
+        return entrust.status, entrust.filled
+
+
+async def wait_for_state(session_id: str, entrust_no: str, expected: tuple):
+    # 定时器在事件循环中执行，等待状态变化
+    for _ in range(100):
+        if entrust_state(session_id, entrust_no) == expected:
+            return
+        await asyncio.sleep(0.01)
+
+    assert entrust_state(session_id, entrust_no) == expected
+
+
+def test_scheduled_fills(app):
+    session_id = "latency-fills"
+    key = (session_id, ACCOUNT_ID)
+
+    async def scenario():
+        entrust_no = place_order(session_id)
+        assert entrust_state(session_id, entrust_no) == (OrderStatus.NO_DEAL, 0)
+        assert latency.pending_count(key) == 1
+
+        partial = (OrderStatus.PARTIAL_TRANSACTION, 40)
+        await wait_for_state(session_id, entrust_no, partial)
+        assert latency.pending_count(key) == 1
+
+        filled = (OrderStatus.ALL_TRANSACTIONS, 100)
+        await wait_for_state(session_id, entrust_no, filled)
+        assert latency.pending_count(key) == 0
+
+    asyncio.run(scenario())
+
+
+def test_scheduled_fill_uses_virtual_time(app):
+    session_id = "latency-clock"
+    params = {"time": "2022-03-10 10:00:00", "frozen": True}
+    with session_scope(session_id, ACCOUNT_ID) as session:
+        handler.wrapper_set_clock(session, params)
+
+    async def scenario():
+        # 时钟冻结时成交同样按真实时间推进，成交时间为虚拟时间
+        entrust_no = place_order(session_id)
+        filled = (OrderStatus.ALL_TRANSACTIONS, 100)
+        await wait_for_state(session_id, entrust_no, filled)
+
+        with session_scope(session_id, ACCOUNT_ID, write=False) as session:
+            entrust = session.accunt_info["entursts"][entrust_no]
+        assert entrust.time == "2022-03-10 10:00:00.000000"
+        assert entrust.recv_at == entrust.time
+        assert (entrust.filled_vwap, entrust.filled_amount) == (10.0, 1000.0)
+
+    asyncio.run(scenario())
+
+
+def test_clear_cancels_scheduled_fills(app):
+    session_id = "latency-clear"
+    key = (session_id, ACCOUNT_ID)
+
+    async def scenario():
+        place_order(session_id)
+        assert latency.pending_count(key) == 1
+
+        with session_scope(session_id, ACCOUNT_ID) as session:
+            handler.wrapper_reset_exec_data(session, True)
+        assert latency.pending_count(key) == 0
+
+    asyncio.run(scenario())
+
+
+def test_ack_delay(client):
+    client.post("/mock/latency", {"ack": {"dist": "fixed", "ms": 50}, "seed": 1})
+    client.post("/mock/load_data", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+
+    start = time.perf_counter()
+    reply = client.post("/buy", order())
+    assert reply["status"] == 0
+    assert time.perf_counter() - start >= 0.05
+
+    reply = client.get("/mock/latency")
+    assert reply["data"]["ack"] == {"dist": "fixed", "ms": 50}
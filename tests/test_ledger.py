@@ -0,0 +1,77 @@
+from mockserver.ledger import PositionLedger
+from mockserver.records import Entrust
+from mockserver.trade import OrderSide, OrderStatus
+
+
+def make_entrust(entrust_no, code, filled, amount, side=OrderSide.BUY, **kwargs):
+    fields = {
+        "entrust_no": entrust_no,
+        "code": code,
+        "price": 1.0,
+        "volume": filled,
+        "order_side": side,
+        "bid_type": 1,
+        "status": OrderStatus.ALL_TRANSACTIONS,
+        "filled": filled,
+        "filled_amount": amount,
+    }
+    fields.update(kwargs)
+    return Entrust(**fields)
+
+
+def test_reused_entrust_no_for_another_code():
+    ledger = PositionLedger("acct", 10000)
+    ledger.apply_entrust(make_entrust("1", "A", 100, 100.0))
+
+    # 后一个用例重复使用了委托编号
+    ledger.apply_entrust(make_entrust("1", "B", 100, 100.0))
+
+    pos = ledger.positions["B"]
+    assert pos.shares == 100
+    assert pos.amount == 100.0
+    assert ledger.positions["A"].shares == 100
+    assert ledger.cash == 9800.0
+
+
+def test_partial_fills_count_only_the_increment():
+    ledger = PositionLedger("acct", 10000)
+    partial = make_entrust(
+        "1", "A", 40, 40.0, volume=100, status=OrderStatus.PARTIAL_TRANSACTION
+    )
+    ledger.apply_entrust(partial)
+    # 同一回报重复推送不会重复计算
+    ledger.apply_entrust(partial)
+
+    assert ledger.positions["A"].shares == 40
+    assert ledger.cash == 9960.0
+    # 未成交的部分冻结资金
+    assert ledger.frozen == 60.0
+
+    ledger.apply_entrust(make_entrust("1", "A", 100, 100.0, volume=100))
+    assert ledger.positions["A"].shares == 100
+    assert ledger.cash == 9900.0
+    assert ledger.frozen == 0
+    assert ledger.balance()["available"] == 9900.0
+
+
+def test_sell_and_fees():
+    ledger = PositionLedger("acct", 10000)
+    ledger.apply_entrust(make_entrust("1", "A", 100, 100.0, trade_fees=1.0))
+    ledger.release_sellable()
+
+    ledger.apply_entrust(
+        make_entrust("2", "A", 60, 90.0, side=OrderSide.SELL, trade_fees=0.5)
+    )
+
+    pos = ledger.positions["A"]
+    assert pos.shares == 40
+    assert pos.sellable == 40
+    assert ledger.cash == 10000 - 100.0 - 1.0 + 90.0 - 0.5
+
+
+def test_unfilled_entrust_is_ignored():
+    ledger = PositionLedger("acct", 10000)
+    ledger.apply_entrust(make_entrust("1", "A", 0, 0.0, status=OrderStatus.NO_DEAL))
+
+    assert ledger.positions == {}
+    assert ledger.cash == 10000
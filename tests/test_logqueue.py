@@ -0,0 +1,46 @@
+import io
+import logging
+import queue
+
+from mockserver.logqueue import BatchingQueueListener, DeferredQueueHandler
+
+
+def queue_logger(name: str, level: int = logging.INFO):
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setLevel(level)
+    handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, handler, batch=2)
+
+    logger = logging.getLogger(name)
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.handlers = [DeferredQueueHandler(log_queue)]
+    return logger, listener, stream
+
+
+def test_arguments_formatted_when_logged():
+    logger, listener, stream = queue_logger("test.logqueue.args")
+    entrust = {"entrust_no": "e1", "status": 1}
+    logger.info("buy result: %s", entrust)
+
+    # 写入前修改参数，日志中仍然是调用时的内容
+    entrust["status"] = 3
+    listener.start()
+    listener.stop()
+
+    assert stream.getvalue() == "INFO buy result: {'entrust_no': 'e1', 'status': 1}\n"
+
+
+def test_write_in_batches():
+    logger, listener, stream = queue_logger("test.logqueue.batch", logging.INFO)
+    for i in range(5):
+        logger.info("line %d", i)
+    logger.debug("filtered by handler level")
+
+    listener.start()
+    listener.stop()
+
+    assert stream.getvalue().splitlines() == [f"INFO line {i}" for i in range(5)]
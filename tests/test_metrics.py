@@ -0,0 +1,40 @@
+import mockserver.metrics as metrics
+from tests.cases import buy_step, order
+from tests.conftest import ACCOUNT_ID
+
+
+def series(text: str, name: str) -> dict:
+    # {标签: 值}，只取指定的指标
+    values = {}
+    for line in text.splitlines():
+        if line.startswith(name):
+            key, value = line.rsplit(" ", 1)
+            values[key[len(name) :]] = float(value)
+    return values
+
+
+def test_latency_per_route(client):
+    metrics.reset_metrics()
+    client.post("/mock/load_data", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+    client.post("/buy", order())
+    client.post("/buy/", order())
+    client.post("/buy", order())
+
+    _, response = client.app.test_client.get("/mock/metrics")
+    text = response.text
+    counts = series(text, "mockserver_request_latency_seconds_count")
+    # 尾部带/的请求计入同一个路由
+    assert counts == {'{route="/buy"}': 3, '{route="/mock/load_data"}': 1}
+    assert series(text, "mockserver_matches_total") == {"": 2}
+    assert series(text, "mockserver_mismatches_total") == {"": 1}
+
+
+def test_unauthorized_not_in_latency(app):
+    metrics.reset_metrics()
+    headers = {"Authorization": "wrong", "Account-ID": ACCOUNT_ID}
+    _, response = app.test_client.post("/buy", json=order(), headers=headers)
+    assert response.status == 401
+
+    _, response = app.test_client.get("/mock/metrics")
+    assert series(response.text, "mockserver_unauthorized_total") == {"": 1}
+    assert series(response.text, "mockserver_request_latency_seconds_count") == {}
@@ -0,0 +1,56 @@
+import json
+
+from tests.cases import buy_step, order, update_step
+
+
+def write_cases(case_folder, name: str) -> str:
+    folder = case_folder / name
+    folder.mkdir()
+    cases = {
+        "p1": [buy_step("a1", "p1", status=1, filled=0), update_step("a2", "p1")],
+        "p2": [buy_step("b1", "p2"), buy_step("b2", "p2b")],
+    }
+    for case, steps in cases.items():
+        (folder / f"{case}.txt").write_text(json.dumps(steps))
+    return name
+
+
+def test_playlist_loads_next_case(client, case_folder):
+    name = write_cases(case_folder, f"pl-{client.session_id}")
+
+    reply = client.post("/mock/playlist", {"glob": f"{name}/*"})
+    assert reply["data"]["current"] == f"{name}/p1"
+    assert reply["data"]["pending"] == [f"{name}/p2"]
+
+    client.post("/buy", order())
+    client.get("/mock/proceed")
+
+    # 最后一个步骤执行后自动加载下一个用例
+    reply = client.get("/mock/playlist")
+    assert reply["data"]["current"] == f"{name}/p2"
+    assert reply["data"]["pending"] == []
+    assert client.get("/mock/current")["data"]["stage"] == "b1"
+
+    assert client.post("/buy", order())["data"]["entrust_no"] == "p2"
+    history = [x["stage"] for x in client.get("/mock/history")["data"]]
+    assert history == ["a1", "a2", "b1"]
+
+
+def test_playlist_rejects_missing_case(client):
+    reply = client.post("/mock/playlist", {"cases": ["missing"]})
+
+    assert reply["status"] == -1
+    assert "case file not found" in reply["msg"]
+
+
+def test_playlist_clear(client, case_folder):
+    name = write_cases(case_folder, f"pl-{client.session_id}")
+    client.post("/mock/playlist", {"cases": [f"{name}/p1", f"{name}/p2"]})
+
+    client.post("/mock/playlist/clear")
+    client.post("/buy", order())
+    client.get("/mock/proceed")
+
+    # 清空后不再加载下一个用例
+    assert client.get("/mock/playlist")["data"]["pending"] == []
+    assert client.get("/mock/current")["data"]["stage"] == "a2"
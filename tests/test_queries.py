@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tests.cases import buy_step, order
+
+
+def test_today_entrusts_since_seq(client):
+    steps = [buy_step("s1", "e1", status=1, filled=0), buy_step("s2", "e2")]
+    client.post("/mock/load_data", steps)
+    client.post("/buy", order())
+    client.post("/buy", order())
+
+    reply = client.post("/today_entrusts", {"since_seq": 0, "limit": 1})
+    assert reply["status"] == 0
+    assert list(reply["data"]["items"]) == ["e1"]
+
+    reply = client.post("/today_entrusts", {"since_seq": reply["data"]["seq"]})
+    assert list(reply["data"]["items"]) == ["e2"]
+
+
+def test_resume_after_clear(client):
+    steps = [buy_step("s1", "e1"), buy_step("s2", "e2")]
+    client.post("/mock/load_data", steps)
+    client.post("/buy", order())
+    seq = client.post("/today_entrusts", {"since_seq": 0})["data"]["seq"]
+    assert seq > 0
+
+    # 清除后序号继续递增，客户端用原来的游标可以读到新的委托
+    client.get("/mock/clear")
+    client.post("/mock/load_data", [buy_step("s3", "e3"), buy_step("s4", "e4")])
+    client.post("/buy", order())
+
+    reply = client.post("/today_entrusts", {"since_seq": seq})
+    assert list(reply["data"]["items"]) == ["e3"]
+    assert reply["data"]["seq"] > seq
+
+
+@pytest.mark.parametrize("url", ["/today_entrusts", "/today_trades"])
+@pytest.mark.parametrize(
+    "params",
+    [{"since_seq": "5"}, {"since_seq": -1}, {"since_seq": 0, "limit": "10"}],
+)
+def test_invalid_cursor(client, url, params):
+    reply = client.post(url, params)
+
+    assert reply["status"] == -1
+    assert "non-negative integer" in reply["msg"]
+
+
+def test_feed_invalid_since_seq(client):
+    received = []
+
+    async def read(ws):
+        received.append(await ws.recv())
+
+    # 服务器发送错误信息后关闭连接，sanic-testing把关闭作为异常报告
+    with pytest.raises(ValueError, match="ConnectionClosedOK"):
+        client.app.test_client.websocket(
+            "/entrust_feed?since_seq=abc", extra_headers=client.headers(), mimic=read
+        )
+
+    assert '"status":-1' in received[0].replace(" ", "")
+
+
+class FeedSocket:
+    """只记录发送内容的websocket，closed被设置后recv抛出连接关闭的异常"""
+
+    def __init__(self):
+        self.sent = []
+        self.closed = asyncio.Event()
+
+    async def send(self, data: str):
+        self.sent.append(data)
+
+    async def recv(self):
+        await self.closed.wait()
+        raise ConnectionError("connection closed")
+
+
+def test_feed_stops_after_disconnect(client):
+    from mockserver.route_map import bp_mock_entrust_feed
+    from mockserver.session import _store
+
+    steps = [buy_step("s1", "e1"), buy_step("s2", "e2")]
+    client.post("/mock/load_data", steps)
+    client.post("/buy", order())
+    request = SimpleNamespace(headers=client.headers(), args={"since_seq": "0"})
+
+    async def scenario():
+        ws = FeedSocket()
+        feed = asyncio.ensure_future(bp_mock_entrust_feed(request, ws))
+        while len(ws.sent) == 0:
+            await asyncio.sleep(0.01)
+        assert '"e1"' in ws.sent[0]
+
+        # 没有新的记录时断开，推送立即结束
+        ws.closed.set()
+        await asyncio.wait_for(feed, 0.5)
+
+    asyncio.run(scenario())
+    assert _store._sessions[client.session_id].events._waiters == {}
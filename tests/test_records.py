@@ -0,0 +1,26 @@
+from mockserver.records import Entrust, Position
+from tests.cases import entrust
+
+
+def test_entrust_keeps_fields_as_given():
+    data = entrust("e1", status=1, filled=0, memo="extra field")
+    record = Entrust.from_dict(data)
+
+    # 省略的字段不输出，额外的字段原样输出
+    assert record.to_dict() == data
+    assert "time" not in record.to_dict()
+
+    changed = record.replace(status=3, filled=100, time="2022-03-10 09:30:00")
+    assert record.status == 1
+    assert changed.to_dict() == dict(
+        data, status=3, filled=100, time="2022-03-10 09:30:00"
+    )
+
+
+def test_repr_shows_fields():
+    record = Entrust.from_dict(entrust("e1"))
+    assert repr(record) == f"Entrust({record.to_dict()!r})"
+    assert "'entrust_no': 'e1'" in "buy result: %s" % record
+
+    position = Position("acct", "000001.XSHE")
+    assert "'code': '000001.XSHE'" in repr(position)
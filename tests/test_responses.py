@@ -0,0 +1,52 @@
+import mockserver.codec as codec
+import mockserver.handlers as handler
+from mockserver.session import session_scope
+from tests.cases import buy_step, entrust, order, update_step
+from tests.conftest import ACCOUNT_ID
+
+
+def cancel_step(stage: str, *entrust_nos: str) -> dict:
+    return {
+        "stage": stage,
+        "test_action": "cancel_entrusts",
+        "parameters": {"entrust_no": list(entrust_nos)},
+        "trade_result": [entrust(x, status=4, filled=0) for x in entrust_nos],
+    }
+
+
+def test_responses_built_at_load(app):
+    steps = [buy_step("s1", "e1"), update_step("u1", "e1"), cancel_step("c1", "e2")]
+    with session_scope("prebuilt", ACCOUNT_ID) as session:
+        handler.wrapper_load_case_data(session, steps, "ordered")
+        case_data = session.case_data
+        casename = case_data["case"]
+        items = case_data["items"]
+        responses = case_data["responses"]
+
+    # 买卖步骤在加载时生成成功和参数不匹配两个应答，其他步骤没有应答
+    ok_body, mismatch_body = responses[0]
+    reply = codec.loads(ok_body)
+    assert reply["status"] == 0
+    assert reply["data"] == items[0]["trade_result"]
+    assert codec.loads(mismatch_body) == {
+        "status": -1,
+        "msg": f"parameters in trade operation not matched, {casename} -> s1",
+        "data": None,
+    }
+    assert responses[1] is None
+
+    # 批量撤单的结果按委托编号返回
+    reply = codec.loads(responses[2][0])
+    assert list(reply["data"]) == ["e2"]
+
+
+def test_trade_replies_with_prebuilt_body(client):
+    client.post("/mock/load_data", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+
+    reply = client.post("/buy", order(price=11.0))
+    assert reply["status"] == -1
+    assert reply["msg"].endswith(" -> s1")
+
+    reply = client.post("/buy", order())
+    assert reply["status"] == 0
+    assert reply["data"]["entrust_no"] == "e1"
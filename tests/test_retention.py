@@ -0,0 +1,64 @@
+import pytest
+
+from mockserver.retention import init_retention
+from tests.cases import buy_step, order
+
+
+@pytest.fixture
+def retention(tmp_path):
+    def enable(**stores):
+        init_retention(dict(stores, archive_folder=str(tmp_path / "archive")))
+
+    yield enable
+    init_retention(None)
+
+
+def buy_all(client, count: int):
+    steps = [buy_step(f"s{i}", f"e{i}") for i in range(count)]
+    client.post("/mock/load_data", steps + [buy_step("end", "end")])
+    for _ in range(count):
+        assert client.post("/buy", order())["status"] == 0
+
+
+def test_max_count(client, retention):
+    retention(entrusts={"max_count": 2}, history={"max_count": 1})
+    buy_all(client, 3)
+
+    assert list(client.post("/today_entrusts")["data"]) == ["e1", "e2"]
+    history = client.get("/mock/history")["data"]
+    assert [x["stage"] for x in history] == ["s2"]
+
+    # 清理掉的记录按先后顺序写入归档
+    archive = client.get("/mock/archive")["data"]
+    assert [(x["store"], x["data"].get("stage")) for x in archive] == [
+        ("history", "s0"),
+        ("entrusts", None),
+        ("history", "s1"),
+    ]
+    assert archive[1]["data"]["entrust_no"] == "e0"
+
+    reply = client.get("/mock/archive?store=entrusts&entrust_no=e0")
+    assert [x["data"]["status"] for x in reply["data"]] == [3]
+
+
+def test_max_age(client, retention):
+    retention(trades={"max_age": 60})
+    client.post("/mock/clock/set", {"time": "2022-03-10 09:30:00", "frozen": True})
+    buy_all(client, 1)
+
+    client.post("/mock/clock/advance", {"seconds": 61})
+    client.post("/buy", order())
+
+    assert list(client.post("/today_trades")["data"]) == ["end"]
+    archive = client.get("/mock/archive?store=trades")["data"]
+    assert [x["data"]["entrust_no"] for x in archive] == ["e0"]
+    assert archive[0]["evicted_at"] == "2022-03-10 09:31:01.000000"
+
+
+def test_clear_removes_archive(client, retention):
+    retention(entrusts={"max_count": 1})
+    buy_all(client, 2)
+    assert len(client.get("/mock/archive")["data"]) == 1
+
+    client.get("/mock/clear")
+    assert client.get("/mock/archive")["data"] == []
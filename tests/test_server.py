@@ -0,0 +1,47 @@
+import pytest
+from sanic import Sanic
+
+import mockserver.server as server
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    # 记录启动服务的调用，不真正监听
+    calls = []
+    monkeypatch.setattr(
+        Sanic, "run", lambda app, **kwargs: calls.append(("run", kwargs))
+    )
+    monkeypatch.setattr(
+        Sanic, "prepare", lambda app, **kwargs: calls.append(("prepare", kwargs))
+    )
+    monkeypatch.setattr(Sanic, "serve", lambda: calls.append(("serve", {})))
+    return calls
+
+
+def test_listen_on_tcp(calls):
+    server.run_app(7080, None, True, 2)
+
+    assert calls == [("run", {"host": "0.0.0.0", "port": 7080, "workers": 2})]
+
+
+def test_listen_on_unix_socket(calls, tmp_path):
+    # 路径上已有的文件不删除，由sanic检查是否可以使用
+    unix_socket = tmp_path / "mock.sock"
+    unix_socket.write_text("not a socket")
+
+    server.run_app(7080, str(unix_socket), False, 1)
+
+    assert calls == [("run", {"unix": str(unix_socket), "workers": 1})]
+    assert unix_socket.read_text() == "not a socket"
+
+
+def test_listen_on_tcp_and_unix_socket(calls, tmp_path):
+    unix_socket = str(tmp_path / "mock.sock")
+
+    server.run_app(7080, unix_socket, True, 1)
+
+    assert calls == [
+        ("prepare", {"host": "0.0.0.0", "port": 7080, "workers": 1}),
+        ("prepare", {"unix": unix_socket, "workers": 1}),
+        ("serve", {}),
+    ]
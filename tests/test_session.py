@@ -0,0 +1,73 @@
+from mockserver.state import MemoryStateStore
+from tests.cases import buy_step, order
+
+
+def test_sessions_are_isolated(client):
+    other = client.session_id + "-other"
+    client.post("/mock/load_data", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+    client.post(
+        "/mock/load_data",
+        [buy_step("x1", "x1"), buy_step("x2", "x2")],
+        session_id=other,
+    )
+
+    reply = client.post("/buy", order())
+    assert reply["data"]["entrust_no"] == "e1"
+
+    # 另一个会话的游标和持仓不受影响
+    reply = client.get("/mock/current", session_id=other)
+    assert reply["data"]["stage"] == "x1"
+    assert client.post("/positions", session_id=other)["data"] == []
+
+    positions = client.post("/positions")["data"]
+    assert [(x["code"], x["shares"]) for x in positions] == [("000001.XSHE", 100)]
+
+
+def test_clear_discards_session(client):
+    from mockserver.session import _store
+
+    client.post("/mock/load_data", [buy_step("s1", "e1")])
+    session = _store._sessions[client.session_id]
+
+    client.get("/mock/clear")
+    assert _store._sessions[client.session_id] is not session
+
+    reply = client.get("/mock/current")
+    assert reply["status"] == -1
+
+
+def test_evict_least_recently_used():
+    store = MemoryStateStore(max_sessions=2)
+    for session_id in ("a", "b"):
+        with store.session(session_id, dict):
+            pass
+
+    with store.session("a", dict):
+        pass
+    with store.session("c", dict):
+        pass
+
+    assert list(store._sessions) == ["a", "c"]
+
+
+def test_evict_idle_sessions(monkeypatch):
+    import mockserver.state as state
+
+    now = [1000.0]
+    monkeypatch.setattr(state.time, "monotonic", lambda: now[0])
+
+    store = MemoryStateStore(idle_ttl=60)
+    with store.session("a", dict) as session:
+        session["n"] = 1
+    now[0] += 30
+    with store.session("b", dict):
+        pass
+
+    now[0] += 40
+    with store.session("b", dict):
+        pass
+    assert list(store._sessions) == ["b"]
+
+    # 被删除的会话再次访问时重新创建
+    with store.session("a", dict) as session:
+        assert session == {}
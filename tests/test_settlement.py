@@ -0,0 +1,36 @@
+from tests.cases import buy_step, order, sell_step
+
+
+def positions(client) -> dict:
+    return {x["code"]: x for x in client.post("/positions")["data"]}
+
+
+def test_shares_bought_today_are_sellable_next_day(client):
+    client.post("/mock/clock/set", {"time": "2022-03-09 10:00:00", "frozen": True})
+    steps = [buy_step("s1", "e1"), sell_step("s2", "e2", filled=40, volume=40)]
+    client.post("/mock/load_data", steps)
+    client.post("/buy", order())
+
+    pos = positions(client)["000001.XSHE"]
+    assert pos["shares"] == 100
+    assert pos["sellable"] == 0
+
+    # 拨到下一个交易日后释放可卖数量
+    client.post("/mock/clock/advance", {"days": 1})
+    pos = positions(client)["000001.XSHE"]
+    assert pos["sellable"] == 100
+
+    client.post("/sell", order(volume=40))
+    pos = positions(client)["000001.XSHE"]
+    assert pos["shares"] == 60
+    assert pos["sellable"] == 60
+
+
+def test_balance_follows_fills(client):
+    client.post("/mock/load_data", [buy_step("s1", "e1"), buy_step("s2", "e2")])
+    client.post("/buy", order())
+
+    balance = client.post("/balance")["data"]
+    assert balance["available"] == 1000000 - 1000.0
+    assert balance["total"] == 1000000
+    assert balance["pnl"] == 0
@@ -0,0 +1,57 @@
+import pytest
+
+from mockserver.simulator import init_bar_store
+from tests.cases import order
+from tests.conftest import CAPITAL
+
+BARS = (
+    "frame,open,high,low,close,volume\n"
+    "2022-03-10T09:31:00,10.0,10.2,9.9,10.1,1000\n"
+    "2022-03-10T09:32:00,10.1,10.3,10.0,10.2,1000\n"
+)
+
+
+@pytest.fixture
+def simulation(client, tmp_path):
+    (tmp_path / "A.csv").write_text(BARS)
+    init_bar_store(str(tmp_path))
+    client.post("/mock/simulation", {"enabled": True})
+    client.post("/mock/clock/set", {"time": "2022-03-10 09:31:30", "frozen": True})
+
+    yield client
+    init_bar_store(None)
+
+
+def test_orders_share_bar_volume(simulation):
+    client = simulation
+    first = client.post("/buy", order("A", 10.2, 600))["data"]
+    assert (first["status"], first["filled"]) == (3, 600)
+
+    # 同一根bar上的成交总量不超过bar的成交量
+    second = client.post("/buy", order("A", 10.2, 600))["data"]
+    assert (second["status"], second["filled"]) == (2, 400)
+    third = client.post("/buy", order("A", 10.2, 100))["data"]
+    assert (third["status"], third["filled"]) == (1, 0)
+
+    # 下一根bar重新计算
+    client.post("/mock/clock/advance", {"minutes": 1})
+    fourth = client.post("/buy", order("A", 10.3, 100))["data"]
+    assert (fourth["status"], fourth["filled"]) == (3, 100)
+
+    positions = client.post("/positions")["data"]
+    assert [(x["code"], x["shares"]) for x in positions] == [("A", 1100)]
+
+
+def test_buy_requires_available_cash(simulation):
+    client = simulation
+    volume = int(CAPITAL / 10.2) + 100
+    rejected = client.post("/buy", order("A", 10.2, volume))["data"]
+    assert rejected["status"] == -1
+    assert "not enough cash" in rejected["reason"]
+
+    # 未成交的买入委托冻结资金，之后的委托只能使用剩余的资金
+    pending = client.post("/buy", order("A", 9.0, 100000))["data"]
+    assert pending["status"] == 1
+    reply = client.post("/market_buy", {"security": "A", "volume": 10000})
+    assert reply["data"]["status"] == -1
+    assert client.post("/positions")["data"] == []
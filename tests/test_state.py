@@ -0,0 +1,147 @@
+import asyncio
+
+import pytest
+
+import mockserver.handlers as handler
+import mockserver.journal as journal
+import mockserver.route_map as route_map
+import mockserver.session as session_module
+from mockserver.session import MockSession
+from mockserver.state import SqliteStateStore
+from mockserver.trade import BidType, OrderSide
+from tests.cases import buy_step, update_step
+
+STEPS = [
+    buy_step("s1", "e1", status=1, filled=0),
+    update_step("u1", "e1"),
+    buy_step("s2", "e2"),
+]
+
+
+def factory():
+    return MockSession("s", "acct", 10000)
+
+
+class Worker:
+    """模拟一个worker进程：各自的存储对象和会话缓存，共享同一个目录"""
+
+    def __init__(self, folder: str, snapshot_every: int, monkeypatch, **kwargs):
+        self.store = SqliteStateStore(folder, snapshot_every=snapshot_every, **kwargs)
+        self.store.attach_replay(handler.apply_transition)
+        self.monkeypatch = monkeypatch
+
+    def run(self, func, *args, session_id: str = "s"):
+        # 与server.py相同，会话存储同时接收状态变化
+        self.monkeypatch.setattr(session_module, "_store", self.store)
+        self.monkeypatch.setattr(journal, "journal", self.store)
+        with self.store.session(session_id, factory) as session:
+            return func(session, *args)
+
+
+def buy(session):
+    return handler.wrapper_trade_operation(
+        session, "000001.XSHE", 10.0, 100, OrderSide.BUY, BidType.LIMIT
+    )
+
+
+def cursor(session):
+    return session.case_data["index"], session.case_data["executed"]
+
+
+def event_cursor(session):
+    return session.events.seq, session.events.base
+
+
+@pytest.mark.parametrize("snapshot_every", [1000, 2])
+def test_workers_share_transitions(config, tmp_path, monkeypatch, snapshot_every):
+    a = Worker(str(tmp_path), snapshot_every, monkeypatch)
+    b = Worker(str(tmp_path), snapshot_every, monkeypatch)
+
+    a.run(handler.wrapper_load_case_data, STEPS, "ordered")
+    assert a.run(buy)["status"] == 200
+
+    # 另一个worker重放新增的记录
+    assert b.run(cursor) == (1, 0)
+    assert b.run(handler.wrapper_proceed_non_trade_action)["status"] == 200
+
+    assert a.run(cursor) == (2, 0)
+    assert a.run(buy)["data"]["entrust_no"] == "e2"
+    positions = b.run(lambda session: session.ledger.positions["000001.XSHE"])
+    assert positions.shares == 200
+
+
+def test_rows_are_folded_into_snapshot(config, tmp_path, monkeypatch):
+    a = Worker(str(tmp_path), 2, monkeypatch)
+    a.run(handler.wrapper_load_case_data, STEPS, "ordered")
+    a.run(buy)
+
+    conn = a.store._connect("s")
+    seq = conn.execute("SELECT seq FROM snapshot").fetchone()[0]
+    rows = conn.execute("SELECT seq FROM transitions").fetchall()
+    assert all(row[0] > seq for row in rows)
+    assert len(rows) < 2
+
+
+def test_discard_resets_session(config, tmp_path, monkeypatch):
+    a = Worker(str(tmp_path), 1000, monkeypatch)
+    b = Worker(str(tmp_path), 1000, monkeypatch)
+    a.run(handler.wrapper_load_case_data, STEPS, "ordered")
+    a.run(buy)
+    seq, _ = b.run(event_cursor)
+    assert seq > 0
+
+    b.run(handler.wrapper_reset_exec_data, True)
+
+    assert a.run(cursor) == (-1, 0)
+    # 新会话的事件序号继续递增
+    assert a.run(event_cursor) == (seq, seq)
+    conn = a.store._connect("s")
+    assert conn.execute("SELECT COUNT(*) FROM transitions").fetchone()[0] == 0
+
+
+def test_close_least_recently_used(config, tmp_path, monkeypatch):
+    a = Worker(str(tmp_path), 1000, monkeypatch, max_sessions=1)
+    a.run(handler.wrapper_load_case_data, STEPS, "ordered")
+    a.run(buy)
+    a.run(cursor, session_id="other")
+
+    # 连接和缓存被释放，会话数据保存在文件中
+    assert list(a.store._conns) == ["other"]
+    assert list(a.store._cache) == ["other"]
+    assert a.run(cursor) == (1, 0)
+    assert list(a.store._conns) == ["s"]
+
+
+def test_close_idle_sessions(config, tmp_path, monkeypatch):
+    import mockserver.state as state
+
+    now = [1000.0]
+    monkeypatch.setattr(state.time, "monotonic", lambda: now[0])
+
+    a = Worker(str(tmp_path), 1000, monkeypatch, idle_ttl=60)
+    a.run(handler.wrapper_load_case_data, STEPS, "ordered")
+    now[0] += 30
+    a.run(cursor, session_id="other")
+
+    now[0] += 40
+    a.run(cursor, session_id="other")
+    assert list(a.store._conns) == ["other"]
+    assert a.run(cursor) == (0, 0)
+
+
+def test_feed_waiter_in_worker_thread(config):
+    session = factory()
+
+    async def scenario():
+        # 与sqlite存储相同，读取记录在线程池中执行，事件在事件循环的线程中创建
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.Event()
+        result = await loop.run_in_executor(
+            None, route_map.read_events, session, 0, waiter, loop
+        )
+        assert result["data"] == []
+
+        await loop.run_in_executor(None, session.events.append, "entrust", {})
+        await asyncio.wait_for(waiter.wait(), 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,78 @@
+import uuid
+
+import pytest
+
+from mockserver.compiler import compile_step
+from tests.cases import order
+
+TEMPLATE = {
+    "stage": "bulk",
+    "test_action": "template",
+    "template": {
+        "action": "buy",
+        "codes": {"start": "000001.XSHE", "stop": "000003.XSHE"},
+        "prices": {"start": 10.0, "stop": 10.02, "step": 0.01},
+        "volume": 100,
+        "repeat": 5,
+        "status": 3,
+    },
+}
+
+
+def test_expand_template():
+    template = compile_step(0, TEMPLATE)
+    seed = uuid.uuid4()
+
+    items = [template.expand(i, seed) for i in range(template.repeat)]
+    assert [x["stage"] for x in items] == [f"bulk#{i}" for i in range(5)]
+    assert [x["parameters"]["code"] for x in items] == [
+        "000001.XSHE",
+        "000002.XSHE",
+        "000003.XSHE",
+        "000001.XSHE",
+        "000002.XSHE",
+    ]
+    assert items[1]["parameters"]["price"] == 10.01
+
+    # 相同的seed生成相同的委托编号，重放日志时保持一致
+    again = template.expand(1, seed)
+    assert again["trade_result"]["entrust_no"] == items[1]["trade_result"]["entrust_no"]
+    assert len({x["trade_result"]["entrust_no"] for x in items}) == 5
+
+
+@pytest.mark.parametrize(
+    "changes, error",
+    [
+        ({"codes": []}, "codes"),
+        ({"status": 2}, "filled"),
+        ({"repeat": 0}, "repeat"),
+    ],
+)
+def test_invalid_template(changes, error):
+    step = dict(TEMPLATE, template=dict(TEMPLATE["template"], **changes))
+
+    with pytest.raises(ValueError, match=error):
+        compile_step(0, step)
+
+
+def test_template_runs_on_server(client):
+    client.post("/mock/load_data", [TEMPLATE])
+
+    codes = ["000001.XSHE", "000002.XSHE", "000003.XSHE"]
+    prices = [10.0, 10.01, 10.02]
+    for i in range(5):
+        reply = client.post("/buy", order(codes[i % 3], prices[i % 3]))
+        assert reply["status"] == 0
+        assert reply["data"]["code"] == codes[i % 3]
+
+    reply = client.post("/buy", order())
+    assert "no more stages" in reply["msg"]
+    positions = {x["code"]: x["shares"] for x in client.post("/positions")["data"]}
+    assert positions == {"000001.XSHE": 200, "000002.XSHE": 200, "000003.XSHE": 100}
+
+
+def test_template_rejects_unordered_mode(client):
+    reply = client.post("/mock/load_data?mode=unordered", [TEMPLATE])
+
+    assert reply["status"] == -1
+    assert "unordered mode not supported" in reply["msg"]
@@ -0,0 +1,60 @@
+import pytest
+
+from tests.cases import buy_step, order, update_step
+
+
+def test_orders_match_in_any_order(client):
+    steps = [
+        buy_step("a", "ea", code="A"),
+        buy_step("b", "eb", code="B", price=5.0),
+        update_step("u", "ea", code="A"),
+    ]
+    client.post("/mock/load_data?mode=unordered", steps)
+
+    reply = client.post("/buy", order("B", 5.0))
+    assert reply["data"]["entrust_no"] == "eb"
+
+    # 同一步骤只能匹配一次
+    reply = client.post("/buy", order("B", 5.0))
+    assert reply["status"] == -1
+    assert "no pending trade operation matched" in reply["msg"]
+
+    # 游标仍然停在第一个未执行的步骤
+    assert client.get("/mock/current")["data"]["stage"] == "a"
+
+    reply = client.post("/buy", order("A"))
+    assert reply["data"]["entrust_no"] == "ea"
+    assert client.get("/mock/current")["data"]["stage"] == "u"
+
+    assert client.get("/mock/proceed")["status"] == 0
+    codes = sorted(x["code"] for x in client.post("/positions")["data"])
+    assert codes == ["A", "B"]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        order("A", volume=200),
+        # 与顺序模式相同，不做类型转换
+        order("A", volume=100.9),
+        order("A", volume="100"),
+        {"security": "A", "volume": 100},
+        order("A", price="10.0"),
+    ],
+)
+def test_unmatched_parameters(client, params):
+    client.post("/mock/load_data?mode=unordered", [buy_step("a", "ea", code="A")])
+
+    reply = client.post("/buy", params)
+    assert reply["status"] == -1
+    assert client.get("/mock/current")["data"]["executed"] == 0
+
+
+def test_market_order_without_price(client):
+    step = buy_step("a", "ea", code="A")
+    step["test_action"] = "market_buy"
+    del step["parameters"]["price"]
+    client.post("/mock/load_data?mode=unordered", [step, buy_step("b", "eb")])
+
+    reply = client.post("/market_buy", {"security": "A", "volume": 100})
+    assert reply["data"]["entrust_no"] == "ea"